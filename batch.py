@@ -0,0 +1,247 @@
+"""
+批量优化 - 多进程计算整个角色配置文件（或多个场景文件）中所有角色的最优方案
+
+非交互运行，适合在脚本和流水线中调用：
+
+使用方法：
+    python batch.py                                  # 计算 characters.yml 中的所有角色
+    python batch.py 场景1.yml 场景2.yml --jobs 8      # 计算多个场景文件，8 个进程
+    python batch.py -c 角色A -c 角色B                 # 只计算指定角色
+    cat 场景.json | python batch.py - --format csv    # 从标准输入读取场景（YAML 或 JSON）
+    python batch.py --ordered -o 结果.jsonl           # 按配置顺序输出到文件
+
+每个角色输出一行 JSON（或一行 CSV），算完一个输出一个；--ordered 时按配置文件中的角色顺序输出，与进程数无关。
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import freeze_support
+from typing import Dict, Iterator, List, Sequence, TextIO
+
+import yaml
+
+import config
+import engine
+from main import character_from_dict, find_best_combination, result_to_dict
+
+
+STDIN = '-'  # 场景文件名为 - 时从标准输入读取
+
+# CSV 输出的列：每个角色一行，只包含最优方案
+CSV_FIELDS = ['scenario', 'character', 'combination', 'damage', 'base_value', *engine.STAT_FIELDS,
+              'equipments', 'error']
+
+
+def optimize_task(task: tuple) -> Dict:
+    """
+    计算单个角色的最优方案（在子进程中执行）
+
+    Args:
+        task: (场景文件路径, 角色名称, 角色配置数据, find_best_combination 的参数)
+
+    Returns:
+        结构化结果；计算失败时包含 'error' 字段
+    """
+    scenario, name, char_data, options = task
+    record = {'scenario': scenario, 'character': name}
+    try:
+        character = character_from_dict(name, char_data)
+        best_result, all_results = find_best_combination(character, verbose=True, **options)
+        record['best'] = result_to_dict(best_result) if best_result else None
+        record['layouts'] = [result_to_dict(result) for result in all_results]
+    except Exception as e:
+        record['error'] = str(e)
+    return record
+
+
+def read_scenario(scenario: str, stream: TextIO = None) -> dict:
+    """
+    读取场景中的角色配置：角色名 -> 配置
+
+    scenario 为 STDIN 时从 stream（默认标准输入）读取 YAML 或 JSON，内容可以是 {characters: {...}}，
+    也可以直接是角色名到配置的映射。
+    """
+    if scenario != STDIN:
+        return config.load_characters(scenario)
+    data = yaml.safe_load(stream if stream is not None else sys.stdin) or {}
+    if not isinstance(data, dict):
+        raise ValueError("标准输入的场景格式错误：应为角色名到配置的映射")
+    return data.get('characters', data)
+
+
+def build_tasks(scenario: str, names: Sequence[str] = None, options: Dict = None) -> List[tuple]:
+    """读取场景文件（STDIN 表示标准输入），为其中的角色生成计算任务（names 为空时取全部角色）"""
+    characters = read_scenario(scenario)
+    if names is None:
+        names = list(characters.keys())
+
+    tasks = []
+    for name in names:
+        if name not in characters:
+            raise ValueError(f"角色 {name} 未找到")
+        tasks.append((scenario, name, characters[name], options or {}))
+    return tasks
+
+
+def iter_results(tasks: List[tuple], jobs: int = None, ordered: bool = False) -> Iterator[Dict]:
+    """
+    执行计算任务，每算完一个就产出一个结果
+
+    Args:
+        tasks: build_tasks 生成的任务列表
+        jobs: 进程数，默认为 CPU 核数；为 1 时在当前进程中顺序执行
+        ordered: True 时按 tasks 顺序产出（前面的任务算完后立即产出），False 时按完成顺序产出
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = max(1, min(jobs, len(tasks)))
+
+    if jobs == 1:
+        for task in tasks:
+            yield optimize_task(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(optimize_task, task): i for i, task in enumerate(tasks)}
+        pending = {}  # 已完成但前面还有任务未完成的结果（ordered 时）
+        next_index = 0
+        try:
+            for future in as_completed(futures):
+                if not ordered:
+                    yield future.result()
+                    continue
+                pending[futures[future]] = future.result()
+                while next_index in pending:
+                    yield pending.pop(next_index)
+                    next_index += 1
+        finally:
+            # 调用方提前停止读取时不再计算剩余的任务
+            for future in futures:
+                future.cancel()
+
+
+def run_tasks(tasks: List[tuple], jobs: int = None) -> List[Dict]:
+    """
+    执行计算任务
+
+    Args:
+        tasks: build_tasks 生成的任务列表
+        jobs: 进程数，默认为 CPU 核数；为 1 时在当前进程中顺序执行
+
+    Returns:
+        与 tasks 顺序一致的结果列表
+    """
+    return list(iter_results(tasks, jobs, ordered=True))
+
+
+def optimize_roster(config_path: str = 'characters.yml', names: Sequence[str] = None,
+                    jobs: int = None, **options) -> List[Dict]:
+    """
+    计算配置文件中所有（或指定）角色的最优方案
+
+    Args:
+        config_path: 角色配置文件
+        names: 角色名称列表，默认全部
+        jobs: 进程数
+        **options: 传给 find_best_combination 的参数，如 method='branch_and_bound'
+    """
+    return run_tasks(build_tasks(config_path, names, options), jobs)
+
+
+def optimize_scenarios(paths: Sequence[str], jobs: int = None, **options) -> List[Dict]:
+    """计算多个场景文件中所有角色的最优方案，结果按文件顺序、角色顺序排列"""
+    tasks = []
+    for path in paths:
+        tasks.extend(build_tasks(path, options=options))
+    return run_tasks(tasks, jobs)
+
+
+def csv_row(record: Dict) -> Dict:
+    """把一个角色的结果转换为 CSV 的一行（最优方案的伤害、总属性和装备）"""
+    row = {'scenario': record['scenario'], 'character': record['character'], 'error': record.get('error', '')}
+    best = record.get('best')
+    if best:
+        row['combination'] = best['combination']
+        row['damage'] = best['damage']
+        row.update(best['stats'])
+        row['equipments'] = '; '.join(
+            f"{eq['category']}:{eq['main_stat_type']}{eq['main_stat_value']}+{eq['sub_stat_type']}{eq['sub_stat_value']}"
+            for eq in best['equipments'])
+    return row
+
+
+class RecordWriter:
+    """逐条写出结果（JSON Lines 或 CSV），每条写完立即刷新，下游可以边算边读"""
+
+    def __init__(self, stream: TextIO, fmt: str = 'jsonl'):
+        if fmt not in ('jsonl', 'csv'):
+            raise ValueError(f"未知的输出格式: {fmt}")
+        self.stream = stream
+        self.fmt = fmt
+        self._csv = None
+        if fmt == 'csv':
+            self._csv = csv.DictWriter(stream, fieldnames=CSV_FIELDS, restval='', extrasaction='ignore',
+                                       lineterminator='\n')
+            self._csv.writeheader()
+
+    def write(self, record: Dict):
+        if self._csv is not None:
+            self._csv.writerow(csv_row(record))
+        else:
+            self.stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.stream.flush()
+
+
+def main(argv: Sequence[str] = None) -> int:
+    """
+    命令行入口
+
+    Returns:
+        退出码：全部成功为 0，有角色计算失败为 1，参数错误为 2
+    """
+    parser = argparse.ArgumentParser(description="批量计算角色最优装备方案（非交互）")
+    parser.add_argument('scenarios', nargs='*', default=[config.DEFAULT_CONFIG_PATH],
+                        help="场景文件（格式同 characters.yml），- 表示从标准输入读取 YAML/JSON，默认 characters.yml")
+    parser.add_argument('-c', '--character', action='append', dest='names', metavar='NAME',
+                        help="只计算指定角色（可重复），默认全部角色")
+    parser.add_argument('--jobs', type=int, default=None, help="进程数，默认为 CPU 核数")
+    parser.add_argument('--method', choices=['exhaustive', 'branch_and_bound'], default='exhaustive',
+                        help="搜索方法")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl', dest='fmt',
+                        help="输出格式：jsonl 每行一个角色的完整结果，csv 每行一个角色的最优方案")
+    parser.add_argument('-o', '--output', default=None, help="输出文件，默认标准输出")
+    parser.add_argument('--ordered', action='store_true', help="按配置中的角色顺序输出（默认算完一个输出一个）")
+    args = parser.parse_args(argv)
+
+    try:
+        tasks = []
+        for scenario in args.scenarios:
+            tasks.extend(build_tasks(scenario, args.names, {'method': args.method}))
+    except (OSError, ValueError, KeyError, yaml.YAMLError) as e:
+        sys.stderr.write(f"错误: {e}\n")
+        return 2
+
+    stream = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    failed = 0
+    try:
+        writer = RecordWriter(stream, args.fmt)
+        for record in iter_results(tasks, args.jobs, ordered=args.ordered):
+            failed += 'error' in record
+            writer.write(record)
+    except BrokenPipeError:
+        # 下游（如 head）提前关闭管道：停止输出，并避免退出时再次刷新标准输出报错
+        sys.stdout = open(os.devnull, 'w')
+        return 0
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    freeze_support()
+    sys.exit(main())
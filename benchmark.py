@@ -0,0 +1,323 @@
+"""
+性能基准
+
+在规模逐渐增大的合成数据上计时优化器的热点函数，结果追加到 JSON 历史文件，并与之前的结果比较，
+超过阈值的变慢标记为回归：
+
+    python benchmark.py                        # 运行全部基准，写入 benchmark_history.json
+    python benchmark.py --quick                # 小规模快速运行
+    python benchmark.py -k find_best           # 只运行名称包含 find_best 的基准
+    python benchmark.py --threshold 0.1 --fail-on-regression   # 变慢超过 10% 时退出码为 1
+
+基准分组：
+    calculate_stats / calculate_damage / calculate_next_affix_gain   单次调用
+    find_best_combination[size=N]     每类装备 N 件的合成装备目录
+    find_best_combination[slots=N]    N 个槽位的布局
+    find_best_combination[roster=N]   N 个角色依次计算
+    branch_and_bound[size=N]          同一目录上的分支定界搜索
+
+每项记录多轮计时中最快一轮的单次耗时（受系统负载的影响最小）；比较基准为同一台机器、同一模式（是否 --quick）
+历史中最近几次运行的中位数。
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+import layouts as layout_rules
+from main import (Character, Equipment, EQUIPMENT_COSTS, EQUIPMENT_TYPES, calculate_damage,
+                  calculate_next_affix_gain, calculate_stats, find_best_combination)
+
+
+DEFAULT_HISTORY_PATH = 'benchmark_history.json'
+DEFAULT_THRESHOLD = 0.2  # 比历史中位数慢 20% 以上视为回归
+DEFAULT_WINDOW = 5  # 比较最近几次运行
+
+# 各组基准的规模
+DEFAULT_SIZES = (2, 4, 8, 16)  # 每类装备的件数
+DEFAULT_SLOT_COUNTS = (4, 5, 6)
+DEFAULT_ROSTER_SIZES = (1, 8, 32)
+QUICK_SIZES = (2, 4)
+QUICK_SLOT_COUNTS = (4, 5)
+QUICK_ROSTER_SIZES = (1, 4)
+
+# 合成装备上可能出现的随机词条及单条的数值范围
+SUBSTAT_RANGES = {
+    '暴击': (0.063, 0.105),
+    '爆伤': (0.126, 0.21),
+    '攻击%': (0.064, 0.116),
+    '生命%': (0.064, 0.116),
+    '伤害加成': (0.064, 0.116),
+    '固定攻击': (30, 60),
+    '固定生命': (320, 580),
+}
+
+AFFIX_AVG_VALUES = {'crit_rate': 0.081, 'crit_dmg': 0.162, 'percent': 0.086, 'dmg_bonus': 0.086}
+
+
+@dataclass
+class Case:
+    """一项基准"""
+    name: str
+    func: Callable[[], object]
+
+
+def synthetic_catalog(size: int, seed: int = 0) -> Dict[str, List[Equipment]]:
+    """
+    合成装备目录：每类装备 size 件，由默认装备按随机比例缩放主副词条并加上随机词条得到
+
+    同样的 size 和 seed 总是得到同样的目录。
+    """
+    rng = random.Random(seed * 1000 + size)
+    catalog = {}
+    for category, templates in EQUIPMENT_TYPES.items():
+        options = []
+        for i in range(size):
+            template = templates[i % len(templates)]
+            substats = {}
+            for name in rng.sample(sorted(SUBSTAT_RANGES), rng.randint(1, 4)):
+                low, high = SUBSTAT_RANGES[name]
+                substats[name] = round(rng.uniform(low, high), 3)
+            options.append(Equipment(category, template.main_stat_type,
+                                     round(template.main_stat_value * rng.uniform(0.8, 1.0), 3),
+                                     template.sub_stat_type, round(template.sub_stat_value * rng.uniform(0.8, 1.0)),
+                                     substats=substats))
+        catalog[category] = options
+    return catalog
+
+
+def synthetic_roster(count: int, seed: int = 0) -> List[Character]:
+    """合成角色列表（攻击型、生命型交替）"""
+    rng = random.Random(seed * 1000 + count)
+    roster = []
+    for i in range(count):
+        base_type = 'attack' if i % 2 == 0 else 'hp'
+        roster.append(Character(
+            name=f"合成角色{i + 1}",
+            base_type=base_type,
+            base_value=rng.uniform(1500, 2500) if base_type == 'attack' else rng.uniform(12000, 18000),
+            base_multiplier=rng.uniform(0.0, 0.3),
+            base_crit_rate=rng.uniform(0.05, 0.4),
+            base_crit_dmg=rng.uniform(1.5, 2.2),
+            base_dmg_bonus=rng.uniform(0.0, 0.3),
+            skill_multiplier=rng.uniform(1.0, 4.0)
+        ))
+    return roster
+
+
+def build_cases(sizes: Sequence[int] = DEFAULT_SIZES, slot_counts: Sequence[int] = DEFAULT_SLOT_COUNTS,
+                roster_sizes: Sequence[int] = DEFAULT_ROSTER_SIZES, seed: int = 0) -> List[Case]:
+    """生成全部基准"""
+    character = synthetic_roster(1, seed)[0]
+    rng = random.Random(seed)
+    catalog = synthetic_catalog(max(sizes), seed)
+    equipments = [rng.choice(catalog[category]) for category in ('4', '3', '3', '1', '1')]
+    stats = calculate_stats(character, equipments)
+
+    cases = [
+        Case('calculate_stats', lambda: calculate_stats(character, equipments)),
+        Case('calculate_damage', lambda: calculate_damage(character, stats)),
+        Case('calculate_next_affix_gain', lambda: calculate_next_affix_gain(character, stats, AFFIX_AVG_VALUES)),
+    ]
+    for size in sizes:
+        catalog = synthetic_catalog(size, seed)
+        cases.append(Case(f'find_best_combination[size={size}]',
+                          lambda catalog=catalog: find_best_combination(character, catalog=catalog)))
+        cases.append(Case(f'branch_and_bound[size={size}]',
+                          lambda catalog=catalog: find_best_combination(character, catalog=catalog,
+                                                                        method='branch_and_bound')))
+    catalog = synthetic_catalog(min(sizes), seed)
+    for slot_count in slot_counts:
+        slot_layouts = layout_rules.get_layouts(catalog, EQUIPMENT_COSTS, character.base_type,
+                                                slot_count=slot_count)
+        cases.append(Case(f'find_best_combination[slots={slot_count}]',
+                          lambda slot_layouts=slot_layouts: find_best_combination(character, catalog=catalog,
+                                                                                  layouts=slot_layouts)))
+    for roster_size in roster_sizes:
+        roster = synthetic_roster(roster_size, seed)
+        cases.append(Case(f'find_best_combination[roster={roster_size}]',
+                          lambda roster=roster: [find_best_combination(member) for member in roster]))
+    return cases
+
+
+def measure(func: Callable[[], object], min_time: float = 0.2, repeat: int = 5) -> Dict[str, float]:
+    """
+    计时：先确定每轮的调用次数（使一轮至少 min_time 秒），再计时 repeat 轮
+
+    Returns:
+        {'seconds': 最快一轮的单次耗时, 'median': 各轮单次耗时的中位数, 'loops': 每轮调用次数}
+    """
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    timings = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        timings.append((time.perf_counter() - start) / loops)
+    return {'seconds': min(timings), 'median': statistics.median(timings), 'loops': loops}
+
+
+def run_cases(cases: Sequence[Case], min_time: float = 0.2, repeat: int = 5,
+              report: Callable[[str, Dict], None] = None) -> Dict[str, Dict[str, float]]:
+    """运行基准，report(名称, 结果) 在每项完成后调用"""
+    results = {}
+    for case in cases:
+        results[case.name] = measure(case.func, min_time, repeat)
+        if report is not None:
+            report(case.name, results[case.name])
+    return results
+
+
+def environment() -> Dict[str, str]:
+    """运行环境（记录在历史中，便于区分不同机器上的结果）"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ''
+    return {
+        'commit': commit,
+        'machine': platform.node(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+    }
+
+
+def load_history(path: str = DEFAULT_HISTORY_PATH) -> List[Dict]:
+    """读取历史记录，文件不存在时为空"""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('runs', [])
+
+
+def save_history(runs: List[Dict], path: str = DEFAULT_HISTORY_PATH):
+    """写入历史记录（先写临时文件再替换，中断时不损坏原文件）"""
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'runs': runs}, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def compare(results: Dict[str, Dict[str, float]], history: Sequence[Dict], threshold: float = DEFAULT_THRESHOLD,
+            window: int = DEFAULT_WINDOW, machine: str = None,
+            quick: bool = False) -> List[Tuple[str, float, float, float, bool]]:
+    """
+    与历史结果比较
+
+    Args:
+        results: 本次结果
+        history: 历史记录
+        threshold: 回归阈值（相对变慢比例）
+        window: 每项取最近几次运行的中位数作为比较基准
+        machine: 只与同一台机器的历史比较（为空时不限）
+        quick: 本次是否为 --quick 运行；只与同一模式的历史比较（两种模式下同名基准的数据规模不同）
+
+    Returns:
+        [(名称, 本次耗时, 基准耗时, 相对变化, 是否回归), ...]；没有历史的项基准为 nan
+    """
+    history = [run for run in history if run.get('quick', False) == quick
+               and (machine is None or run.get('machine') == machine)]
+    rows = []
+    for name, result in results.items():
+        previous = [run['results'][name]['seconds'] for run in history if name in run.get('results', {})]
+        previous = previous[-window:]
+        if not previous:
+            rows.append((name, result['seconds'], float('nan'), float('nan'), False))
+            continue
+        baseline = statistics.median(previous)
+        change = result['seconds'] / baseline - 1
+        rows.append((name, result['seconds'], baseline, change, change > threshold))
+    return rows
+
+
+def format_seconds(seconds: float) -> str:
+    """耗时的可读形式"""
+    if seconds != seconds:  # nan
+        return '-'
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('µs', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g}{unit}"
+    return f"{seconds / 1e-9:.3g}ns"
+
+
+def main(argv: Sequence[str] = None) -> int:
+    """
+    命令行入口
+
+    Returns:
+        退出码：--fail-on-regression 且有回归时为 1，否则为 0
+    """
+    parser = argparse.ArgumentParser(description="优化器热点函数的性能基准")
+    parser.add_argument('-k', '--filter', default='', help="只运行名称包含该字符串的基准")
+    parser.add_argument('--quick', action='store_true', help="小规模快速运行")
+    parser.add_argument('--history', default=DEFAULT_HISTORY_PATH, help=f"历史文件，默认 {DEFAULT_HISTORY_PATH}")
+    parser.add_argument('--no-save', action='store_true', help="不写入历史文件")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="回归阈值（相对变慢比例），默认 0.2")
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW, help="与最近几次运行的中位数比较")
+    parser.add_argument('--fail-on-regression', action='store_true', help="有回归时退出码为 1")
+    parser.add_argument('--seed', type=int, default=0, help="合成数据的随机种子")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        cases = build_cases(QUICK_SIZES, QUICK_SLOT_COUNTS, QUICK_ROSTER_SIZES, args.seed)
+        min_time, repeat = 0.05, 3
+    else:
+        cases = build_cases(seed=args.seed)
+        min_time, repeat = 0.2, 5
+    cases = [case for case in cases if args.filter in case.name]
+    if not cases:
+        sys.stderr.write(f"没有名称包含 {args.filter} 的基准\n")
+        return 2
+
+    env = environment()
+    history = load_history(args.history)
+    width = max(len(case.name) for case in cases)
+    results = run_cases(cases, min_time, repeat,
+                        report=lambda name, result: print(f"  {name:<{width}}  {format_seconds(result['seconds'])}",
+                                                          flush=True))
+
+    # 中文标题每个字占两列
+    print(f"\n{'基准':<{width - 2}}  {'本次':>7}  {'历史':>7}  {'变化':>6}")
+    regressions = 0
+    for name, seconds, baseline, change, regressed in compare(results, history, args.threshold, args.window,
+                                                               env['machine'], args.quick):
+        change_text = '-' if change != change else f"{change:+.1%}"
+        flag = '  <- 回归' if regressed else ''
+        regressions += regressed
+        print(f"{name:<{width}}  {format_seconds(seconds):>9}  {format_seconds(baseline):>9}  {change_text:>8}{flag}")
+
+    if regressions:
+        print(f"\n{regressions} 项比最近 {args.window} 次运行的中位数慢 {args.threshold:.0%} 以上")
+    if not args.no_save:
+        history.append({'timestamp': datetime.now().isoformat(timespec='seconds'), **env,
+                        'quick': args.quick, 'results': results})
+        save_history(history, args.history)
+        print(f"结果已写入 {args.history}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
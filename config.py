@@ -0,0 +1,107 @@
+"""
+角色配置缓存
+
+characters.yml 只解析一次，之后直接复用解析结果；文件的修改时间或大小变化时自动重新解析。
+可选地在配置文件旁保存一份二进制快照（characters.yml.cache），冷启动时跳过 YAML 解析。
+
+缓存的数据由所有调用方共用，请勿直接修改。
+"""
+
+import os
+import pickle
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import yaml
+
+
+DEFAULT_CONFIG_PATH = 'characters.yml'
+
+# 二进制快照文件后缀及格式版本（格式变化时递增，旧快照自动失效）
+SNAPSHOT_SUFFIX = '.cache'
+SNAPSHOT_VERSION = 1
+
+# 优先使用 libyaml 的 C 实现
+_YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+@dataclass
+class ConfigEntry:
+    """一个配置文件的缓存"""
+    signature: tuple  # (修改时间ns, 文件大小)
+    data: dict  # 解析后的配置内容
+    compiled: dict = field(default_factory=dict)  # 由配置生成的对象缓存（如角色名 -> Character）
+
+
+_cache: Dict[str, ConfigEntry] = {}
+
+
+def file_signature(path: str) -> tuple:
+    """文件签名，文件不存在时抛出 FileNotFoundError"""
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def load(path: str = DEFAULT_CONFIG_PATH, snapshot: bool = False) -> ConfigEntry:
+    """
+    读取配置文件（带缓存）
+
+    Args:
+        path: 配置文件路径
+        snapshot: 是否使用二进制快照加速冷启动
+    """
+    key = os.path.abspath(path)
+    signature = file_signature(path)
+    entry = _cache.get(key)
+    if entry is None or entry.signature != signature:
+        data = _read_snapshot(path, signature) if snapshot else None
+        if data is None:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = yaml.load(f, Loader=_YamlLoader)
+            if snapshot:
+                _write_snapshot(path, signature, data)
+        entry = ConfigEntry(signature, data)
+        _cache[key] = entry
+    return entry
+
+
+def load_characters(path: str = DEFAULT_CONFIG_PATH, snapshot: bool = False) -> dict:
+    """配置文件中的全部角色数据：角色名 -> 配置"""
+    return load(path, snapshot).data['characters']
+
+
+def character_names(path: str = DEFAULT_CONFIG_PATH) -> List[str]:
+    """配置文件中的角色名称列表"""
+    return list(load_characters(path).keys())
+
+
+def invalidate(path: str = None):
+    """清除缓存（path 为空时清除全部）"""
+    if path is None:
+        _cache.clear()
+    else:
+        _cache.pop(os.path.abspath(path), None)
+
+
+def _read_snapshot(path: str, signature: tuple) -> Optional[dict]:
+    """读取与配置文件签名一致的快照，不存在或已过期时返回 None"""
+    try:
+        with open(path + SNAPSHOT_SUFFIX, 'rb') as f:
+            version, snapshot_signature, data = pickle.load(f)
+    except (OSError, pickle.PickleError, EOFError, ValueError, TypeError):
+        return None
+    if version != SNAPSHOT_VERSION or tuple(snapshot_signature) != signature:
+        return None
+    return data
+
+
+def _write_snapshot(path: str, signature: tuple, data: dict):
+    """写入快照（先写临时文件再替换，避免留下不完整的快照）"""
+    snapshot_path = path + SNAPSHOT_SUFFIX
+    tmp_path = snapshot_path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((SNAPSHOT_VERSION, signature, data), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, snapshot_path)
+    except OSError:
+        pass
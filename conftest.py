@@ -0,0 +1,40 @@
+"""
+测试公用的角色数据
+
+各测试文件既可以用 pytest 运行，也可以直接作为脚本运行，因此这里提供普通函数而不是 pytest fixture，
+测试文件中 from conftest import make_character 即可。
+"""
+
+from main import Character
+
+
+def make_character(**changes) -> Character:
+    """构造攻击型测试角色，可以用关键字参数修改个别字段"""
+    values = dict(
+        name="测试角色",
+        base_type="attack",
+        base_value=2000,
+        base_multiplier=0.2,
+        base_crit_rate=0.05,
+        base_crit_dmg=1.50,
+        base_dmg_bonus=0.0,
+        skill_multiplier=2.5
+    )
+    values.update(changes)
+    return Character(**values)
+
+
+def make_hp_character(**changes) -> Character:
+    """构造生命型测试角色，可以用关键字参数修改个别字段"""
+    values = dict(
+        name="生命测试",
+        base_type="hp",
+        base_value=16712,
+        base_multiplier=0.12,
+        base_crit_rate=1.0,
+        base_crit_dmg=1.50,
+        base_dmg_bonus=0.0,
+        skill_multiplier=0.5892
+    )
+    values.update(changes)
+    return Character(**values)
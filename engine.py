@@ -0,0 +1,682 @@
+"""
+向量化装备评估引擎
+
+将 EQUIPMENT_TYPES 转换为属性增量矩阵，对同一装备布局下的所有搭配
+做一次数组运算，批量计算期望伤害，避免逐个搭配创建 Stats 对象。
+
+属性向量列顺序见 STAT_FIELDS（base_value 不随装备变化，单独传入）。
+"""
+
+from functools import lru_cache
+from itertools import combinations, combinations_with_replacement, product
+from math import factorial
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# 计算结果的版本号：伤害公式或搜索结果的含义变化时递增，result_cache 中的旧结果随之失效
+ENGINE_VERSION = 1
+
+# 属性向量的列顺序
+STAT_FIELDS = ('flat_attack', 'percent_attack', 'flat_hp', 'percent_hp',
+               'crit_rate', 'crit_dmg', 'dmg_bonus')
+STAT_INDEX = {name: i for i, name in enumerate(STAT_FIELDS)}
+
+# 主词条名称 -> 属性字段
+MAIN_STAT_FIELDS = {
+    '暴击': 'crit_rate',
+    '爆伤': 'crit_dmg',
+    '攻击%': 'percent_attack',
+    '生命%': 'percent_hp',
+    '伤害加成': 'dmg_bonus',
+}
+
+# 副词条名称 -> 属性字段
+SUB_STAT_FIELDS = {
+    '固定攻击': 'flat_attack',
+    '固定生命': 'flat_hp',
+}
+
+
+def main_stat_code(name: str) -> int:
+    """主词条名称 -> 属性编号（STAT_FIELDS 中的下标），不影响伤害的词条为 -1"""
+    return STAT_INDEX[MAIN_STAT_FIELDS[name]] if name in MAIN_STAT_FIELDS else -1
+
+
+def sub_stat_code(name: str) -> int:
+    """副词条名称 -> 属性编号（STAT_FIELDS 中的下标），不影响伤害的词条为 -1"""
+    return STAT_INDEX[SUB_STAT_FIELDS[name]] if name in SUB_STAT_FIELDS else -1
+
+
+def substat_code(name: str) -> int:
+    """
+    实际装备上随机词条的名称 -> 属性编号，不影响伤害的词条（防御、共鸣效率等）为 -1
+
+    可以用主词条/副词条的中文名称（如 '暴击'、'固定攻击'），也可以直接用 STAT_FIELDS 中的字段名。
+    """
+    if name in STAT_INDEX:
+        return STAT_INDEX[name]
+    code = main_stat_code(name)
+    return code if code >= 0 else sub_stat_code(name)
+
+
+def equipment_delta(eq) -> np.ndarray:
+    """单件装备带来的属性增量向量"""
+    delta = np.zeros(len(STAT_FIELDS))
+    for code, value in equipment_terms(eq):
+        delta[code] += value
+    return delta
+
+
+def equipment_terms(eq) -> List[Tuple[int, float]]:
+    """单件装备的稀疏属性增量：[(属性编号, 数值), ...]，包含主词条、副词条和随机词条"""
+    terms = [(code, value) for code, value in ((eq.main_stat_code, eq.main_stat_value),
+                                               (eq.sub_stat_code, eq.sub_stat_value)) if code >= 0]
+    terms.extend(eq.substat_codes)
+    return terms
+
+
+def build_delta_matrix(equipments: Sequence) -> np.ndarray:
+    """将装备列表转换为 (装备数, 属性数) 的增量矩阵"""
+    if not equipments:
+        return np.zeros((0, len(STAT_FIELDS)))
+    return np.stack([equipment_delta(eq) for eq in equipments])
+
+
+def stats_to_vector(stats) -> np.ndarray:
+    """Stats 对象 -> 属性向量"""
+    return np.array([getattr(stats, name) for name in STAT_FIELDS], dtype=float)
+
+
+@lru_cache(maxsize=None)
+def layout_indices(slot_sizes: Tuple[int, ...]) -> np.ndarray:
+    """
+    生成某一布局下所有搭配的下标表
+
+    Args:
+        slot_sizes: 每个槽位可选装备的数量
+
+    Returns:
+        形状为 (搭配数, 槽位数) 的下标数组，行顺序与 itertools.product 一致
+    """
+    if not slot_sizes:
+        return np.zeros((1, 0), dtype=np.intp)
+    grid = np.indices(slot_sizes, dtype=np.intp)
+    return grid.reshape(len(slot_sizes), -1).T
+
+
+@lru_cache(maxsize=None)
+def multiset_indices(group_shape: Tuple[Tuple[int, int], ...],
+                     distinct: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    生成某一布局下所有不重复搭配（多重集）的下标表
+
+    同一类别内装备顺序不影响属性之和，因此每个类别只取下标不降的组合。
+
+    Args:
+        group_shape: 每个类别的 (可选装备数, 槽位数)
+        distinct: 每件装备最多使用一次（实际背包中的装备），每个类别只取下标严格递增的组合
+
+    Returns:
+        (indices, multiplicity)：indices 形状为 (搭配数, 槽位数)，
+        multiplicity[i] 为第 i 个搭配对应的排列数
+    """
+    group_rows = []
+    for option_count, slot_count in group_shape:
+        combine = combinations if distinct else combinations_with_replacement
+        rows = list(combine(range(option_count), slot_count))
+        counts = [_permutation_count(row) for row in rows]
+        group_rows.append((rows, counts))
+
+    indices = []
+    multiplicity = []
+    for choice in product(*(range(len(rows)) for rows, _ in group_rows)):
+        row = []
+        count = 1
+        for (rows, counts), i in zip(group_rows, choice):
+            row.extend(rows[i])
+            count *= counts[i]
+        indices.append(row)
+        multiplicity.append(count)
+
+    slot_total = sum(slot_count for _, slot_count in group_shape)
+    return (np.array(indices, dtype=np.intp).reshape(len(indices), slot_total),
+            np.array(multiplicity, dtype=np.int64))
+
+
+def _permutation_count(row: Tuple[int, ...]) -> int:
+    """多重集的排列数 n! / (c1! * c2! * ...)"""
+    count = factorial(len(row))
+    for i in set(row):
+        count //= factorial(row.count(i))
+    return count
+
+
+def accumulate_stats(base_vector: np.ndarray, slot_matrices: Sequence[np.ndarray],
+                     indices: np.ndarray) -> np.ndarray:
+    """按槽位顺序把装备增量累加到基础属性上，返回 (搭配数, 属性数) 的总属性"""
+    totals = np.tile(base_vector, (indices.shape[0], 1))
+    for slot, matrix in enumerate(slot_matrices):
+        totals += matrix[indices[:, slot]]
+    return totals
+
+
+def rotation_terms(character) -> List[Tuple[float, float, float, float, float, float]]:
+    """
+    技能循环的伤害项：[(倍率, 额外百分比, 额外固定值, 额外伤害加成, 额外暴击率, 额外暴击伤害), ...]
+
+    没有设置循环时只有一项 (skill_multiplier, 0, 0, 0, 0, 0)。
+    额外加成相同的段合并为一项（倍率 × 次数相加），每个搭配只需按不同的加成各算一次。
+    """
+    rotation = getattr(character, 'rotation', None)
+    if not rotation:
+        return [(character.skill_multiplier, 0.0, 0.0, 0.0, 0.0, 0.0)]
+
+    merged = {}
+    for hit in rotation:
+        key = (hit.percent, hit.flat, hit.dmg_bonus, hit.crit_rate, hit.crit_dmg)
+        merged[key] = merged.get(key, 0.0) + hit.multiplier * hit.count
+    return [(weight,) + key for key, weight in merged.items()]
+
+
+def plain_skill_multiplier(character) -> Optional[float]:
+    """各段都没有额外加成时，循环等价于单个技能倍率；否则返回 None"""
+    terms = rotation_terms(character)
+    if len(terms) == 1 and not any(terms[0][1:]):
+        return terms[0][0]
+    return None
+
+
+def score_totals(character, base_value: float, totals: np.ndarray) -> np.ndarray:
+    """
+    批量计算期望伤害，公式与 main.calculate_damage 一致
+
+    设置了技能循环时为各段伤害之和：每段用自己的倍率和额外加成计算，
+    所有段在 (搭配数, 伤害项数) 的数组上一次算完。
+
+    Args:
+        character: 角色对象
+        base_value: 基础攻击力或基础生命值
+        totals: (搭配数, 属性数) 的总属性数组
+    """
+    if character.base_type == 'attack':
+        x_percent = totals[:, STAT_INDEX['percent_attack']]
+        y = totals[:, STAT_INDEX['flat_attack']]
+    else:  # hp
+        x_percent = totals[:, STAT_INDEX['percent_hp']]
+        y = totals[:, STAT_INDEX['flat_hp']]
+
+    weights, percent, flat, bonus, crit, crit_dmg = (np.array(column) for column in zip(*rotation_terms(character)))
+    base = np.asarray(base_value, dtype=float)[..., None]  # base_value 也可以是与搭配数等长的数组
+    part1 = base * ((1 + x_percent + character.base_multiplier)[:, None] + percent) + y[:, None] + flat
+    part2 = 1 + totals[:, STAT_INDEX['dmg_bonus'], None] + bonus
+    crit_rate = np.minimum(totals[:, STAT_INDEX['crit_rate'], None] + crit, 1.0)
+    part3 = 1 + crit_rate * (totals[:, STAT_INDEX['crit_dmg'], None] + crit_dmg - 1)
+    part4 = weights
+
+    return (part1 * part2 * part3 * part4).sum(axis=1)
+
+
+def score_vector(character, base_value: float, vector: Sequence[float]) -> float:
+    """单个属性向量的期望伤害（标量版本的 score_totals）"""
+    if character.base_type == 'attack':
+        x_percent = vector[STAT_INDEX['percent_attack']]
+        y = vector[STAT_INDEX['flat_attack']]
+    else:  # hp
+        x_percent = vector[STAT_INDEX['percent_hp']]
+        y = vector[STAT_INDEX['flat_hp']]
+
+    damage = 0.0
+    for part4, percent, flat, bonus, crit, crit_dmg in rotation_terms(character):
+        part1 = base_value * (1 + x_percent + character.base_multiplier + percent) + y + flat
+        part2 = 1 + vector[STAT_INDEX['dmg_bonus']] + bonus
+        crit_rate = min(vector[STAT_INDEX['crit_rate']] + crit, 1.0)
+        part3 = 1 + crit_rate * (vector[STAT_INDEX['crit_dmg']] + crit_dmg - 1)
+        damage += part1 * part2 * part3 * part4
+    return damage
+
+
+def log_tangent(character, base_value: float, vector: np.ndarray,
+                reach: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    各伤害项取对数后的线性上界，供分支定界估计剩余装备的组合
+
+    对任意满足 0 <= delta <= reach（逐项）的属性增量，第 h 项伤害满足
+    log(伤害_h(vector + delta)) <= offsets[h] + weights[h] · delta。
+    三个乘数各自对增量是线性的（暴击区把 暴击率增量 × 暴伤增量 放大为 暴击率增量 × reach 中的暴伤），
+    对数是凹函数，在 "当前值 + 一半的可达增量" 处取切线即为上界。
+    与逐项取最大值的上界不同，它能反映不同装备在不同乘数之间的取舍。
+
+    Returns:
+        (offsets, weights)：(伤害项数,) 和 (伤害项数, 属性数) 的数组
+    """
+    if character.base_type == 'attack':
+        x_index, y_index = STAT_INDEX['percent_attack'], STAT_INDEX['flat_attack']
+    else:  # hp
+        x_index, y_index = STAT_INDEX['percent_hp'], STAT_INDEX['flat_hp']
+    bonus_index = STAT_INDEX['dmg_bonus']
+    crit_index, crit_dmg_index = STAT_INDEX['crit_rate'], STAT_INDEX['crit_dmg']
+
+    terms = rotation_terms(character)
+    offsets = np.empty(len(terms))
+    weights = np.zeros((len(terms), len(STAT_FIELDS)))
+    for h, (part4, percent, flat, bonus, crit, crit_dmg) in enumerate(terms):
+        grad1 = np.zeros(len(STAT_FIELDS))
+        grad1[x_index], grad1[y_index] = base_value, 1.0
+        part1 = base_value * (1 + vector[x_index] + character.base_multiplier + percent) + vector[y_index] + flat
+
+        grad2 = np.zeros(len(STAT_FIELDS))
+        grad2[bonus_index] = 1.0
+        part2 = 1 + vector[bonus_index] + bonus
+
+        crit_rate = min(vector[crit_index] + crit, 1.0)
+        extra = vector[crit_dmg_index] + crit_dmg - 1
+        grad3 = np.zeros(len(STAT_FIELDS))
+        grad3[crit_dmg_index] = crit_rate
+        grad3[crit_index] = extra + reach[crit_dmg_index] if crit_rate < 1.0 else 0.0
+        part3 = 1 + crit_rate * extra
+
+        offsets[h] = np.log(part4)
+        for value, grad in ((part1, grad1), (part2, grad2), (part3, grad3)):
+            shift = 0.5 * grad @ reach
+            point = value + shift
+            offsets[h] += np.log(point) - shift / point
+            weights[h] += grad / point
+    return offsets, weights
+
+
+def affix_tests(base_type: str) -> List[Tuple[str, str, str]]:
+    """各词条的 (显示名称, 词条键, 影响的属性字段)，百分比和固定值按角色类型区分"""
+    tests = [
+        ("暴击", "crit_rate", "crit_rate"),
+        ("爆伤", "crit_dmg", "crit_dmg"),
+        ("伤害加成", "dmg_bonus", "dmg_bonus"),
+    ]
+    if base_type == 'attack':
+        tests.extend([
+            ("攻击百分比", "percent", "percent_attack"),
+            ("攻击固定值", "flat_atk", "flat_attack"),
+        ])
+    else:
+        tests.extend([
+            ("生命百分比", "percent", "percent_hp"),
+            ("生命固定值", "flat_hp", "flat_hp"),
+        ])
+    return tests
+
+
+def affix_gain_matrix(character, base_value, totals: np.ndarray,
+                      affix_values: Dict[str, float]) -> Tuple[List[Tuple[str, str]], np.ndarray, np.ndarray]:
+    """
+    批量计算每个搭配再增加一条各类词条后的伤害提升
+
+    每条词条只改变一个乘区，伤害提升 = 其余乘区之积 × 该乘区的增量，
+    结果与重新计算完整伤害一致，不需要复制属性对象。
+
+    Args:
+        character: 角色对象
+        base_value: 基础攻击力或基础生命值（标量，或与搭配数等长的数组）
+        totals: (搭配数, 属性数) 的总属性数组
+        affix_values: 词条键 -> 单条词条数值，如 {"crit_rate": 0.093, ...}
+
+    Returns:
+        (columns, damages, increases)：columns 为各列的 (显示名称, 词条键)，
+        damages 为当前伤害 (搭配数,)，increases 为伤害提升 (搭配数, 词条数)
+    """
+    if character.base_type == 'attack':
+        x_percent = totals[:, STAT_INDEX['percent_attack']]
+        y = totals[:, STAT_INDEX['flat_attack']]
+    else:  # hp
+        x_percent = totals[:, STAT_INDEX['percent_hp']]
+        y = totals[:, STAT_INDEX['flat_hp']]
+
+    crit_rate = totals[:, STAT_INDEX['crit_rate']]
+    crit_dmg = totals[:, STAT_INDEX['crit_dmg']]
+
+    # 技能循环各段有额外加成时乘区不能分开计算，改为加上词条后重新计算伤害
+    part4 = plain_skill_multiplier(character)
+    if part4 is None:
+        damages = score_totals(character, base_value, totals)
+    else:
+        part1 = base_value * (1 + x_percent + character.base_multiplier) + y
+        part2 = 1 + totals[:, STAT_INDEX['dmg_bonus']]
+        part3 = 1 + np.minimum(crit_rate, 1.0) * (crit_dmg - 1)
+        damages = part1 * part2 * part3 * part4
+
+    columns = []
+    increases = []
+    for label, key, field in affix_tests(character.base_type):
+        if key not in affix_values:
+            continue
+        value = affix_values[key]
+        if part4 is None:
+            shifted = totals.copy()
+            shifted[:, STAT_INDEX[field]] += value
+            increase = score_totals(character, base_value, shifted) - damages
+        elif field == 'crit_rate':
+            delta = (1 + np.minimum(crit_rate + value, 1.0) * (crit_dmg - 1)) - part3
+            increase = part1 * part2 * delta * part4
+        elif field == 'crit_dmg':
+            delta = np.minimum(crit_rate, 1.0) * value
+            increase = part1 * part2 * delta * part4
+        elif field == 'dmg_bonus':
+            increase = part1 * value * part3 * part4
+        elif field in ('percent_attack', 'percent_hp'):
+            increase = base_value * value * part2 * part3 * part4
+        else:  # 固定值
+            increase = value * part2 * part3 * part4
+        columns.append((label, key))
+        increases.append(increase)
+
+    if increases:
+        increases = np.stack(increases, axis=1)
+    else:
+        increases = np.zeros((len(damages), 0))
+    return columns, damages, increases
+
+
+# 多目标搜索和约束可用的指标（另外 STAT_FIELDS 中的属性字段也可以直接作为指标）
+METRIC_NAMES = ('damage', 'non_crit_damage', 'final_value')
+
+# 按角色类型区分的最终数值别名：攻击型角色的 final_attack、生命型角色的 final_hp 即 final_value
+FINAL_VALUE_ALIASES = {'final_attack': 'attack', 'final_hp': 'hp'}
+
+
+def resolve_metric(character, name: str) -> str:
+    """将指标名称规范化（处理 final_attack/final_hp 别名），未知指标抛出 ValueError"""
+    if name in FINAL_VALUE_ALIASES:
+        if FINAL_VALUE_ALIASES[name] != character.base_type:
+            raise ValueError(f"{character.base_type} 型角色无法计算指标: {name}")
+        return 'final_value'
+    if name not in METRIC_NAMES and name not in STAT_INDEX:
+        raise ValueError(f"未知的指标: {name}")
+    return name
+
+
+def metric_columns(character, base_value: float, totals: np.ndarray,
+                   metrics: Sequence[str]) -> np.ndarray:
+    """
+    批量计算每个搭配的各项指标（数值越大越好）
+
+    Args:
+        character: 角色对象
+        base_value: 基础攻击力或基础生命值
+        totals: (搭配数, 属性数) 的总属性数组
+        metrics: 指标名称
+            'damage' - 期望伤害
+            'non_crit_damage' - 不暴击时的伤害
+            'final_value' - 最终攻击力或最终生命值（按角色类型），
+                也可以写作 'final_attack'（攻击型）或 'final_hp'（生命型）
+            STAT_FIELDS 中的字段 - 该项总属性，如 'crit_rate'、'flat_hp'
+
+    Returns:
+        (搭配数, 指标数) 的数组
+    """
+    metrics = [resolve_metric(character, name) for name in metrics]
+    if character.base_type == 'attack':
+        x_percent = totals[:, STAT_INDEX['percent_attack']]
+        y = totals[:, STAT_INDEX['flat_attack']]
+    else:  # hp
+        x_percent = totals[:, STAT_INDEX['percent_hp']]
+        y = totals[:, STAT_INDEX['flat_hp']]
+
+    part1 = base_value * (1 + x_percent + character.base_multiplier) + y
+
+    columns = []
+    for name in metrics:
+        if name == 'damage':
+            columns.append(score_totals(character, base_value, totals))
+        elif name == 'non_crit_damage':
+            weights, percent, flat, bonus, _, _ = (np.array(column) for column in zip(*rotation_terms(character)))
+            base = np.asarray(base_value, dtype=float)[..., None]
+            hit_part1 = base * ((1 + x_percent + character.base_multiplier)[:, None] + percent) + y[:, None] + flat
+            part2 = 1 + totals[:, STAT_INDEX['dmg_bonus'], None] + bonus
+            columns.append((hit_part1 * part2 * weights).sum(axis=1))
+        elif name == 'final_value':
+            columns.append(part1)
+        else:
+            columns.append(totals[:, STAT_INDEX[name]])
+
+    if not columns:
+        return np.zeros((totals.shape[0], 0))
+    return np.stack(columns, axis=1)
+
+
+def metric_value(character, base_value: float, vector: Sequence[float], name: str) -> float:
+    """单个属性向量的指标（标量版本的 metric_columns，name 须已经过 resolve_metric）"""
+    if name in STAT_INDEX:
+        return vector[STAT_INDEX[name]]
+
+    if character.base_type == 'attack':
+        x_percent = vector[STAT_INDEX['percent_attack']]
+        y = vector[STAT_INDEX['flat_attack']]
+    else:  # hp
+        x_percent = vector[STAT_INDEX['percent_hp']]
+        y = vector[STAT_INDEX['flat_hp']]
+
+    part1 = base_value * (1 + x_percent + character.base_multiplier) + y
+    if name == 'final_value':
+        return part1
+    if name == 'non_crit_damage':
+        return sum((base_value * (1 + x_percent + character.base_multiplier + percent) + y + flat)
+                   * (1 + vector[STAT_INDEX['dmg_bonus']] + bonus) * part4
+                   for part4, percent, flat, bonus, _, _ in rotation_terms(character))
+    return score_vector(character, base_value, vector)
+
+
+def parse_constraints(character, constraints: Dict[str, Dict[str, float]]) -> List[Tuple[str, float, float]]:
+    """
+    解析约束配置
+
+    Args:
+        character: 角色对象
+        constraints: 指标名称 -> {'min': 下限, 'max': 上限}（可只写其一），
+            如 {'crit_rate': {'min': 0.7}, 'final_hp': {'min': 30000}}
+
+    Returns:
+        [(规范化的指标名称, 下限, 上限), ...]，未设置的一侧为 ±inf
+    """
+    parsed = []
+    for name, bounds in (constraints or {}).items():
+        unknown = set(bounds) - {'min', 'max'}
+        if unknown:
+            raise ValueError(f"约束 {name} 只能设置 min/max: {sorted(unknown)}")
+        parsed.append((resolve_metric(character, name),
+                       float(bounds.get('min', -np.inf)), float(bounds.get('max', np.inf))))
+    return parsed
+
+
+def feasible_mask(character, base_value: float, totals: np.ndarray,
+                  constraints: Sequence[Tuple[str, float, float]]) -> np.ndarray:
+    """批量判断每个搭配是否满足约束（constraints 为 parse_constraints 的结果）"""
+    mask = np.ones(totals.shape[0], dtype=bool)
+    if constraints:
+        values = metric_columns(character, base_value, totals, [name for name, _, _ in constraints])
+        for col, (_, low, high) in enumerate(constraints):
+            mask &= (values[:, col] >= low) & (values[:, col] <= high)
+    return mask
+
+
+def layout_totals(base_stats, groups: Sequence[Tuple[Sequence, int]],
+                  enumeration: str = 'product') -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    计算某一布局下所有搭配的总属性
+
+    Args:
+        base_stats: 未穿装备时的属性（calculate_stats(character, [])）
+        groups: 每个类别的 (可选装备列表, 槽位数)
+        enumeration: 'product' 枚举全部排列；'multiset' 每个不重复搭配只计算一次；
+            'distinct' 同 'multiset'，但每件装备最多使用一次
+
+    Returns:
+        (totals, indices, multiplicity)：totals 为 (搭配数, 属性数) 的总属性，
+        indices[i] 为第 i 个搭配在各槽位选择的装备下标，multiplicity[i] 为该搭配代表的排列数
+    """
+    return layout_totals_from_vector(stats_to_vector(base_stats), groups, enumeration)
+
+
+def layout_totals_from_vector(base_vector: np.ndarray, groups: Sequence[Tuple[Sequence, int]],
+                              enumeration: str = 'product') -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """同 layout_totals，基础属性直接以属性向量给出"""
+    slot_options = slot_options_of(groups)
+    if enumeration == 'product':
+        indices = layout_indices(tuple(len(options) for options in slot_options))
+        multiplicity = np.ones(indices.shape[0], dtype=np.int64)
+    elif enumeration in ('multiset', 'distinct'):
+        indices, multiplicity = multiset_indices(
+            tuple((len(options), slot_count) for options, slot_count in groups), enumeration == 'distinct')
+    else:
+        raise ValueError(f"未知的枚举方式: {enumeration}")
+
+    slot_matrices = [build_delta_matrix(options) for options in slot_options]
+    totals = accumulate_stats(base_vector, slot_matrices, indices)
+    return totals, indices, multiplicity
+
+
+def evaluate_layout(character, base_stats, groups: Sequence[Tuple[Sequence, int]],
+                    enumeration: str = 'product') -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    计算某一布局下所有搭配的期望伤害
+
+    Args:
+        character: 角色对象
+        base_stats: 未穿装备时的属性（calculate_stats(character, [])）
+        groups: 每个类别的 (可选装备列表, 槽位数)
+        enumeration: 'product' 枚举全部排列；'multiset' 每个不重复搭配只计算一次
+
+    Returns:
+        (damages, indices, multiplicity)，含义同 layout_totals
+    """
+    totals, indices, multiplicity = layout_totals(base_stats, groups, enumeration)
+    return score_totals(character, base_stats.base_value, totals), indices, multiplicity
+
+
+def slot_options_of(groups: Sequence[Tuple[Sequence, int]]) -> List[Sequence]:
+    """将 [(可选装备, 槽位数), ...] 展开为每个槽位的可选装备列表"""
+    return [options for options, slot_count in groups for _ in range(slot_count)]
+
+
+def best_loadout(character, base_stats, groups: Sequence[Tuple[Sequence, int]],
+                 enumeration: str = 'product',
+                 constraints: Sequence[Tuple[str, float, float]] = ()) -> Tuple[List, float, int]:
+    """
+    找出某一布局下期望伤害最高的搭配
+
+    Args:
+        constraints: parse_constraints 解析后的约束，只在满足约束的搭配中选择
+
+    Returns:
+        (装备列表, 期望伤害, 实际计算的搭配数)；
+        并列时取 itertools.product 顺序中最先出现的搭配；没有满足约束的搭配时装备列表为空
+    """
+    totals, indices, _ = layout_totals(base_stats, groups, enumeration)
+    damages = score_totals(character, base_stats.base_value, totals)
+    if constraints:
+        damages = np.where(feasible_mask(character, base_stats.base_value, totals, constraints), damages, -np.inf)
+    if len(damages) == 0 or not np.isfinite(damages).any():
+        return [], 0.0, len(damages)
+    slot_options = slot_options_of(groups)
+    best = int(np.argmax(damages))
+    equipments = [slot_options[slot][i] for slot, i in enumerate(indices[best])]
+    return equipments, float(damages[best]), len(damages)
+
+
+@dataclass
+class CompiledLayout:
+    """编译后的布局：所有搭配的装备增量之和，与角色无关"""
+    name: str
+    slot_options: List[Sequence]  # 每个槽位的可选装备
+    indices: np.ndarray  # (搭配数, 槽位数) 各槽位选择的装备下标
+    deltas: np.ndarray  # (搭配数, 属性数) 装备带来的属性增量之和
+    factors: Dict[str, Tuple[tuple, np.ndarray]] = field(default_factory=dict)  # 乘区 -> (输入, (搭配数, 伤害项数) 数组)
+
+
+class LoadoutScorer:
+    """
+    编译好的搭配集合
+
+    装备增量只在编译时枚举、累加一次。角色数值（基础属性、词条统计、技能倍率等）变化时，
+    每个搭配的总属性只是加上了不同的基础属性向量，直接在缓存的增量上重新计算伤害；
+    三个乘区分别按各自依赖的输入缓存，例如只改了暴击相关的数值时只重算暴击区。
+    """
+
+    def __init__(self, layout_groups: Sequence[Tuple[str, Sequence[Tuple[Sequence, int]]]],
+                 enumeration: str = 'multiset'):
+        """
+        Args:
+            layout_groups: [(布局名称, 该布局的 groups), ...]
+            enumeration: 同 layout_totals（默认每个不重复搭配只保留一次）
+        """
+        self.layouts = []
+        self.recomputed = {'attack_part': 0, 'bonus_part': 0, 'crit_part': 0}  # 各乘区实际重算的次数
+        zero = np.zeros(len(STAT_FIELDS))
+        for name, groups in layout_groups:
+            totals, indices, _ = layout_totals_from_vector(zero, groups, enumeration)
+            self.layouts.append(CompiledLayout(name, slot_options_of(groups), indices, totals))
+
+    def score(self, character, base_stats) -> List[np.ndarray]:
+        """各布局所有搭配的期望伤害，与 score_totals 对同样总属性的结果一致（仅有浮点舍入差异）"""
+        base_vector = stats_to_vector(base_stats)
+        base_value = base_stats.base_value
+        if character.base_type == 'attack':
+            x_index, y_index = STAT_INDEX['percent_attack'], STAT_INDEX['flat_attack']
+        else:  # hp
+            x_index, y_index = STAT_INDEX['percent_hp'], STAT_INDEX['flat_hp']
+        weights, percent, flat, bonus, crit, crit_dmg = (np.array(column) for column in zip(*rotation_terms(character)))
+        bonus_index, crit_index, crit_dmg_index = STAT_INDEX['dmg_bonus'], STAT_INDEX['crit_rate'], STAT_INDEX['crit_dmg']
+
+        # 每个乘区的输入：只要输入不变，缓存的乘区数组就可以直接复用
+        inputs = {
+            'attack_part': (character.base_type, base_value, base_vector[x_index], base_vector[y_index],
+                            character.base_multiplier, tuple(percent), tuple(flat)),
+            'bonus_part': (base_vector[bonus_index], tuple(bonus)),
+            'crit_part': (base_vector[crit_index], base_vector[crit_dmg_index], tuple(crit), tuple(crit_dmg)),
+        }
+
+        def compute(part: str, deltas: np.ndarray) -> np.ndarray:
+            if part == 'attack_part':
+                x_percent = base_vector[x_index] + deltas[:, x_index]
+                y = base_vector[y_index] + deltas[:, y_index]
+                return base_value * ((1 + x_percent + character.base_multiplier)[:, None] + percent) + y[:, None] + flat
+            if part == 'bonus_part':
+                return 1 + (base_vector[bonus_index] + deltas[:, bonus_index])[:, None] + bonus
+            crit_rate = np.minimum((base_vector[crit_index] + deltas[:, crit_index])[:, None] + crit, 1.0)
+            return 1 + crit_rate * ((base_vector[crit_dmg_index] + deltas[:, crit_dmg_index])[:, None] + crit_dmg - 1)
+
+        damages = []
+        for layout in self.layouts:
+            parts = []
+            for part, key in inputs.items():
+                cached = layout.factors.get(part)
+                if cached is None or cached[0] != key:
+                    cached = layout.factors[part] = (key, compute(part, layout.deltas))
+                    self.recomputed[part] += 1
+                parts.append(cached[1])
+            damages.append((parts[0] * parts[1] * parts[2] * weights).sum(axis=1))
+        return damages
+
+    def best(self, character, base_stats,
+             constraints: Sequence[Tuple[str, float, float]] = ()) -> List[Tuple[str, List, float, int]]:
+        """
+        各布局的最优搭配
+
+        Returns:
+            [(布局名称, 装备列表, 期望伤害, 搭配数), ...]；没有满足约束的搭配时装备列表为空、伤害为 0
+        """
+        results = []
+        base_vector = stats_to_vector(base_stats)
+        for layout, damages in zip(self.layouts, self.score(character, base_stats)):
+            if constraints:
+                totals = base_vector + layout.deltas
+                damages = np.where(feasible_mask(character, base_stats.base_value, totals, constraints),
+                                   damages, -np.inf)
+            if len(damages) == 0 or not np.isfinite(damages).any():
+                results.append((layout.name, [], 0.0, len(damages)))
+                continue
+            best = int(np.argmax(damages))
+            equipments = [layout.slot_options[slot][i] for slot, i in enumerate(layout.indices[best])]
+            results.append((layout.name, equipments, float(damages[best]), len(damages)))
+        return results
+
@@ -0,0 +1,356 @@
+"""
+背包装备优化
+
+从玩家实际拥有的装备（每件都有自己的随机词条）中选出最优的 5 件搭配。
+
+1. 导入：读取 JSON / YAML 格式的背包导出；几十万行的 JSONL / CSV 导出用 read_columns 逐行流式解析，
+   直接写入按列存放的紧凑数组（InventoryColumns），不为每件装备创建对象，只有剪枝后剩下的装备才转换为 Equipment
+2. 索引：按 (cost 类别, 主词条) 分桶
+3. 剪枝：只看影响伤害的属性，如果某件装备被同一 cost 类别中至少 k 件装备支配
+   （各项属性都不低于它且至少一项更高，k 为布局中该类别最多占用的槽位数），
+   那么任何用到它的搭配都可以换成一件没被用到的支配装备而伤害不降，可以直接删掉。
+   先在桶内剪枝（同主词条的装备最容易互相支配），再在整个类别内剪枝。
+4. 搜索：剩余装备作为装备目录交给 find_best_combination，每件装备最多使用一次。
+
+伤害计算与 calculate_stats / calculate_damage 完全一致。
+"""
+
+import csv
+import json
+import os
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import yaml
+
+import engine
+import layouts as layout_rules
+from main import Character, Equipment, EQUIPMENT_COSTS, find_best_combination
+
+
+def piece_from_dict(piece_data: dict) -> Equipment:
+    """
+    由一条导出数据构造装备
+
+    格式：{category: '4', main_stat_type: '暴击', main_stat_value: 0.22,
+           sub_stat_type: '固定攻击', sub_stat_value: 150, substats: {'爆伤': 0.138, ...}}
+    """
+    return Equipment(
+        category=str(piece_data['category']),
+        main_stat_type=piece_data['main_stat_type'],
+        main_stat_value=piece_data['main_stat_value'],
+        sub_stat_type=piece_data.get('sub_stat_type', ''),
+        sub_stat_value=piece_data.get('sub_stat_value', 0),
+        substats=dict(piece_data.get('substats') or {})
+    )
+
+
+def load_inventory(path: str) -> List[Equipment]:
+    """读取背包导出文件（.json 或 .yml/.yaml），内容为装备列表或 {'pieces': 装备列表}"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if os.path.splitext(path)[1].lower() == '.json':
+            data = json.load(f)
+        else:
+            data = yaml.safe_load(f)
+    if isinstance(data, dict):
+        data = data['pieces']
+    return [piece_from_dict(piece_data) for piece_data in data]
+
+
+# 导出行中装备本身的字段，其余字段（CSV 的其他列）视为随机词条
+PIECE_FIELDS = ('account', 'category', 'main_stat_type', 'main_stat_value', 'sub_stat_type', 'sub_stat_value',
+                'substats')
+
+
+@dataclass
+class InventoryColumns:
+    """
+    按列存放的背包装备
+
+    词条名称存为词汇表下标，随机词条只保留影响伤害的属性（按 engine.STAT_FIELDS 排列），
+    每件装备约占 80 字节，与装备数量成正比。
+    """
+    categories: np.ndarray  # (装备数,) category_names 中的下标
+    main_stats: np.ndarray  # (装备数,) 主词条在 stat_names 中的下标
+    main_values: np.ndarray  # (装备数,) 主词条数值
+    sub_stats: np.ndarray  # (装备数,) 副词条在 stat_names 中的下标
+    sub_values: np.ndarray  # (装备数,) 副词条数值
+    substats: np.ndarray  # (装备数, 属性数) 随机词条
+    category_names: List[str]
+    stat_names: List[str]
+
+    def __len__(self):
+        return len(self.categories)
+
+    @classmethod
+    def from_pieces(cls, pieces: Sequence[Equipment]) -> 'InventoryColumns':
+        """由 Equipment 列表构造"""
+        builder = ColumnBuilder()
+        for piece in pieces:
+            builder.append(piece.category, piece.main_stat_type, piece.main_stat_value,
+                           piece.sub_stat_type, piece.sub_stat_value, piece.substats)
+        return builder.build()
+
+    def delta_matrix(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """(装备数, 属性数) 的增量矩阵，与 engine.build_delta_matrix 对同样的装备结果一致"""
+        rows = np.arange(len(self)) if rows is None else rows
+        matrix = self.substats[rows].copy()
+        main_codes = np.array([engine.main_stat_code(name) for name in self.stat_names], dtype=int)[self.main_stats[rows]]
+        sub_codes = np.array([engine.sub_stat_code(name) for name in self.stat_names], dtype=int)[self.sub_stats[rows]]
+        for codes, values in ((main_codes, self.main_values[rows]), (sub_codes, self.sub_values[rows])):
+            hit = codes >= 0
+            np.add.at(matrix, (np.nonzero(hit)[0], codes[hit]), values[hit])
+        return matrix
+
+    def piece(self, row: int) -> Equipment:
+        """把第 row 件装备转换为 Equipment"""
+        return Equipment(
+            category=self.category_names[self.categories[row]],
+            main_stat_type=self.stat_names[self.main_stats[row]],
+            main_stat_value=float(self.main_values[row]),
+            sub_stat_type=self.stat_names[self.sub_stats[row]],
+            sub_stat_value=float(self.sub_values[row]),
+            substats={engine.STAT_FIELDS[code]: float(value)
+                      for code, value in enumerate(self.substats[row]) if value}
+        )
+
+
+class ColumnBuilder:
+    """逐行追加装备，数据存放在 array 中，build() 时才转换为 numpy 数组"""
+
+    def __init__(self):
+        self.categories = array('h')
+        self.main_stats = array('h')
+        self.main_values = array('d')
+        self.sub_stats = array('h')
+        self.sub_values = array('d')
+        self.substats = array('d')
+        self.category_names = {}
+        self.stat_names = {}
+        self.substat_codes = {}  # 随机词条名称 -> 属性编号
+
+    def __len__(self):
+        return len(self.categories)
+
+    def append(self, category: str, main_stat_type: str, main_stat_value: float,
+               sub_stat_type: str, sub_stat_value: float, substats: Dict[str, float]):
+        """追加一件装备；不影响伤害的随机词条直接丢弃"""
+        self.categories.append(self.category_names.setdefault(str(category), len(self.category_names)))
+        self.main_stats.append(self.stat_names.setdefault(main_stat_type, len(self.stat_names)))
+        self.main_values.append(float(main_stat_value))
+        self.sub_stats.append(self.stat_names.setdefault(sub_stat_type, len(self.stat_names)))
+        self.sub_values.append(float(sub_stat_value))
+        row = [0.0] * len(engine.STAT_FIELDS)
+        for name, value in substats.items():
+            code = self.substat_codes.get(name)
+            if code is None:
+                code = self.substat_codes[name] = engine.substat_code(name)
+            if code >= 0:
+                row[code] += float(value)
+        self.substats.extend(row)
+
+    def append_row(self, row: dict):
+        """追加一行导出数据（格式同 piece_from_dict；CSV 中其余非空列视为随机词条）"""
+        substats = row.get('substats') or {}
+        if isinstance(substats, str):
+            substats = json.loads(substats)
+        extra = {name: value for name, value in row.items()
+                 if name not in PIECE_FIELDS and value not in (None, '')}
+        self.append(row['category'], row['main_stat_type'], row['main_stat_value'],
+                    row.get('sub_stat_type') or '', row.get('sub_stat_value') or 0, {**substats, **extra})
+
+    def build(self) -> InventoryColumns:
+        return InventoryColumns(
+            categories=np.frombuffer(self.categories, dtype=np.int16),
+            main_stats=np.frombuffer(self.main_stats, dtype=np.int16),
+            main_values=np.frombuffer(self.main_values, dtype=float),
+            sub_stats=np.frombuffer(self.sub_stats, dtype=np.int16),
+            sub_values=np.frombuffer(self.sub_values, dtype=float),
+            substats=np.frombuffer(self.substats, dtype=float).reshape(-1, len(engine.STAT_FIELDS)),
+            category_names=list(self.category_names),
+            stat_names=list(self.stat_names)
+        )
+
+
+def iter_rows(path: str) -> Iterator[dict]:
+    """逐行读取 .jsonl 或 .csv 导出，每次只在内存中保留一行"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if os.path.splitext(path)[1].lower() == '.csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def read_columns(path: str) -> InventoryColumns:
+    """把 JSONL / CSV 导出流式读入 InventoryColumns"""
+    builder = ColumnBuilder()
+    for row in iter_rows(path):
+        builder.append_row(row)
+    return builder.build()
+
+
+def read_accounts(path: str) -> Iterator[Tuple[str, InventoryColumns]]:
+    """
+    按账号分批读取导出：同一账号的行需要连续存放（account 字段），
+    每次只保留一个账号的装备，逐个产出 (账号, InventoryColumns)
+    """
+    account, builder = None, ColumnBuilder()
+    for row in iter_rows(path):
+        row_account = str(row.get('account', ''))
+        if len(builder) and row_account != account:
+            yield account, builder.build()
+            builder = ColumnBuilder()
+        account = row_account
+        builder.append_row(row)
+    if len(builder):
+        yield account, builder.build()
+
+
+def build_index(pieces: Sequence[Equipment]) -> Dict[Tuple[str, str], List[Equipment]]:
+    """按 (cost 类别, 主词条) 分桶，桶内保持导入顺序"""
+    index = {}
+    for piece in pieces:
+        index.setdefault((piece.category, piece.main_stat_type), []).append(piece)
+    return index
+
+
+def dominated_mask(matrix: np.ndarray, keep: int) -> np.ndarray:
+    """
+    被至少 keep 件其他装备支配的装备
+
+    Args:
+        matrix: (装备数, 影响伤害的属性数) 的增量矩阵
+
+    属性完全相同的装备，排在前面的视为支配后面的，保证相同装备至少保留 keep 件。
+
+    先按各项属性从大到小排序（字典序，相同的装备保持原顺序），支配者一定排在被支配者前面；
+    再依次扫描，每件装备只和已保留的装备比较。被剔除的装备不需要参与比较：
+    支配它的至少 keep 件装备中，按排序最靠前的 keep 件一定都被保留，且同样支配之后的装备。
+    复杂度为 装备数 × 保留数，而不是装备数的平方。
+    """
+    n = len(matrix)
+    mask = np.ones(n, dtype=bool)
+    kept = np.empty_like(matrix)
+    size = 0
+    # np.lexsort 以最后一个键为主键：第一列为主键，依次比较各列，从大到小
+    for i in np.lexsort(-matrix.T[::-1]).tolist():
+        row = matrix[i]
+        if size >= keep and np.count_nonzero((kept[:size] >= row).all(axis=1)) >= keep:
+            continue
+        kept[size] = row
+        size += 1
+        mask[i] = False
+    return mask
+
+
+def surviving_rows(categories: Sequence[str], main_stats: Sequence[str], deltas: np.ndarray, base_type: str,
+                   slot_limits: Dict[str, int]) -> Dict[str, np.ndarray]:
+    """
+    剔除不可能出现在最优搭配中的装备，返回每个 cost 类别剩余装备的行号（升序）
+
+    Args:
+        categories: 每件装备的 cost 类别
+        main_stats: 每件装备的主词条（分桶用）
+        deltas: (装备数, 属性数) 的增量矩阵
+        base_type: 角色类型，决定哪些属性影响伤害
+        slot_limits: 每个 cost 类别在布局中最多占用的槽位数
+    """
+    columns = [engine.STAT_INDEX[name] for name in layout_rules.RELEVANT_FIELDS[base_type]]
+    matrix = deltas[:, columns]
+    categories = np.asarray(categories)
+    main_stats = np.asarray(main_stats)
+
+    rows_by_category = {}
+    for category, keep in slot_limits.items():
+        in_category = np.nonzero(categories == category)[0]
+        survivors = []
+        # 先在桶内剪枝，再在整个类别内剪枝
+        for main_stat in np.unique(main_stats[in_category]):
+            bucket = in_category[main_stats[in_category] == main_stat]
+            survivors.append(bucket[~dominated_mask(matrix[bucket], keep)])
+        survivors = np.sort(np.concatenate(survivors)) if survivors else in_category
+        rows_by_category[category] = survivors[~dominated_mask(matrix[survivors], keep)]
+    return rows_by_category
+
+
+def prune_inventory(pieces: Sequence[Equipment], base_type: str,
+                    slot_limits: Dict[str, int]) -> Dict[str, List[Equipment]]:
+    """
+    剔除不可能出现在最优搭配中的装备
+
+    Args:
+        pieces: 背包中的全部装备
+        base_type: 角色类型，决定哪些属性影响伤害
+        slot_limits: 每个 cost 类别在布局中最多占用的槽位数
+
+    Returns:
+        装备目录：cost 类别 -> 剩余装备（保持导入顺序）
+    """
+    rows = surviving_rows([piece.category for piece in pieces], [piece.main_stat_type for piece in pieces],
+                          engine.build_delta_matrix(pieces), base_type, slot_limits)
+    return {category: [pieces[row] for row in category_rows] for category, category_rows in rows.items()}
+
+
+def prune_columns(columns: InventoryColumns, base_type: str,
+                  slot_limits: Dict[str, int]) -> Dict[str, List[Equipment]]:
+    """同 prune_inventory，输入为按列存放的装备，只有剩余的装备才转换为 Equipment"""
+    category_names = np.array(columns.category_names, dtype=str)
+    rows = surviving_rows(category_names[columns.categories], columns.main_stats, columns.delta_matrix(),
+                          base_type, slot_limits)
+    return {category: [columns.piece(row) for row in category_rows] for category, category_rows in rows.items()}
+
+
+def slot_limits_of(layouts: Sequence[layout_rules.Layout]) -> Dict[str, int]:
+    """每个 cost 类别在所有布局中最多占用的槽位数"""
+    limits = {}
+    for layout in layouts:
+        for category in set(layout.categories):
+            limits[category] = max(limits.get(category, 0), layout.categories.count(category))
+    return limits
+
+
+def find_best_inventory(character: Character, pieces: Union[Sequence[Equipment], InventoryColumns],
+                        verbose: bool = False,
+                        costs: Dict[str, int] = None, method: str = 'branch_and_bound'):
+    """
+    从背包装备中找出最优搭配
+
+    Args:
+        character: 角色对象
+        pieces: 背包中的全部装备（Equipment 列表或 InventoryColumns）
+        verbose: 同 find_best_combination
+        costs: 各 cost 类别的 cost，默认 EQUIPMENT_COSTS
+        method: 'branch_and_bound'（默认）或 'exhaustive'（剪枝后仍按不重复组合穷举）
+
+    Returns:
+        同 find_best_combination；方案结果另含 'inventory'：{'pieces': 装备总数, 'candidates': 剪枝后剩余数}
+    """
+    if costs is None:
+        costs = EQUIPMENT_COSTS
+    layouts = layout_rules.generate_layouts(costs)
+    if layout_rules.dominance_holds(character.base_type, engine.parse_constraints(character, character.constraints)):
+        prune = prune_columns if isinstance(pieces, InventoryColumns) else prune_inventory
+        catalog = prune(pieces, character.base_type, slot_limits_of(layouts))
+    else:
+        # 有上限约束等情况下支配装备不一定可行，只做索引不剪枝
+        if isinstance(pieces, InventoryColumns):
+            pieces = [pieces.piece(row) for row in range(len(pieces))]
+        catalog = {}
+        for (category, _), bucket in build_index(pieces).items():
+            catalog.setdefault(category, []).extend(bucket)
+    for category in costs:
+        catalog.setdefault(category, [])
+
+    summary = {'pieces': len(pieces), 'candidates': sum(len(options) for options in catalog.values())}
+    # verbose=False 时各布局共用当前最优伤害，剪枝更多
+    results = find_best_combination(character, verbose=verbose, catalog=catalog, layouts=layouts,
+                                    method=method, enumeration='distinct')
+    best_result, all_results = results if verbose else (results, [results])
+    for result in all_results:
+        if result is not None:
+            result['inventory'] = summary
+    return results
@@ -0,0 +1,152 @@
+"""
+装备布局生成
+
+根据 cost 上限和槽位数推导所有合法的装备布局（如 44111、43311），
+并剔除可以证明被其他布局支配的布局。
+
+支配判定：若布局 A 的每个槽位都能一一对应到布局 B 的某个槽位，且 A 中该类别的
+任意一件装备，在 B 对应类别中都存在一件各项相关属性都不低于它的装备，则 A 的任意
+搭配都能在 B 中找到伤害不低于它的搭配，A 可以直接跳过。
+（伤害公式对各项属性单调不减，前提是总爆伤不低于 100%。）
+"""
+
+from dataclasses import dataclass
+from itertools import combinations_with_replacement, permutations
+from typing import Dict, List, Sequence, Tuple
+
+import engine
+
+
+# 默认 cost 规则：5 个槽位，总 cost 不超过 12
+DEFAULT_COST_BUDGET = 12
+DEFAULT_SLOT_COUNT = 5
+
+# 不同角色类型会影响伤害的属性（其余属性对伤害没有贡献，支配判定时忽略）
+RELEVANT_FIELDS = {
+    'attack': ('flat_attack', 'percent_attack', 'crit_rate', 'crit_dmg', 'dmg_bonus'),
+    'hp': ('flat_hp', 'percent_hp', 'crit_rate', 'crit_dmg', 'dmg_bonus'),
+}
+
+
+@dataclass(frozen=True)
+class Layout:
+    """装备布局"""
+    name: str  # 布局名称，如 '44111'
+    categories: Tuple[str, ...]  # 每个槽位的装备类别，按 cost 从高到低排列
+    cost: int  # 总 cost
+
+    def groups(self, catalog: Dict[str, List]) -> List[Tuple[List, int]]:
+        """转换为 [(该类别可选装备, 槽位数), ...]，类别顺序与 categories 一致"""
+        ordered = list(dict.fromkeys(self.categories))
+        return [(catalog[category], self.categories.count(category)) for category in ordered]
+
+
+def generate_layouts(costs: Dict[str, int], cost_budget: int = DEFAULT_COST_BUDGET,
+                     slot_count: int = DEFAULT_SLOT_COUNT) -> List[Layout]:
+    """
+    枚举所有总 cost 不超过上限、恰好占满槽位数的布局
+
+    Args:
+        costs: 装备类别 -> cost，如 {'4': 4, '3': 3, '1': 1}
+        cost_budget: 总 cost 上限
+        slot_count: 槽位数
+
+    Returns:
+        布局列表，按类别 cost 从高到低的字典序排列（44111, 43311, 43111, ...）
+    """
+    categories = sorted(costs, key=lambda category: costs[category], reverse=True)
+    layouts = []
+    for combo in combinations_with_replacement(categories, slot_count):
+        cost = sum(costs[category] for category in combo)
+        if cost <= cost_budget:
+            layouts.append(Layout(''.join(combo), combo, cost))
+    return layouts
+
+
+def dominance_holds(base_type: str, constraints: Sequence[Tuple[str, float, float]]) -> bool:
+    """
+    约束下支配剪枝是否仍然成立
+
+    只有下限约束、且约束的指标都由伤害相关属性决定时，支配者同样满足约束
+    （constraints 为 engine.parse_constraints 的结果）。
+    """
+    relevant = set(RELEVANT_FIELDS[base_type]) | set(engine.METRIC_NAMES)
+    return all(name in relevant and high == float('inf') for name, _, high in constraints)
+
+
+def category_dominates(lower: Sequence, upper: Sequence, fields: Sequence[str]) -> bool:
+    """lower 类别中的每件装备，是否都能在 upper 类别中找到相关属性全部不低于它的装备"""
+    if not lower:
+        return True
+    if not upper:
+        return False
+    columns = [engine.STAT_INDEX[field] for field in fields]
+    lower_matrix = engine.build_delta_matrix(lower)[:, columns]
+    upper_matrix = engine.build_delta_matrix(upper)[:, columns]
+    covered = (upper_matrix[None, :, :] >= lower_matrix[:, None, :]).all(axis=2)
+    return bool(covered.any(axis=1).all())
+
+
+def layout_dominates(lower: Layout, upper: Layout, dominance: Dict[Tuple[str, str], bool]) -> bool:
+    """lower 布局的槽位是否能一一对应到 upper 布局中支配它的槽位"""
+    if len(lower.categories) != len(upper.categories):
+        return False
+    for order in set(permutations(upper.categories)):
+        if all(a == b or dominance[(a, b)] for a, b in zip(lower.categories, order)):
+            return True
+    return False
+
+
+def prune_dominated(layouts: List[Layout], catalog: Dict[str, List], base_type: str) -> List[Layout]:
+    """
+    剔除被支配的布局
+
+    两个布局互相支配时保留排在前面的那个。
+    """
+    fields = RELEVANT_FIELDS[base_type]
+    dominance = {
+        (a, b): category_dominates(catalog[a], catalog[b], fields)
+        for a in catalog for b in catalog if a != b
+    }
+
+    kept = []
+    for i, layout in enumerate(layouts):
+        dominated = False
+        for j, other in enumerate(layouts):
+            if i == j or not layout_dominates(layout, other, dominance):
+                continue
+            # 互相支配时只剔除后面的布局
+            if j < i or not layout_dominates(other, layout, dominance):
+                dominated = True
+                break
+        if not dominated:
+            kept.append(layout)
+    return kept
+
+
+_layout_cache = {}
+
+
+def get_layouts(catalog: Dict[str, List], costs: Dict[str, int], base_type: str,
+                cost_budget: int = DEFAULT_COST_BUDGET,
+                slot_count: int = DEFAULT_SLOT_COUNT) -> List[Layout]:
+    """
+    获取某一角色类型下需要搜索的布局（生成 + 剔除被支配布局）
+
+    结果按装备目录和 cost 规则缓存，同一次运行中的所有角色共用。
+    """
+    key = (_catalog_key(catalog), tuple(sorted(costs.items())), base_type, cost_budget, slot_count)
+    if key not in _layout_cache:
+        layouts = generate_layouts(costs, cost_budget, slot_count)
+        _layout_cache[key] = prune_dominated(layouts, catalog, base_type)
+    return _layout_cache[key]
+
+
+def _catalog_key(catalog: Dict[str, List]) -> tuple:
+    """装备目录的可哈希表示"""
+    return tuple(
+        (category, tuple((eq.main_stat_type, eq.main_stat_value, eq.sub_stat_type, eq.sub_stat_value,
+                          tuple(sorted(eq.substats.items())))
+                         for eq in pieces))
+        for category, pieces in catalog.items()
+    )
@@ -14,10 +14,17 @@
 - 技能倍率: 角色技能的伤害倍率
 """
 
-import yaml
-from dataclasses import dataclass
-from typing import List, Dict
-from itertools import product
+import copy
+import numpy as np
+from dataclasses import dataclass, asdict, field, replace
+from typing import Callable, List, Dict
+from itertools import product, combinations, combinations_with_replacement
+
+import config
+import engine
+import layouts as layout_rules
+import search
+import timeline
 
 
 @dataclass
@@ -28,11 +35,33 @@ class Equipment:
     main_stat_value: float  # 主词条数值
     sub_stat_type: str  # 副词条类型
     sub_stat_value: float  # 副词条数值
+    substats: Dict[str, float] = field(default_factory=dict)  # 实际装备上的随机词条，如 {'暴击': 0.081}
+
+    def __post_init__(self):
+        # 词条名称预先转换为属性编号（engine.STAT_FIELDS 中的下标，-1 表示不影响伤害）
+        self.main_stat_code = engine.main_stat_code(self.main_stat_type)
+        self.sub_stat_code = engine.sub_stat_code(self.sub_stat_type)
+        self.substat_codes = [(code, value) for code, value in
+                              ((engine.substat_code(name), value) for name, value in self.substats.items())
+                              if code >= 0]
 
     def __repr__(self):
         return f"{self.category}类-主:{self.main_stat_type}{self.main_stat_value}+副:{self.sub_stat_type}{self.sub_stat_value}"
 
 
+@dataclass
+class Hit:
+    """技能循环中的一段伤害"""
+    name: str
+    multiplier: float  # 该段技能倍率
+    count: int = 1  # 次数
+    percent: float = 0.0  # 该段额外攻击%/生命%（与 base_multiplier 同乘区）
+    flat: float = 0.0  # 该段额外固定攻击/固定生命
+    dmg_bonus: float = 0.0  # 该段额外伤害加成
+    crit_rate: float = 0.0  # 该段额外暴击率
+    crit_dmg: float = 0.0  # 该段额外暴击伤害
+
+
 @dataclass
 class Character:
     """角色类"""
@@ -44,11 +73,16 @@ class Character:
     base_crit_dmg: float  # 总暴击伤害（如1.5表示150%）
     base_dmg_bonus: float  # 基础伤害加成
     skill_multiplier: float  # 技能倍率
+    constraints: Dict[str, Dict[str, float]] = field(default_factory=dict)  # 属性约束，如 {'crit_rate': {'min': 0.7}}
+    rotation: List[Hit] = field(default_factory=list)  # 技能循环，设置后按各段伤害之和计算（不再使用 skill_multiplier）
 
 
 @dataclass
 class Stats:
-    """属性汇总"""
+    """属性汇总（base_value 之后的字段顺序与 engine.STAT_FIELDS 一致）"""
+    __slots__ = ('base_value', 'flat_attack', 'percent_attack', 'flat_hp', 'percent_hp',
+                 'crit_rate', 'crit_dmg', 'dmg_bonus')
+
     base_value: float  # 基础数值(攻击或生命)
     flat_attack: float  # 固定攻击
     percent_attack: float  # 攻击百分比
@@ -76,16 +110,80 @@ EQUIPMENT_TYPES = {
     ]
 }
 
+# calculate_stats 使用的属性编号
+_FLAT_ATTACK = engine.STAT_INDEX['flat_attack']
+_FLAT_HP = engine.STAT_INDEX['flat_hp']
+_CRIT_RATE = engine.STAT_INDEX['crit_rate']
+_CRIT_DMG = engine.STAT_INDEX['crit_dmg']
+_DMG_BONUS = engine.STAT_INDEX['dmg_bonus']
+
+# 各类装备的 cost
+EQUIPMENT_COSTS = {'4': 4, '3': 3, '1': 1}
+
+
+class SearchCancelled(Exception):
+    """搜索被取消（由 find_best_combination 的进度回调抛出）"""
+
+
+def load_character(character_name: str, config_path: str = 'characters.yml') -> Character:
+    """从配置文件加载角色数据（配置文件解析结果和角色对象均有缓存，文件修改后自动失效）"""
+    entry = config.load(config_path)
+
+    if character_name not in entry.compiled:
+        char_data = entry.data['characters'].get(character_name)
+        if not char_data:
+            raise ValueError(f"角色 {character_name} 未找到")
+        entry.compiled[character_name] = character_from_dict(character_name, char_data)
+
+    # 返回副本（约束和技能循环也复制，replace 只是浅复制），调用方修改角色属性不影响缓存
+    cached = entry.compiled[character_name]
+    return replace(cached, constraints=copy.deepcopy(cached.constraints),
+                   rotation=[replace(hit) for hit in cached.rotation])
 
-def load_character(character_name: str) -> Character:
-    """从配置文件加载角色数据"""
-    with open('characters.yml', 'r', encoding='utf-8') as f:
-        data = yaml.safe_load(f)
 
-    char_data = data['characters'].get(character_name)
-    if not char_data:
-        raise ValueError(f"角色 {character_name} 未找到")
+def rotation_from_list(rotation_data: List[dict]) -> List[Hit]:
+    """
+    由配置文件中的 rotation 列表构造技能循环（未写名称的段按顺序命名）
+
+    某一段缺少倍率或带有未知字段时抛出 ValueError，指出是第几段
+    """
+    rotation = []
+    for i, hit_data in enumerate(rotation_data or [], 1):
+        try:
+            hit_data = dict(hit_data)
+            hit_data.setdefault('name', f"第{i}段")
+            rotation.append(Hit(**hit_data))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"技能循环第{i}段格式错误: {hit_data}（{e}）") from e
+    return rotation
+
+
+def rotation_multiplier(rotation: List[Hit]) -> float:
+    """技能循环的总倍率（各段倍率 × 次数之和，不含额外加成）"""
+    return sum(hit.multiplier * hit.count for hit in rotation)
+
+
+def character_rotation(char_data: dict) -> List[Hit]:
+    """
+    角色配置数据中的技能循环
 
+    设置了 timeline（增益时间轴）时先模拟时间轴，得到的技能循环作为 rotation；
+    timeline 和 rotation 只能设置其中一个（同时设置时无法确定以哪个为准），
+    两者同时设置或时间轴内没有释放任何技能时抛出 ValueError（不能退回到技能倍率计算）。
+    """
+    if char_data.get('timeline'):
+        if char_data.get('rotation'):
+            raise ValueError("timeline 和 rotation 只能设置其中一个")
+        rotation = rotation_from_list(timeline.rotation_from_config(char_data['timeline']))
+        if not rotation:
+            raise ValueError("时间轴内没有释放任何技能，请检查 skills 和 duration")
+        return rotation
+    return rotation_from_list(char_data.get('rotation'))
+
+
+def character_from_dict(character_name: str, char_data: dict) -> Character:
+    """由配置文件中的一条角色数据构造角色对象（技能循环见 character_rotation）"""
+    rotation = character_rotation(char_data)
     return Character(
         name=character_name,
         base_type=char_data['base_type'],
@@ -94,48 +192,66 @@ def load_character(character_name: str) -> Character:
         base_crit_rate=char_data['base_crit_rate'],
         base_crit_dmg=char_data['base_crit_dmg'],
         base_dmg_bonus=char_data['base_dmg_bonus'],
-        skill_multiplier=char_data.get('skill_multiplier', 1.0)  # 默认倍率为1.0
+        # 默认倍率为1.0；设置了技能循环时为循环的总倍率（仅用于展示）
+        skill_multiplier=char_data.get('skill_multiplier', rotation_multiplier(rotation) if rotation else 1.0),
+        constraints=dict(char_data.get('constraints') or {}),
+        rotation=rotation
     )
 
 
+def apply_affix_stats(character: Character, affix_stats: dict) -> Character:
+    """
+    将词条统计加到角色基础属性上，返回新的角色对象
+
+    暴击、爆伤、伤害加成、百分比词条直接加到对应的基础属性（百分比与 base_multiplier 同乘区），
+    固定值词条保存在 affix_stats 中，由 calculate_stats 计算时加上。
+
+    Args:
+        character: 角色对象
+        affix_stats: 词条统计，格式: {"crit_rate": {"count": 4, "avg": 0.093, "total": 0.372}, ...}
+    """
+    def total(key):
+        return affix_stats.get(key, {}).get('total', 0)
+
+    result = replace(
+        character,
+        base_crit_rate=character.base_crit_rate + total('crit_rate'),
+        base_crit_dmg=character.base_crit_dmg + total('crit_dmg'),
+        base_dmg_bonus=character.base_dmg_bonus + total('dmg_bonus'),
+        base_multiplier=character.base_multiplier + total('percent')
+    )
+    # 保存词条统计到角色对象,用于计算固定值和后续展示
+    result.affix_stats = affix_stats
+    return result
+
+
 def calculate_stats(character: Character, equipments: List[Equipment]) -> Stats:
     """计算装备后的总属性"""
-    stats = Stats(
-        base_value=character.base_value,
-        flat_attack=0,
-        percent_attack=0,
-        flat_hp=0,
-        percent_hp=0,
-        crit_rate=character.base_crit_rate,
-        crit_dmg=character.base_crit_dmg,
-        dmg_bonus=character.base_dmg_bonus
-    )
+    # 按属性编号累加（下标同 engine.STAT_FIELDS）
+    values = [0] * len(engine.STAT_FIELDS)
+    values[_CRIT_RATE] = character.base_crit_rate
+    values[_CRIT_DMG] = character.base_crit_dmg
+    values[_DMG_BONUS] = character.base_dmg_bonus
 
     for eq in equipments:
         # 主词条
-        if eq.main_stat_type == '暴击':
-            stats.crit_rate += eq.main_stat_value
-        elif eq.main_stat_type == '爆伤':
-            stats.crit_dmg += eq.main_stat_value
-        elif eq.main_stat_type == '攻击%':
-            stats.percent_attack += eq.main_stat_value
-        elif eq.main_stat_type == '生命%':
-            stats.percent_hp += eq.main_stat_value
-        elif eq.main_stat_type == '伤害加成':
-            stats.dmg_bonus += eq.main_stat_value
+        if eq.main_stat_code >= 0:
+            values[eq.main_stat_code] += eq.main_stat_value
 
         # 副词条
-        if eq.sub_stat_type == '固定攻击':
-            stats.flat_attack += eq.sub_stat_value
-        elif eq.sub_stat_type == '固定生命':
-            stats.flat_hp += eq.sub_stat_value
+        if eq.sub_stat_code >= 0:
+            values[eq.sub_stat_code] += eq.sub_stat_value
+
+        # 随机词条（实际背包中的装备）
+        for code, value in eq.substat_codes:
+            values[code] += value
 
     # 添加来自词条的固定值
     if hasattr(character, 'affix_stats'):
-        stats.flat_attack += character.affix_stats.get('flat_atk', {}).get('total', 0)
-        stats.flat_hp += character.affix_stats.get('flat_hp', {}).get('total', 0)
+        values[_FLAT_ATTACK] += character.affix_stats.get('flat_atk', {}).get('total', 0)
+        values[_FLAT_HP] += character.affix_stats.get('flat_hp', {}).get('total', 0)
 
-    return stats
+    return Stats(character.base_value, *values)
 
 
 def calculate_damage(character: Character, stats: Stats) -> float:
@@ -145,7 +261,11 @@ def calculate_damage(character: Character, stats: Stats) -> float:
 
     base_multiplier 与装备百分比属于同一乘区，相加计算
     总爆伤：输入的是总暴击伤害（如150% = 1.5），期望计算时用 (总爆伤 - 1)
+    设置了技能循环时，每段用自己的倍率和额外加成计算，结果为各段伤害之和
     """
+    if character.rotation:
+        return engine.score_vector(character, stats.base_value, [getattr(stats, name) for name in engine.STAT_FIELDS])
+
     # 根据角色类型确定 base, x%, y
     if character.base_type == 'attack':
         base = stats.base_value  # 基础攻击
@@ -190,118 +310,487 @@ def calculate_next_affix_gain(character: Character, stats: Stats, affix_avg_valu
     Returns:
         各词条的收益率字典
     """
-    from copy import deepcopy
+    return calculate_next_affix_gain_batch(character, [stats], affix_avg_values)[0]
 
-    current_damage = calculate_damage(character, stats)
-    gains = {}
-
-    # 测试各种词条
-    affix_tests = [
-        ("暴击", "crit_rate", lambda s, v: setattr(s, 'crit_rate', s.crit_rate + v)),
-        ("爆伤", "crit_dmg", lambda s, v: setattr(s, 'crit_dmg', s.crit_dmg + v)),
-        ("伤害加成", "dmg_bonus", lambda s, v: setattr(s, 'dmg_bonus', s.dmg_bonus + v)),
-    ]
-
-    # 根据角色类型添加百分比和固定值测试
-    if character.base_type == 'attack':
-        affix_tests.extend([
-            ("攻击百分比", "percent", lambda s, v: setattr(s, 'percent_attack', s.percent_attack + v)),
-            ("攻击固定值", "flat_atk", lambda s, v: setattr(s, 'flat_attack', s.flat_attack + v)),
-        ])
-    else:
-        affix_tests.extend([
-            ("生命百分比", "percent", lambda s, v: setattr(s, 'percent_hp', s.percent_hp + v)),
-            ("生命固定值", "flat_hp", lambda s, v: setattr(s, 'flat_hp', s.flat_hp + v)),
-        ])
-
-    for label, key, modifier in affix_tests:
-        if key not in affix_avg_values:
-            continue
 
-        # 创建临时stats副本
-        temp_stats = deepcopy(stats)
-        avg_value = affix_avg_values[key]
-
-        # 应用修改
-        modifier(temp_stats, avg_value)
-
-        # 计算新伤害
-        new_damage = calculate_damage(character, temp_stats)
-
-        # 计算收益率
-        gain_rate = (new_damage - current_damage) / current_damage * 100
-        gains[label] = {
-            "avg_value": avg_value,
-            "damage_increase": new_damage - current_damage,
-            "gain_rate": gain_rate
-        }
+def calculate_next_affix_gain_batch(character: Character, stats_list: List[Stats],
+                                    affix_avg_values: dict) -> List[dict]:
+    """
+    批量计算多组属性（如多个候选方案）下各词条的收益率
 
-    return gains
+    每条词条只影响一个乘区，直接由各乘区的增量算出伤害提升，所有属性一次数组运算完成。
 
+    Args:
+        character: 角色对象
+        stats_list: 属性列表
+        affix_avg_values: 词条平均值字典
 
-def find_best_combination(character: Character, verbose: bool = False):
+    Returns:
+        与 stats_list 顺序一致的收益率字典列表，格式同 calculate_next_affix_gain
+    """
+    if not stats_list:
+        return []
+
+    totals = np.stack([engine.stats_to_vector(stats) for stats in stats_list])
+    base_values = np.array([stats.base_value for stats in stats_list])
+    columns, damages, increases = engine.affix_gain_matrix(character, base_values, totals, affix_avg_values)
+
+    results = []
+    for row, current_damage in enumerate(damages):
+        gains = {}
+        for col, (label, key) in enumerate(columns):
+            damage_increase = float(increases[row, col])
+            gains[label] = {
+                "avg_value": affix_avg_values[key],
+                "damage_increase": damage_increase,
+                "gain_rate": damage_increase / float(current_damage) * 100
+            }
+        results.append(gains)
+    return results
+
+
+def find_best_combination(character: Character, verbose: bool = False, vectorized: bool = True,
+                          enumeration: str = 'product', catalog: Dict[str, List[Equipment]] = None,
+                          layouts: List[layout_rules.Layout] = None, method: str = 'exhaustive',
+                          resync_every: int = 0, constraints: Dict[str, Dict[str, float]] = None,
+                          progress: Callable[[int, int], None] = None):
     """
     找到最优装备组合
 
     Args:
         character: 角色对象
         verbose: 是否输出所有方案的详细信息
+        vectorized: 是否使用向量化引擎批量评估（False 时逐个搭配计算，用于核对结果）
+        enumeration: 搭配枚举方式
+            'product' - 按槽位枚举全部排列
+            'multiset' - 同类装备不区分顺序，每个不重复搭配只计算一次
+            'distinct' - 同 'multiset'，但每件装备最多使用一次（目录为实际背包时使用，
+                分支定界同样遵守）
+        catalog: 装备目录，默认 EQUIPMENT_TYPES
+        layouts: 要搜索的装备布局，默认按 EQUIPMENT_COSTS 和 cost 上限自动生成，
+            并剔除被支配的布局
+        method: 搜索方法
+            'exhaustive' - 穷举布局下的所有搭配
+            'branch_and_bound' - 逐槽位分支定界，用伤害上界剪枝（忽略 vectorized/enumeration）；
+                verbose=False 时各布局共用当前最优伤害，无法超过它的布局不出现在结果中
+            'gray_code' - 按格雷码顺序枚举全部排列，每步只更新一个槽位的属性增量
+                （忽略 vectorized/enumeration）
+        resync_every: 格雷码枚举每隔多少步从头重新求和一次以校正浮点误差，0 表示不校正
+        constraints: 属性约束，默认取 character.constraints（来自 characters.yml 的 constraints 项），
+            格式: {指标: {'min': 下限, 'max': 上限}}，指标见 engine.metric_columns，
+            如 {'crit_rate': {'min': 0.7}, 'final_hp': {'min': 30000}}。
+            只在满足约束的搭配中寻找最优；分支定界会提前剪掉无法满足约束的分支。
+            格雷码枚举不支持约束
+        progress: 进度回调 progress(已完成布局数, 布局总数)，每算完一个布局调用一次（开始前以 0 调用一次）；
+            回调中抛出 SearchCancelled 可以中止搜索
+
+    每个方案结果中 'evaluated' 为实际计算的搭配数，
+    'skipped_permutations' 为跳过的排列数（顺序重复或被剪枝），
+    'crit_overflow' 为暴击率超出 100% 而浪费的部分（没有浪费时为 0）。
+    分支定界的结果另外包含 'nodes_visited' 和 'nodes_pruned'。
     """
-    combinations = [
-        ('44111', 2, 0, 3),
-        ('43311', 1, 2, 2),
-        ('43111', 1, 1, 3)
-    ]
+    if constraints is None:
+        constraints = character.constraints
+    constraints = engine.parse_constraints(character, constraints)
+    if constraints and method == 'gray_code':
+        raise ValueError("格雷码枚举不支持属性约束")
+    if enumeration == 'distinct' and method == 'gray_code':
+        raise ValueError("格雷码枚举不支持每件装备只用一次")
+
+    if catalog is None:
+        catalog = EQUIPMENT_TYPES
+    if layouts is None:
+        layouts = _default_layouts(character, catalog, constraints, enumeration)
 
     best_result = None
     best_damage = 0
     all_results = []  # 存储所有方案的结果
 
-    for combo_name, eq4_count, eq3_count, eq1_count in combinations:
-        # 生成该组合下所有可能的装备搭配
-        eq4_options = list(product(EQUIPMENT_TYPES['4'], repeat=eq4_count)) if eq4_count > 0 else [[]]
-        eq3_options = list(product(EQUIPMENT_TYPES['3'], repeat=eq3_count)) if eq3_count > 0 else [[]]
-        eq1_options = list(product(EQUIPMENT_TYPES['1'], repeat=eq1_count)) if eq1_count > 0 else [[]]
-
-        combo_best_damage = 0
-        combo_best_result = None
-
-        for eq4s, eq3s, eq1s in product(eq4_options, eq3_options, eq1_options):
-            # 组合所有装备
-            equipments = list(eq4s) + list(eq3s) + list(eq1s)
-
-            # 计算属性和伤害
-            stats = calculate_stats(character, equipments)
-            damage = calculate_damage(character, stats)
-
-            if damage > combo_best_damage:
-                combo_best_damage = damage
-                combo_best_result = {
-                    'combination': combo_name,
-                    'equipments': equipments,
-                    'stats': stats,
-                    'damage': damage
-                }
-
-            if damage > best_damage:
-                best_damage = damage
-                best_result = {
-                    'combination': combo_name,
-                    'equipments': equipments,
-                    'stats': stats,
-                    'damage': damage
-                }
+    if progress is not None:
+        progress(0, len(layouts))
+    for done, layout in enumerate(layouts, 1):
+        groups = layout.groups(catalog)
+        if method == 'branch_and_bound':
+            incumbent = 0 if verbose else best_damage
+            combo_best_result = _best_in_layout_bnb(character, layout.name, groups, incumbent, constraints,
+                                                    enumeration == 'distinct')
+        elif method == 'gray_code':
+            combo_best_result = _best_in_layout_gray(character, layout.name, groups, resync_every)
+        elif method != 'exhaustive':
+            raise ValueError(f"未知的搜索方法: {method}")
+        elif vectorized:
+            combo_best_result = _best_in_layout_vectorized(character, layout.name, groups, enumeration,
+                                                           constraints)
+        else:
+            combo_best_result = _best_in_layout_python(character, layout.name, groups, enumeration,
+                                                       constraints)
 
         # 记录每种组合类型的最佳方案
         if combo_best_result:
+            combo_best_result['crit_overflow'] = max(0.0, combo_best_result['stats'].crit_rate - 1.0)
             all_results.append(combo_best_result)
 
+            if combo_best_result['damage'] > best_damage:
+                best_damage = combo_best_result['damage']
+                best_result = combo_best_result
+
+        if progress is not None:
+            progress(done, len(layouts))
+
+    if verbose:
+        return best_result, all_results
+    else:
+        return best_result
+
+
+def compile_loadouts(character: Character, catalog: Dict[str, List[Equipment]] = None,
+                     layouts: List[layout_rules.Layout] = None, constraints: Dict[str, Dict[str, float]] = None,
+                     enumeration: str = 'multiset') -> engine.LoadoutScorer:
+    """
+    枚举并编译所有搭配，供 rescore_combinations 在角色数值变化后快速重新计算
+
+    编译结果只与装备目录和布局有关；默认布局取决于角色类型和约束，这两项变化后需要重新编译。
+    参数含义同 find_best_combination。
+    """
+    if constraints is None:
+        constraints = character.constraints
+    if catalog is None:
+        catalog = EQUIPMENT_TYPES
+    if layouts is None:
+        layouts = _default_layouts(character, catalog, engine.parse_constraints(character, constraints), enumeration)
+    return engine.LoadoutScorer([(layout.name, layout.groups(catalog)) for layout in layouts], enumeration)
+
+
+def rescore_combinations(character: Character, scorer: engine.LoadoutScorer, verbose: bool = False,
+                         constraints: Dict[str, Dict[str, float]] = None):
+    """
+    在编译好的搭配上找出最优装备组合，结果与 find_best_combination（穷举）一致
+
+    不重新枚举搭配，只按新的角色数值重新计算伤害，适合反复修改数值后实时刷新。
+
+    Args:
+        character: 角色对象
+        scorer: compile_loadouts 的结果
+        verbose: 同 find_best_combination
+        constraints: 同 find_best_combination
+    """
+    if constraints is None:
+        constraints = character.constraints
+    constraints = engine.parse_constraints(character, constraints)
+
+    best_result = None
+    all_results = []
+    for combo_name, equipments, damage, evaluated in scorer.best(character, calculate_stats(character, []),
+                                                                 constraints):
+        if not damage > 0:
+            continue
+        result = _loadout_result(character, combo_name, equipments)
+        result['evaluated'] = evaluated
+        result['crit_overflow'] = max(0.0, result['stats'].crit_rate - 1.0)
+        all_results.append(result)
+        if best_result is None or result['damage'] > best_result['damage']:
+            best_result = result
+
     if verbose:
         return best_result, all_results
     else:
         return best_result
 
 
+def _default_layouts(character: Character, catalog: Dict[str, List[Equipment]], constraints,
+                     enumeration: str = 'product') -> List[layout_rules.Layout]:
+    """
+    默认搜索的布局
+
+    布局剪枝假设同一件装备可以重复使用，且只保证被剪掉的布局伤害更低，
+    每件装备只用一次或约束下剪枝不成立时搜索全部布局。
+    """
+    if enumeration != 'distinct' and layout_rules.dominance_holds(character.base_type, constraints):
+        return layout_rules.get_layouts(catalog, EQUIPMENT_COSTS, character.base_type)
+    return layout_rules.generate_layouts(EQUIPMENT_COSTS)
+
+
+def _permutation_total(groups) -> int:
+    """某一布局下按槽位枚举的排列总数"""
+    total = 1
+    for options, count in groups:
+        total *= len(options) ** count
+    return total
+
+
+def _best_in_layout_vectorized(character: Character, combo_name: str, groups, enumeration: str,
+                               constraints=()):
+    """使用向量化引擎找出单个布局下的最佳搭配"""
+    equipments, damage, evaluated = engine.best_loadout(
+        character, calculate_stats(character, []), groups, enumeration, constraints)
+    if not damage > 0:
+        return None
+
+    # 最优搭配用标量路径重新计算，保证与逐个计算的结果完全一致
+    stats = calculate_stats(character, equipments)
+    return {
+        'combination': combo_name,
+        'equipments': equipments,
+        'stats': stats,
+        'damage': calculate_damage(character, stats),
+        'evaluated': evaluated,
+        'skipped_permutations': _permutation_total(groups) - evaluated
+    }
+
+
+def _best_in_layout_bnb(character: Character, combo_name: str, groups, incumbent: float, constraints=(),
+                        distinct: bool = False):
+    """使用分支定界找出单个布局下优于 incumbent 的最佳搭配"""
+    equipments, _, search_stats = search.branch_and_bound(
+        character, calculate_stats(character, []), groups, incumbent, constraints, distinct)
+    if equipments is None:
+        return None
+
+    stats = calculate_stats(character, equipments)
+    return {
+        'combination': combo_name,
+        'equipments': equipments,
+        'stats': stats,
+        'damage': calculate_damage(character, stats),
+        'evaluated': search_stats.leaves_evaluated,
+        'skipped_permutations': _permutation_total(groups) - search_stats.leaves_evaluated,
+        'nodes_visited': search_stats.nodes_visited,
+        'nodes_pruned': search_stats.nodes_pruned
+    }
+
+
+def _best_in_layout_gray(character: Character, combo_name: str, groups, resync_every: int):
+    """按格雷码顺序增量枚举，找出单个布局下的最佳搭配"""
+    equipments, _, search_stats = search.gray_code_search(
+        character, calculate_stats(character, []), groups, resync_every=resync_every)
+    if equipments is None:
+        return None
+
+    stats = calculate_stats(character, equipments)
+    return {
+        'combination': combo_name,
+        'equipments': equipments,
+        'stats': stats,
+        'damage': calculate_damage(character, stats),
+        'evaluated': search_stats.leaves_evaluated,
+        'skipped_permutations': _permutation_total(groups) - search_stats.leaves_evaluated,
+        'resyncs': search_stats.resyncs,
+        'max_drift': search_stats.max_drift
+    }
+
+
+def _best_in_layout_python(character: Character, combo_name: str, groups, enumeration: str,
+                           constraints=()):
+    """逐个搭配计算，找出单个布局下的最佳搭配"""
+    if enumeration == 'product':
+        enumerate_group = lambda options, count: product(options, repeat=count)
+    elif enumeration == 'multiset':
+        enumerate_group = combinations_with_replacement
+    elif enumeration == 'distinct':
+        enumerate_group = combinations
+    else:
+        raise ValueError(f"未知的枚举方式: {enumeration}")
+
+    # 生成该组合下所有可能的装备搭配
+    group_options = [list(enumerate_group(options, count)) if count > 0 else [[]]
+                     for options, count in groups]
+
+    combo_best_damage = 0
+    combo_best_result = None
+    evaluated = 0
+
+    for pieces in product(*group_options):
+        # 组合所有装备
+        equipments = [eq for group in pieces for eq in group]
+
+        # 计算属性和伤害
+        stats = calculate_stats(character, equipments)
+        evaluated += 1
+        if constraints and not _satisfies(character, stats, constraints):
+            continue
+        damage = calculate_damage(character, stats)
+
+        if damage > combo_best_damage:
+            combo_best_damage = damage
+            combo_best_result = {
+                'combination': combo_name,
+                'equipments': equipments,
+                'stats': stats,
+                'damage': damage
+            }
+
+    if combo_best_result:
+        combo_best_result['evaluated'] = evaluated
+        combo_best_result['skipped_permutations'] = _permutation_total(groups) - evaluated
+    return combo_best_result
+
+
+def _satisfies(character: Character, stats: Stats, constraints) -> bool:
+    """属性是否满足约束（constraints 为 engine.parse_constraints 的结果）"""
+    vector = [getattr(stats, name) for name in engine.STAT_FIELDS]
+    return all(low <= engine.metric_value(character, stats.base_value, vector, name) <= high
+               for name, low, high in constraints)
+
+
+def _loadout_result(character: Character, combo_name: str, equipments: List[Equipment]) -> Dict:
+    """用标量路径计算单个搭配的方案结果"""
+    stats = calculate_stats(character, equipments)
+    return {
+        'combination': combo_name,
+        'equipments': equipments,
+        'stats': stats,
+        'damage': calculate_damage(character, stats)
+    }
+
+
+def find_top_combinations(character: Character, k: int = 10, per_layout: bool = False,
+                          catalog: Dict[str, List[Equipment]] = None,
+                          layouts: List[layout_rules.Layout] = None,
+                          constraints: Dict[str, Dict[str, float]] = None) -> List[Dict]:
+    """
+    找出伤害最高的 K 个满足约束的不重复搭配（同类装备不区分顺序）
+
+    Args:
+        character: 角色对象
+        k: 保留的方案数
+        per_layout: True 时每个布局各保留 K 个，False 时所有布局共同取前 K 个
+        catalog: 装备目录，默认 EQUIPMENT_TYPES
+        layouts: 要搜索的装备布局，默认为 cost 上限内的全部布局
+            （布局剪枝只保证最优方案不被剪掉，被剪掉的布局中可能有前 K 名的搭配）
+        constraints: 属性约束，默认取 character.constraints（格式同 find_best_combination）
+
+    Returns:
+        方案结果列表（格式同 find_best_combination），按伤害从高到低排列；
+        伤害相同时按布局顺序、枚举顺序在前的优先。per_layout=True 时按布局依次排列
+    """
+    if catalog is None:
+        catalog = EQUIPMENT_TYPES
+    if layouts is None:
+        layouts = layout_rules.generate_layouts(EQUIPMENT_COSTS)
+
+    if constraints is None:
+        constraints = character.constraints
+    constraints = engine.parse_constraints(character, constraints)
+
+    base_stats = calculate_stats(character, [])
+    heaps = []
+    top = search.TopK(k)
+
+    for layout in layouts:
+        groups = layout.groups(catalog)
+        totals, indices, _ = engine.layout_totals(base_stats, groups, 'multiset')
+        damages = engine.score_totals(character, base_stats.base_value, totals)
+        if constraints:
+            damages = np.where(engine.feasible_mask(character, base_stats.base_value, totals, constraints),
+                               damages, -np.inf)
+        if per_layout:
+            top = search.TopK(k)
+            heaps.append(top)
+
+        # 每个布局只需把本布局的前 K 名放进堆，按枚举顺序加入以保证并列时的顺序稳定
+        slot_options = engine.slot_options_of(groups)
+        for i in np.sort(np.argsort(-damages, kind='stable')[:k]).tolist():
+            if np.isfinite(damages[i]):
+                top.push(float(damages[i]),
+                         (layout.name, [slot_options[slot][j] for slot, j in enumerate(indices[i])]))
+
+    if not per_layout:
+        heaps = [top]
+    return [_loadout_result(character, combo_name, equipments)
+            for heap in heaps for _, (combo_name, equipments) in heap.items()]
+
+
+def find_pareto_combinations(character: Character, metrics: List[str] = ('final_value',),
+                             catalog: Dict[str, List[Equipment]] = None,
+                             layouts: List[layout_rules.Layout] = None,
+                             constraints: Dict[str, Dict[str, float]] = None) -> List[Dict]:
+    """
+    多目标搜索：找出满足约束的搭配中，期望伤害与其他指标之间互不支配的搭配（帕累托前沿）
+
+    所有布局只遍历一次，每个布局先剔除不满足约束的搭配、在批内剔除被支配的搭配，再并入全局前沿。
+
+    Args:
+        character: 角色对象
+        metrics: 除期望伤害以外的指标（数值越大越好），见 engine.metric_columns，
+            如 'final_value'（最终攻击/生命）、'crit_rate'、'non_crit_damage'
+        catalog: 装备目录，默认 EQUIPMENT_TYPES
+        layouts: 要搜索的装备布局，默认为 cost 上限内的全部布局
+            （布局剪枝只考虑影响伤害的属性，其他指标下被剪掉的布局可能在前沿上）
+        constraints: 属性约束，默认取 character.constraints（格式同 find_best_combination）
+
+    Returns:
+        方案结果列表（格式同 find_best_combination，另含 'metrics'：指标名称 -> 数值），
+        按期望伤害从高到低排列
+    """
+    if catalog is None:
+        catalog = EQUIPMENT_TYPES
+    if layouts is None:
+        layouts = layout_rules.generate_layouts(EQUIPMENT_COSTS)
+
+    if constraints is None:
+        constraints = character.constraints
+    constraints = engine.parse_constraints(character, constraints)
+
+    names = ['damage'] + [name for name in metrics if name != 'damage']
+    base_stats = calculate_stats(character, [])
+    front = search.ParetoFront(len(names))
+
+    for layout in layouts:
+        groups = layout.groups(catalog)
+        totals, indices, _ = engine.layout_totals(base_stats, groups, 'multiset')
+        if constraints:
+            feasible = engine.feasible_mask(character, base_stats.base_value, totals, constraints)
+            totals, indices = totals[feasible], indices[feasible]
+        points = engine.metric_columns(character, base_stats.base_value, totals, names)
+        slot_options = engine.slot_options_of(groups)
+        for i in np.flatnonzero(search.pareto_mask(points)).tolist():
+            front.push(points[i], (layout.name, [slot_options[slot][j] for slot, j in enumerate(indices[i])]))
+
+    results = []
+    for point, (combo_name, equipments) in front.items():
+        result = _loadout_result(character, combo_name, equipments)
+        result['metrics'] = dict(zip(names, point.tolist()))
+        results.append(result)
+    return results
+
+
+def iter_ranked_combinations(character: Character, catalog: Dict[str, List[Equipment]] = None,
+                             layouts: List[layout_rules.Layout] = None,
+                             constraints: Dict[str, Dict[str, float]] = None):
+    """
+    按伤害从高到低逐个产出所有布局下满足约束的不重复搭配（生成器）
+
+    不需要事先计算全部搭配，适合只看前若干名的大规模搜索，例如
+    itertools.islice(iter_ranked_combinations(character), 20)。
+
+    layouts 默认为 cost 上限内的全部布局（布局剪枝只保证最优方案不被剪掉，不保证之后的排名）；
+    constraints 默认取 character.constraints（格式同 find_best_combination）。
+
+    Yields:
+        方案结果（格式同 find_best_combination）
+    """
+    if catalog is None:
+        catalog = EQUIPMENT_TYPES
+    if layouts is None:
+        layouts = layout_rules.generate_layouts(EQUIPMENT_COSTS)
+
+    if constraints is None:
+        constraints = character.constraints
+    ranked = search.ranked_loadouts(character, calculate_stats(character, []),
+                                    [(layout.name, layout.groups(catalog)) for layout in layouts],
+                                    engine.parse_constraints(character, constraints))
+    for _, combo_name, equipments in ranked:
+        yield _loadout_result(character, combo_name, equipments)
+
+
+def result_to_dict(result: Dict) -> Dict:
+    """将 find_best_combination 的方案结果转换为可序列化的字典"""
+    record = dict(result)
+    record['equipments'] = [asdict(eq) for eq in result['equipments']]
+    record['stats'] = asdict(result['stats'])
+    return record
+
+
 def print_all_combinations(character: Character, all_results: List[Dict]):
     """输出所有组合方案的对比"""
     print(f"\n{'='*60}")
@@ -350,6 +839,8 @@ def print_result(character: Character, result: Dict):
     print(f"类型：{'攻击型' if character.base_type == 'attack' else '生命型'}")
     print(f"基础数值：{character.base_value}")
     print(f"技能倍率：{character.skill_multiplier * 100:.1f}%")
+    for hit in character.rotation:
+        print(f"  {hit.name}: {hit.multiplier * 100:.2f}% × {hit.count}")
     print(f"{'='*60}")
 
     print(f"\n最优装备组合：{result['combination']}")
@@ -387,6 +878,8 @@ def print_result(character: Character, result: Dict):
     print(f"  技能倍率: {character.skill_multiplier:.2f}x")
     print(f"  期望伤害 = {base_dmg:.2f} × {dmg_bonus_multiplier:.2f} × {crit_multiplier:.2f} × {character.skill_multiplier:.2f}")
     print(f"  期望伤害：{result['damage']:.2f}")
+    if result.get('crit_overflow', 0) > 0:
+        print(f"  注意：暴击率超出上限 {result['crit_overflow']*100:.2f}%，超出部分不增加伤害")
     print(f"{'='*60}\n")
 
 
@@ -395,10 +888,7 @@ def main():
     print("=== 最优伤害词条计算器 ===\n")
 
     # 加载配置文件中的所有角色
-    with open('characters.yml', 'r', encoding='utf-8') as f:
-        data = yaml.safe_load(f)
-
-    character_names = list(data['characters'].keys())
+    character_names = config.character_names()
 
     print("可用角色：")
     for i, name in enumerate(character_names, 1):
@@ -0,0 +1,182 @@
+"""
+副词条强化结果的蒙特卡洛模拟
+
+每次强化随机出现一种副词条（按类型权重），数值从该类型的若干档位中随机抽取。
+按批次向量化抽样，用与 calculate_damage 相同的公式计算强化 N 次后的期望伤害，
+统计期望值和分位数。
+
+可复现：随机数按分片（shard）由同一个种子派生，结果只取决于 seed 和 shards，
+与使用多少个进程无关。
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+import engine
+from main import Character, calculate_stats, calculate_damage
+
+
+# 各类副词条的数值档位（默认各档概率相同）
+SUBSTAT_TIERS = {
+    'crit_rate': [0.063, 0.069, 0.075, 0.081, 0.087, 0.093, 0.099, 0.105],
+    'crit_dmg': [0.126, 0.138, 0.150, 0.162, 0.174, 0.186, 0.198, 0.210],
+    'atk_percent': [0.064, 0.071, 0.079, 0.086, 0.094, 0.101, 0.109, 0.116],
+    'hp_percent': [0.064, 0.071, 0.079, 0.086, 0.094, 0.101, 0.109, 0.116],
+    'dmg_bonus': [0.064, 0.071, 0.079, 0.086, 0.094, 0.101, 0.109, 0.116],
+    'flat_atk': [30, 40, 50, 60],
+    'flat_hp': [320, 360, 390, 430, 470, 510, 540, 580],
+    'other': [0.0],  # 防御、共鸣效率等不影响伤害的词条
+}
+
+# 每次强化出现各类副词条的权重（'other' 合并了 6 种无关词条）
+DEFAULT_TYPE_WEIGHTS = {
+    'crit_rate': 1,
+    'crit_dmg': 1,
+    'atk_percent': 1,
+    'hp_percent': 1,
+    'dmg_bonus': 1,
+    'flat_atk': 1,
+    'flat_hp': 1,
+    'other': 6,
+}
+
+# 副词条类型 -> 属性字段
+SUBSTAT_FIELDS = {
+    'crit_rate': 'crit_rate',
+    'crit_dmg': 'crit_dmg',
+    'atk_percent': 'percent_attack',
+    'hp_percent': 'percent_hp',
+    'dmg_bonus': 'dmg_bonus',
+    'flat_atk': 'flat_attack',
+    'flat_hp': 'flat_hp',
+}
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def _roll_table(tiers: Dict[str, Sequence], tier_weights: Dict[str, Sequence],
+                type_weights: Dict[str, float]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    将 (副词条类型, 档位) 展开为一张联合分布表，每次强化只需一次抽样
+
+    Returns:
+        (cumulative, columns, values)：每个结果的累积概率、对应的属性列（无关词条为 -1）和数值
+    """
+    types = [t for t in type_weights if type_weights[t] > 0]
+    type_total = float(sum(type_weights[t] for t in types))
+
+    probs, columns, values = [], [], []
+    for t in types:
+        tier_values = np.asarray(tiers[t], dtype=float)
+        weights = np.asarray(tier_weights.get(t, np.ones(len(tier_values))), dtype=float)
+        probs.append(type_weights[t] / type_total * weights / weights.sum())
+        column = engine.STAT_INDEX[SUBSTAT_FIELDS[t]] if t in SUBSTAT_FIELDS else -1
+        columns.append(np.full(len(tier_values), column))
+        values.append(tier_values)
+
+    cumulative = np.cumsum(np.concatenate(probs))
+    cumulative[-1] = 1.0
+    return cumulative, np.concatenate(columns), np.concatenate(values)
+
+
+def sample_damages(character: Character, base_vector: np.ndarray, base_value: float, upgrades: int,
+                   samples: int, seed, batch_size: int = 100_000, tiers: Dict[str, Sequence] = None,
+                   tier_weights: Dict[str, Sequence] = None,
+                   type_weights: Dict[str, float] = None) -> np.ndarray:
+    """
+    抽样强化 upgrades 次后的期望伤害（单个分片）
+
+    Args:
+        character: 角色对象
+        base_vector: 强化前的属性向量（engine.stats_to_vector）
+        base_value: 基础攻击力或基础生命值
+        upgrades: 强化次数（每次出现一条副词条）
+        samples: 样本数
+        seed: 随机种子（整数或 np.random.SeedSequence）
+        batch_size: 每批抽样的样本数，控制内存占用
+        tiers: 各类副词条的数值档位，默认 SUBSTAT_TIERS
+        tier_weights: 各档位的权重，默认各档相同
+        type_weights: 各类副词条出现的权重，默认 DEFAULT_TYPE_WEIGHTS
+
+    Returns:
+        长度为 samples 的伤害数组
+    """
+    cumulative, outcome_columns, outcome_values = _roll_table(
+        tiers or SUBSTAT_TIERS, tier_weights or {}, type_weights or DEFAULT_TYPE_WEIGHTS)
+    width = len(engine.STAT_FIELDS)
+
+    rng = np.random.default_rng(seed)
+    damages = np.empty(samples)
+    for start in range(0, samples, batch_size):
+        size = min(batch_size, samples - start)
+        outcome = np.searchsorted(cumulative, rng.random((size, upgrades)), side='right')
+        column_idx = outcome_columns[outcome]
+
+        # 按 (样本, 属性列) 累加抽到的数值
+        relevant = column_idx >= 0
+        rows = np.broadcast_to(np.arange(size)[:, None], outcome.shape)
+        flat_idx = rows[relevant] * width + column_idx[relevant]
+        rolled_sum = np.bincount(flat_idx, weights=outcome_values[outcome][relevant], minlength=size * width)
+        totals = base_vector + rolled_sum.reshape(size, width)
+        damages[start:start + size] = engine.score_totals(character, base_value, totals)
+    return damages
+
+
+def _sample_shard(args: tuple) -> np.ndarray:
+    """子进程入口"""
+    return sample_damages(*args[:6], **args[6])
+
+
+def simulate_upgrades(character: Character, upgrades: int, equipments: List = None,
+                      samples: int = 1_000_000, seed: int = 0, shards: int = 8, jobs: int = 1,
+                      batch_size: int = 100_000, percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+                      tiers: Dict[str, Sequence] = None, tier_weights: Dict[str, Sequence] = None,
+                      type_weights: Dict[str, float] = None) -> dict:
+    """
+    模拟强化 upgrades 次后的伤害分布
+
+    Args:
+        character: 角色对象（已包含当前词条）
+        upgrades: 强化次数
+        equipments: 装备列表，默认不穿装备
+        samples: 总样本数
+        seed: 随机种子
+        shards: 分片数，每个分片使用由 seed 派生的独立随机数流
+        jobs: 进程数，为 1 时在当前进程中计算
+        batch_size: 每批抽样的样本数
+        percentiles: 需要统计的分位数（百分比）
+        tiers / tier_weights / type_weights: 见 sample_damages
+
+    Returns:
+        {'samples', 'upgrades', 'baseline', 'mean', 'std', 'percentiles': {p: 伤害}}
+    """
+    if samples < 1:
+        raise ValueError(f"样本数至少为 1: {samples}")
+    stats = calculate_stats(character, equipments or [])
+    base_vector = engine.stats_to_vector(stats)
+    options = {'batch_size': batch_size, 'tiers': tiers, 'tier_weights': tier_weights,
+               'type_weights': type_weights}
+
+    shards = max(1, min(shards, samples))
+    shard_sizes = [samples // shards + (1 if i < samples % shards else 0) for i in range(shards)]
+    seeds = np.random.SeedSequence(seed).spawn(shards)
+    tasks = [(character, base_vector, stats.base_value, upgrades, size, shard_seed, options)
+             for size, shard_seed in zip(shard_sizes, seeds)]
+
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            parts = list(executor.map(_sample_shard, tasks))
+    else:
+        parts = [_sample_shard(task) for task in tasks]
+    damages = np.concatenate(parts)
+
+    return {
+        'samples': samples,
+        'upgrades': upgrades,
+        'baseline': calculate_damage(character, stats),
+        'mean': float(damages.mean()),
+        'std': float(damages.std()),
+        'percentiles': {p: float(v) for p, v in zip(percentiles, np.percentile(damages, percentiles))}
+    }
@@ -0,0 +1,224 @@
+"""
+计算结果缓存
+
+find_best_combination 的结果按"场景指纹"保存在本地 SQLite 文件中，输入完全相同时直接读取，不再重新搜索。
+指纹是以下内容的 SHA-256：角色的全部数值（不含名称）、词条统计、装备目录、布局、搜索参数以及
+engine.ENGINE_VERSION，任何一项变化都会得到新的指纹。
+
+缓存按总大小限制，超出时按最近使用时间淘汰（LRU）。结果用 pickle 保存，缓存文件只应由本程序读写。
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+from dataclasses import asdict, is_dataclass
+from typing import Optional
+
+import engine
+import layouts as layout_rules
+from main import Character, EQUIPMENT_COSTS, EQUIPMENT_TYPES, find_best_combination
+
+
+DEFAULT_CACHE_PATH = 'results.cache.sqlite'
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# 缓存表结构版本（结构变化时递增，旧表自动重建）
+SCHEMA_VERSION = 1
+
+
+def _canonical(obj):
+    """把指纹内容转换为可稳定序列化的结构（dataclass -> dict，元组 -> 列表）"""
+    if is_dataclass(obj):
+        obj = asdict(obj)
+    if isinstance(obj, dict):
+        return {str(key): _canonical(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_canonical(value) for value in obj]
+    if isinstance(obj, float) and obj.is_integer():
+        return int(obj)  # 2000 与 2000.0 视为同一输入
+    return obj
+
+
+def scenario_fingerprint(character: Character, **options) -> str:
+    """
+    场景指纹
+
+    Args:
+        character: 角色对象（可以带 apply_affix_stats 设置的词条统计）
+        options: find_best_combination 的其他参数；catalog 和 layouts 为空时按默认值计算
+    """
+    character_data = asdict(character)
+    del character_data['name']  # 名称不影响结果
+    options = dict(options)
+    options.pop('progress', None)  # 进度回调不影响结果
+    if options.get('catalog') is None:
+        options['catalog'] = EQUIPMENT_TYPES
+    if options.get('layouts') is None:
+        # 默认布局由 cost 规则和装备目录决定
+        options['costs'] = EQUIPMENT_COSTS
+        options['cost_budget'] = layout_rules.DEFAULT_COST_BUDGET
+        options['slot_count'] = layout_rules.DEFAULT_SLOT_COUNT
+    scenario = {
+        'engine': engine.ENGINE_VERSION,
+        'character': character_data,
+        'affix_stats': getattr(character, 'affix_stats', None),
+        'options': options,
+    }
+    text = json.dumps(_canonical(scenario), sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    SQLite 结果缓存
+
+    同一个对象可以在多个线程中使用（内部加锁）。打开或写入失败时（如目录只读）缓存自动停用，
+    get 总是返回 None，put 什么也不做，不影响计算本身。
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._create_tables()
+        except sqlite3.Error:
+            self._db = None
+
+    def _create_tables(self):
+        version = self._db.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self._db.execute('DROP TABLE IF EXISTS results')
+            self._db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        self._db.execute('CREATE TABLE IF NOT EXISTS results ('
+                         'key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, '
+                         'last_used INTEGER NOT NULL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+        self._db.commit()
+
+    def _next_tick(self) -> int:
+        """最近使用顺序用递增的整数表示，不受系统时间精度影响"""
+        return self._db.execute('SELECT COALESCE(MAX(last_used), 0) + 1 FROM results').fetchone()[0]
+
+    def get(self, key: str):
+        """读取缓存结果，不存在时返回 None"""
+        if self._db is None:
+            return None
+        with self._lock:
+            try:
+                row = self._db.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    self._db.execute('UPDATE results SET last_used = ? WHERE key = ?', (self._next_tick(), key))
+                    self._db.commit()
+            except sqlite3.Error:
+                row = None
+        if row is None:
+            self.misses += 1
+            return None
+        try:
+            value = pickle.loads(row[0])
+        except (pickle.PickleError, EOFError, AttributeError, ImportError, TypeError, ValueError):
+            # 旧版本程序写入的结果无法还原时视为未命中
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value):
+        """写入结果，并按最近使用时间淘汰超出大小限制的旧结果"""
+        if self._db is None:
+            return
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            try:
+                self._db.execute('INSERT OR REPLACE INTO results (key, value, size, last_used) VALUES (?, ?, ?, ?)',
+                                 (key, blob, len(blob), self._next_tick()))
+                self._evict()
+                self._db.commit()
+            except sqlite3.Error:
+                self._db.rollback()
+
+    def _evict(self):
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        victims = []
+        for key, size in self._db.execute('SELECT key, size FROM results ORDER BY last_used'):
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        self._db.executemany('DELETE FROM results WHERE key = ?', victims)
+
+    def __len__(self):
+        if self._db is None:
+            return 0
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def size(self) -> int:
+        """缓存结果的总字节数"""
+        if self._db is None:
+            return 0
+        with self._lock:
+            return self._db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    def clear(self):
+        """清空缓存"""
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.execute('DELETE FROM results')
+            self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+_default_caches = {}
+
+
+def default_cache(path: str = DEFAULT_CACHE_PATH) -> ResultCache:
+    """同一路径共用一个缓存对象"""
+    key = os.path.abspath(path)
+    if key not in _default_caches:
+        _default_caches[key] = ResultCache(path)
+    return _default_caches[key]
+
+
+def cached_find_best_combination(character: Character, cache: Optional[ResultCache] = None,
+                                 use_cache: bool = True, **options):
+    """
+    带缓存的 find_best_combination
+
+    Args:
+        character: 角色对象
+        cache: 结果缓存，默认为 default_cache()
+        use_cache: False 时跳过缓存，直接计算且不写入
+        options: find_best_combination 的其他参数
+
+    Returns:
+        同 find_best_combination
+    """
+    if not use_cache:
+        return find_best_combination(character, **options)
+    if cache is None:
+        cache = default_cache()
+
+    key = scenario_fingerprint(character, **options)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached[0]
+    result = find_best_combination(character, **options)
+    cache.put(key, (result,))  # 包一层，结果为 None（没有可行方案）时也能命中
+    return result
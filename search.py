@@ -0,0 +1,509 @@
+"""
+搜索算法
+
+分支定界：
+期望伤害是若干单调乘区的乘积（基础数值区、伤害加成区、暴击区、技能倍率），
+对每项属性都单调不减（前提是总爆伤不低于 100%）。因此对于只填了部分槽位的搭配，
+把剩余每个槽位按"各项属性分别取该槽位可选装备中的最大值"累加后算出的伤害，
+就是所有补全方式的伤害上界。上界不超过当前最优伤害的分支可以直接剪掉。
+
+同一类别内的槽位只按下标不降的顺序填充，不会重复搜索顺序不同的相同搭配。
+
+格雷码枚举：按混合进制反射格雷码的顺序遍历所有搭配，相邻两个搭配只有一个槽位不同，
+每一步只需从累加的属性中减去旧装备、加上新装备的增量，不必从头求和。
+
+排名：TopK 用有界堆保留伤害最高的 K 个搭配；ranked_loadouts 用同样的上界做最佳优先搜索，
+按伤害从高到低逐个产出搭配，内存只与搜索前沿有关。
+
+帕累托前沿：ParetoFront 在线维护多项指标下互不支配的搭配，新候选被已有前沿支配时直接丢弃，
+支配已有前沿的候选会把被它支配的搭配移除，一次遍历即可得到完整前沿。
+"""
+
+import heapq
+from dataclasses import dataclass
+from itertools import count
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import engine
+
+
+# 上界与当前最优比较时的相对容差，避免浮点累加顺序不同导致误剪
+BOUND_TOLERANCE = 1e-12
+
+
+@dataclass
+class SearchStats:
+    """搜索统计"""
+    nodes_visited: int = 0  # 访问的节点数（含完整搭配）
+    nodes_pruned: int = 0  # 被上界剪掉的分支数
+    leaves_evaluated: int = 0  # 实际计算伤害的完整搭配数
+    resyncs: int = 0  # 格雷码枚举中从头重新求和的次数
+    max_drift: float = 0.0  # 重新求和时发现的最大累加误差
+
+
+def _prepare_slots(groups: Sequence[Tuple[Sequence, int]]):
+    """
+    展开槽位并计算剩余槽位的属性上界
+
+    Returns:
+        (slots, suffix_max, suffix_min)：slots[s] 为 (类别序号, 可选装备, 装备增量向量列表)，
+        suffix_max[s] / suffix_min[s] 为第 s 个槽位起每个槽位各项属性取最大值 / 最小值后的累加；
+        有槽位没有可选装备时返回 (None, None, None)
+    """
+    slots = []
+    for group_id, (options, slot_count) in enumerate(groups):
+        deltas = [engine.equipment_delta(eq).tolist() for eq in options]
+        for _ in range(slot_count):
+            slots.append((group_id, options, deltas))
+
+    if any(not options for _, options, _ in slots):
+        return None, None, None
+
+    width = len(engine.STAT_FIELDS)
+    suffix_max = [[0.0] * width for _ in range(len(slots) + 1)]
+    suffix_min = [[0.0] * width for _ in range(len(slots) + 1)]
+    for s in range(len(slots) - 1, -1, -1):
+        columns = list(zip(*slots[s][2]))
+        suffix_max[s] = [a + max(column) for a, column in zip(suffix_max[s + 1], columns)]
+        suffix_min[s] = [a + min(column) for a, column in zip(suffix_min[s + 1], columns)]
+    return slots, suffix_max, suffix_min
+
+
+def branch_and_bound(character, base_stats, groups: Sequence[Tuple[Sequence, int]],
+                     incumbent: float = 0.0,
+                     constraints: Sequence[Tuple[str, float, float]] = (),
+                     distinct: bool = False) -> Tuple[Optional[List], float, SearchStats]:
+    """
+    逐个槽位填充装备，用伤害上界剪枝，找出某一布局下的最优搭配
+
+    每个节点的所有子节点一次数组运算算出上界。同一类别内按下标递增填充，
+    因此该类别剩余槽位只能从当前装备之后的装备中选，上界按"之后的装备各项属性的最大值"
+    （distinct 时为前 r 大之和）计算，比对所有装备取最大值更紧。
+    每个类别的装备先按单件带来的伤害从高到低排序，让后面的上界尽快变小。
+
+    Args:
+        character: 角色对象
+        base_stats: 未穿装备时的属性（calculate_stats(character, [])）
+        groups: 每个类别的 (可选装备列表, 槽位数)
+        incumbent: 已知的最优伤害，只搜索严格优于它的搭配
+        constraints: engine.parse_constraints 解析后的约束。各指标对每项属性单调不减，
+            剩余槽位全取最大值仍达不到下限、或全取最小值仍超过上限的分支直接剪掉
+        distinct: 每件装备最多使用一次（实际背包中的装备）
+
+    Returns:
+        (装备列表, 期望伤害, 搜索统计)；找不到优于 incumbent 的搭配时装备列表为 None
+    """
+    stats = SearchStats()
+    if any(len(options) < (slot_count if distinct else min(slot_count, 1)) for options, slot_count in groups):
+        return None, incumbent, stats
+
+    base_value = base_stats.base_value
+    base_vector = engine.stats_to_vector(base_stats)
+    width = len(engine.STAT_FIELDS)
+
+    # 展开槽位：(类别序号, 排序后的装备, 增量矩阵, 类别内剩余槽位数, 剩余槽位上界表)
+    slots = []
+    group_bounds = []
+    group_deltas = []
+    tails_of = []
+    for options, slot_count in groups:
+        if slot_count == 0:
+            continue
+        deltas = engine.build_delta_matrix(options)
+        order = np.argsort(-engine.score_totals(character, base_value, base_vector + deltas), kind='stable')
+        options = [options[i] for i in order]
+        deltas = deltas[order]
+        tails = [_tail_bounds(deltas, r, distinct) for r in range(slot_count + 1)]
+        group_bounds.append(tails[slot_count][0])
+        group_deltas.append((deltas, slot_count))
+        tails_of.append(tails)
+        for position in range(slot_count):
+            slots.append((len(group_bounds) - 1, options, deltas, slot_count - position - 1, tails))
+
+    # later[g]：第 g 个类别之后所有类别的上界之和
+    later = [np.zeros(width) for _ in range(len(group_bounds) + 1)]
+    for g in range(len(group_bounds) - 1, -1, -1):
+        later[g] = later[g + 1] + group_bounds[g]
+    # 约束上限用的下界：剩余每个槽位各项属性取最小值
+    suffix_min = [np.zeros(width) for _ in range(len(slots) + 1)]
+    for s in range(len(slots) - 1, -1, -1):
+        suffix_min[s] = suffix_min[s + 1] + slots[s][2].min(axis=0)
+
+    best_damage = incumbent
+    best_choice = None
+    chosen = []
+
+    def feasible_mask(children: np.ndarray, optimistic: np.ndarray, slot: int) -> np.ndarray:
+        """children 之后还有可能满足所有约束的子节点"""
+        mask = np.ones(len(children), dtype=bool)
+        for name, low, high in constraints:
+            if low > -np.inf:
+                mask &= engine.metric_columns(character, base_value, optimistic, [name])[:, 0] >= low
+            if high < np.inf:
+                pessimistic = children + suffix_min[slot + 1]
+                mask &= engine.metric_columns(character, base_value, pessimistic, [name])[:, 0] <= high
+        return mask
+
+    def linear_bounds(group: int, vector: np.ndarray, start: int, remaining: int) -> np.ndarray:
+        """
+        用 engine.log_tangent 估计各子节点的上界：取对数后每件装备的贡献可以相加，
+        各类别剩余槽位直接取贡献最大的几件
+        """
+        deltas = group_deltas[group][0][start:]
+        reach = tails_of[group][remaining + 1][start] + later[group + 1]
+        offsets, weights = engine.log_tangent(character, base_value, vector, reach)
+
+        gains = weights @ deltas.T  # (伤害项数, 子节点数)
+        total = offsets[:, None] + gains
+        for later_deltas, slot_count in group_deltas[group + 1:]:
+            later_gains = weights @ later_deltas.T
+            if distinct:
+                top = np.partition(later_gains, later_gains.shape[1] - slot_count, axis=1)[:, -slot_count:]
+                total += top.sum(axis=1)[:, None]
+            else:
+                total += slot_count * later_gains.max(axis=1)[:, None]
+        if remaining:
+            if not distinct:
+                # 同一类别剩余槽位只能从下标不小于当前装备的装备中选
+                total += remaining * np.maximum.accumulate(gains[:, ::-1], axis=1)[:, ::-1]
+            else:
+                # 放宽为：除当前装备外贡献最大的 remaining 件
+                padded = np.hstack([gains, np.full((len(gains), 1), -np.inf)])
+                top = np.argsort(-padded, axis=1)[:, :remaining + 1]
+                values = np.take_along_axis(padded, top, axis=1)
+                rest = np.repeat(values[:, :remaining].sum(axis=1, keepdims=True), gains.shape[1], axis=1)
+                for i in range(remaining):
+                    # 当前装备本身在前 remaining 件中时，换成第 remaining + 1 件
+                    inside = top[:, i] < gains.shape[1]
+                    rest[inside, top[inside, i]] += values[inside, remaining] - values[inside, i]
+                total += rest
+        return np.exp(total).sum(axis=0)
+
+    def visit(slot: int, vector: np.ndarray, start: int):
+        nonlocal best_damage, best_choice
+        stats.nodes_visited += 1
+
+        group, options, deltas, remaining, tails = slots[slot]
+        last = slot + 1 == len(slots)
+        children = vector + deltas[start:]
+        # 同一类别剩余槽位从下一个下标起选择（distinct 时不能重复使用当前装备）
+        next_starts = np.arange(start, len(options)) + (1 if distinct and remaining else 0)
+        if remaining:
+            optimistic = children + tails[remaining][next_starts] + later[group + 1]
+        else:
+            optimistic = children + later[group + 1]
+        bounds = engine.score_totals(character, base_value, optimistic)
+        if distinct and remaining:
+            # 剩下的装备不够填满该类别的剩余槽位
+            bounds[next_starts > len(options) - remaining] = -np.inf
+        if not last:
+            bounds = np.minimum(bounds, linear_bounds(group, vector, start, remaining))
+        if constraints:
+            feasible = feasible_mask(children, optimistic, slot)
+            stats.nodes_pruned += int((~feasible).sum())
+            bounds = np.where(feasible, bounds, -np.inf)
+
+        # 先搜上界高的分支，尽早得到较好的当前最优
+        order = np.argsort(-bounds, kind='stable')
+        for n, k in enumerate(order.tolist()):
+            bound = bounds[k]
+            if bound == -np.inf:
+                break
+            if bound * (1 + BOUND_TOLERANCE) <= best_damage:
+                # 已按上界降序排列，剩余分支都可以剪掉
+                stats.nodes_pruned += int(np.isfinite(bounds[order[n:]]).sum())
+                break
+            i = start + k
+            chosen.append(options[i])
+            if last:
+                # 最后一个槽位的上界就是实际伤害
+                stats.nodes_visited += 1
+                stats.leaves_evaluated += 1
+                if bound > best_damage:
+                    best_damage = bound
+                    best_choice = list(chosen)
+            else:
+                visit(slot + 1, children[k], int(next_starts[k]) if remaining else 0)
+            chosen.pop()
+
+    visit(0, base_vector, 0)
+    return best_choice, best_damage, stats
+
+
+def _tail_bounds(deltas: np.ndarray, remaining: int, distinct: bool) -> np.ndarray:
+    """
+    类别内剩余槽位的属性上界表
+
+    Returns:
+        (装备数 + 1, 属性数) 的数组，第 j 行为只能从第 j 件及之后的装备中再选 remaining 件时，
+        各项属性之和的上界；选不出 remaining 件的行不会用到，保持为 0
+    """
+    n, width = deltas.shape
+    tails = np.zeros((n + 1, width))
+    if remaining == 0:
+        return tails
+    if not distinct:
+        tails[:n] = remaining * np.maximum.accumulate(deltas[::-1], axis=0)[::-1]
+        return tails
+
+    top = np.empty((0, width))
+    for j in range(n - 1, -1, -1):
+        # 每列保留前 remaining 大的值
+        top = -np.sort(-np.vstack([top, deltas[j]]), axis=0)[:remaining]
+        if n - j >= remaining:
+            tails[j] = top.sum(axis=0)
+    return tails
+
+
+def gray_code_steps(radices: Sequence[int]) -> Iterator[Tuple[int, int, int]]:
+    """
+    混合进制反射格雷码（Knuth TAOCP 7.2.1.1 算法 L，无循环版本）
+
+    从全 0 开始，每一步只改变一位，且只加减 1，遍历所有组合各一次。
+
+    Args:
+        radices: 每一位的进制（可选装备数），进制为 1 的位始终为 0
+
+    Yields:
+        (位置, 旧值, 新值)
+    """
+    positions = [j for j, radix in enumerate(radices) if radix > 1]
+    radix = [radices[j] for j in positions]
+    n = len(positions)
+    value = [0] * n
+    direction = [1] * n
+    focus = list(range(n + 1))
+
+    while True:
+        j = focus[0]
+        focus[0] = 0
+        if j == n:
+            return
+        old = value[j]
+        value[j] += direction[j]
+        yield positions[j], old, value[j]
+        if value[j] == 0 or value[j] == radix[j] - 1:
+            direction[j] = -direction[j]
+            focus[j] = focus[j + 1]
+            focus[j + 1] = j + 1
+
+
+def gray_code_search(character, base_stats, groups: Sequence[Tuple[Sequence, int]],
+                     incumbent: float = 0.0,
+                     resync_every: int = 0) -> Tuple[Optional[List], float, SearchStats]:
+    """
+    按格雷码顺序枚举某一布局下的所有搭配，增量更新属性
+
+    Args:
+        character: 角色对象
+        base_stats: 未穿装备时的属性（calculate_stats(character, [])）
+        groups: 每个类别的 (可选装备列表, 槽位数)
+        incumbent: 已知的最优伤害，只记录严格优于它的搭配
+        resync_every: 每隔多少步从头重新求和一次以校正浮点累加误差，0 表示不校正
+
+    Returns:
+        (装备列表, 期望伤害, 搜索统计)；找不到优于 incumbent 的搭配时装备列表为 None
+    """
+    slot_options = engine.slot_options_of(groups)
+    stats = SearchStats()
+    if any(not options for options in slot_options):
+        return None, incumbent, stats
+
+    # 每件装备的稀疏增量：[(属性编号, 数值), ...]
+    sparse = [[engine.equipment_terms(eq) for eq in options] for options in slot_options]
+
+    base_vector = engine.stats_to_vector(base_stats).tolist()
+    base_value = base_stats.base_value
+    choice = [0] * len(slot_options)
+
+    def full_sum() -> List[float]:
+        vector = list(base_vector)
+        for slot, i in enumerate(choice):
+            for code, value in sparse[slot][i]:
+                vector[code] += value
+        return vector
+
+    vector = full_sum()
+    best_damage = incumbent
+    best_choice = None
+
+    def evaluate():
+        nonlocal best_damage, best_choice
+        stats.leaves_evaluated += 1
+        damage = engine.score_vector(character, base_value, vector)
+        if damage > best_damage:
+            best_damage = damage
+            best_choice = list(choice)
+
+    evaluate()
+    for slot, old, new in gray_code_steps([len(options) for options in slot_options]):
+        for code, value in sparse[slot][old]:
+            vector[code] -= value
+        for code, value in sparse[slot][new]:
+            vector[code] += value
+        choice[slot] = new
+
+        if resync_every and stats.leaves_evaluated % resync_every == 0:
+            exact = full_sum()
+            stats.max_drift = max(stats.max_drift, max(abs(a - b) for a, b in zip(vector, exact)))
+            stats.resyncs += 1
+            vector = exact
+        evaluate()
+
+    stats.nodes_visited = stats.leaves_evaluated
+    if best_choice is None:
+        return None, best_damage, stats
+    return [slot_options[slot][i] for slot, i in enumerate(best_choice)], best_damage, stats
+
+
+class TopK:
+    """保留伤害最高的 K 个候选，伤害相同时先加入的优先"""
+
+    def __init__(self, k: int):
+        self.k = k
+        self._heap = []  # 最小堆：(伤害, -加入顺序, 候选)
+        self._counter = count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, damage: float, item: Any) -> bool:
+        """加入候选，返回是否被保留"""
+        entry = (damage, -next(self._counter), item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+            return True
+        if entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+            return True
+        return False
+
+    def threshold(self) -> float:
+        """进入前 K 名需要超过的伤害（未满 K 个时为 0）"""
+        return self._heap[0][0] if len(self._heap) >= self.k else 0.0
+
+    def items(self) -> List[Tuple[float, Any]]:
+        """按伤害从高到低（并列时按加入顺序）返回 [(伤害, 候选), ...]"""
+        return [(damage, item) for damage, _, item in sorted(self._heap, key=lambda e: e[:2], reverse=True)]
+
+
+def ranked_loadouts(character, base_stats,
+                    layouts: Sequence[Tuple[str, Sequence[Tuple[Sequence, int]]]],
+                    constraints: Sequence[Tuple[str, float, float]] = ()) -> Iterator[Tuple[float, str, List]]:
+    """
+    按伤害从高到低逐个产出所有布局下的不重复搭配
+
+    最佳优先搜索：优先展开上界最高的部分搭配。完整搭配的上界就是它的实际伤害，
+    因此从队列中取出的完整搭配一定不低于之后的任何搭配。伤害相同时按入队顺序产出。
+
+    Args:
+        character: 角色对象
+        base_stats: 未穿装备时的属性（calculate_stats(character, [])）
+        layouts: [(布局名称, groups), ...]，groups 为每个类别的 (可选装备列表, 槽位数)
+        constraints: engine.parse_constraints 解析后的约束，不满足约束的完整搭配直接跳过
+
+    Yields:
+        (期望伤害, 布局名称, 装备列表)
+    """
+    base_value = base_stats.base_value
+    base_vector = engine.stats_to_vector(base_stats).tolist()
+    prepared = []
+    heap = []
+    order = count()
+
+    for name, groups in layouts:
+        slots, suffix_max, _ = _prepare_slots(groups)
+        if slots is None:
+            continue
+        layout_id = len(prepared)
+        prepared.append((name, slots, suffix_max))
+        bound = engine.score_vector(character, base_value, [a + b for a, b in zip(base_vector, suffix_max[0])])
+        # 队列元素：(-上界, 入队顺序, 布局序号, 已填槽位数, 属性向量, 下一槽位起始下标, 已选下标)
+        heapq.heappush(heap, (-bound, next(order), layout_id, 0, base_vector, 0, ()))
+
+    while heap:
+        neg_bound, _, layout_id, slot, vector, start, chosen = heapq.heappop(heap)
+        name, slots, suffix_max = prepared[layout_id]
+
+        if slot == len(slots):
+            if constraints and not engine.feasible_mask(character, base_value, np.array([vector]), constraints)[0]:
+                continue
+            equipments = [slots[s][1][i] for s, i in enumerate(chosen)]
+            yield -neg_bound, name, equipments
+            continue
+
+        group_id, options, deltas = slots[slot]
+        same_group = slot + 1 < len(slots) and slots[slot + 1][0] == group_id
+        for i in range(start, len(options)):
+            child = [a + b for a, b in zip(vector, deltas[i])]
+            if slot + 1 == len(slots):
+                bound = engine.score_vector(character, base_value, child)
+            else:
+                bound = engine.score_vector(character, base_value,
+                                            [a + b for a, b in zip(child, suffix_max[slot + 1])])
+            heapq.heappush(heap, (-bound, next(order), layout_id, slot + 1, child,
+                                  i if same_group else 0, chosen + (i,)))
+
+
+def pareto_mask(points: np.ndarray) -> np.ndarray:
+    """
+    一批候选中互不支配的候选（各项指标均不低于且至少一项更高即为支配）
+
+    指标完全相同的候选只保留最先出现的一个。
+
+    Args:
+        points: (候选数, 指标数) 的指标数组，数值越大越好
+
+    Returns:
+        布尔数组，True 表示该候选不被其他候选支配
+    """
+    n, width = points.shape
+    mask = np.zeros(n, dtype=bool)
+    if n == 0:
+        return mask
+
+    # 按各项指标字典序从大到小排列（稳定排序），能支配某个候选的候选一定排在它前面
+    order = np.lexsort(tuple(-points[:, j] for j in reversed(range(width))))
+    kept = np.empty((n, width))
+    size = 0
+    for i in order.tolist():
+        point = points[i]
+        if size and np.all(kept[:size] >= point, axis=1).any():
+            continue
+        kept[size] = point
+        size += 1
+        mask[i] = True
+    return mask
+
+
+class ParetoFront:
+    """在线维护的帕累托前沿，指标完全相同时先加入的优先"""
+
+    def __init__(self, width: int):
+        self._points = np.empty((0, width))
+        self._items = []
+
+    def __len__(self):
+        return len(self._items)
+
+    def push(self, point: Sequence[float], item: Any) -> bool:
+        """加入候选，返回是否进入前沿"""
+        point = np.asarray(point, dtype=float)
+        if len(self._items):
+            if np.all(self._points >= point, axis=1).any():
+                return False
+            # 移除被新候选支配的搭配
+            survivors = ~np.all(point >= self._points, axis=1)
+            if not survivors.all():
+                self._points = self._points[survivors]
+                self._items = [item for item, keep in zip(self._items, survivors.tolist()) if keep]
+        self._points = np.vstack([self._points, point])
+        self._items.append(item)
+        return True
+
+    def items(self) -> List[Tuple[np.ndarray, Any]]:
+        """按第一项指标从高到低返回 [(指标, 候选), ...]"""
+        order = sorted(range(len(self._items)), key=lambda i: -self._points[i, 0])
+        return [(self._points[i], self._items[i]) for i in order]
@@ -0,0 +1,384 @@
+"""
+本地计算服务
+
+常驻进程提供 HTTP/JSON 接口，机器人和其他工具不必每次查询都启动一个 Python 进程、重新导入依赖和解析配置。
+只依赖标准库（asyncio），监听本机端口：
+
+    python service.py                    # 默认 127.0.0.1:8765
+    python service.py --port 9000 --jobs 4
+
+接口（请求和响应都是 JSON）：
+    GET  /health                         服务状态和计数
+    GET  /characters                     配置文件中的角色名称
+    POST /character    {"character": "角色A"}                       角色数值（load_character）
+    POST /optimize     {"character": "角色A", "verbose": true}      最优方案（find_best_combination）
+    POST /affix_gain   {"character": "角色A", "affix_avg_values": {"crit_rate": 0.08}}
+                                                                    最优方案上下一个词条的收益（calculate_next_affix_gain）
+
+角色可以用 "character"（配置文件中的名称，可另给 "config" 指定配置文件）或 "character_data"（格式同
+characters.yml 中的一条角色数据）给出；"affix_stats" 为词条统计（格式同 apply_affix_stats）。
+
+计算在进程池中执行，不阻塞事件循环。内容相同的并发请求只计算一次，共用同一个结果；
+算过的结果保存在内存 LRU 中，按名称引用的角色在配置文件修改后自动失效。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import asdict
+from http import HTTPStatus
+from multiprocessing import freeze_support
+from typing import Dict, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import config
+from main import (Character, Stats, apply_affix_stats, calculate_next_affix_gain, character_from_dict,
+                  find_best_combination, load_character, result_to_dict)
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_SIZE = 256  # 内存中保留的结果数
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class RequestError(ValueError):
+    """请求内容错误（返回 400）"""
+
+
+def resolve_character(payload: Dict) -> Character:
+    """由请求内容构造角色（含词条统计）"""
+    if payload.get('character_data') is not None:
+        character = character_from_dict(payload.get('character', '自定义角色'), payload['character_data'])
+    elif payload.get('character'):
+        character = load_character(payload['character'], payload.get('config', config.DEFAULT_CONFIG_PATH))
+    else:
+        raise RequestError("缺少 character 或 character_data")
+    if payload.get('affix_stats'):
+        character = apply_affix_stats(character, payload['affix_stats'])
+    return character
+
+
+def describe_character(payload: Dict) -> Dict:
+    """角色数值"""
+    character = resolve_character(payload)
+    return {'character': asdict(character), 'affix_stats': getattr(character, 'affix_stats', None)}
+
+
+def optimize(payload: Dict) -> Dict:
+    """最优方案；verbose 为真时同时返回各组合方案"""
+    character = resolve_character(payload)
+    best_result, all_results = find_best_combination(character, verbose=True,
+                                                     method=payload.get('method', 'exhaustive'))
+    response = {'character': character.name, 'best': result_to_dict(best_result) if best_result else None}
+    if payload.get('verbose'):
+        response['layouts'] = [result_to_dict(result) for result in all_results]
+    return response
+
+
+def affix_gain(payload: Dict) -> Dict:
+    """
+    下一个词条的收益
+
+    默认在最优方案的属性上计算；给出 "stats"（格式同 Stats）时直接在该属性上计算。
+    词条平均值取 "affix_avg_values"，未给出时取词条统计中的 avg。
+    """
+    character = resolve_character(payload)
+    affix_avg_values = payload.get('affix_avg_values')
+    if affix_avg_values is None:
+        affix_avg_values = {key: val['avg'] for key, val in (payload.get('affix_stats') or {}).items()}
+    if not affix_avg_values:
+        raise RequestError("缺少 affix_avg_values 或 affix_stats")
+
+    if payload.get('stats') is not None:
+        stats = Stats(**payload['stats'])
+    else:
+        best_result = find_best_combination(character)
+        if best_result is None:
+            return {'character': character.name, 'stats': None, 'gains': None}
+        stats = best_result['stats']
+    return {'character': character.name, 'stats': asdict(stats),
+            'gains': calculate_next_affix_gain(character, stats, affix_avg_values)}
+
+
+# POST 接口 -> 计算函数（在进程池中执行，必须是模块级函数）
+HANDLERS = {
+    '/character': describe_character,
+    '/optimize': optimize,
+    '/affix_gain': affix_gain,
+}
+
+
+def run_handler(path: str, payload: Dict) -> Dict:
+    """在工作进程中执行计算"""
+    return HANDLERS[path](payload)
+
+
+def _warm_up():
+    """预热工作进程（导入模块在进程启动时完成）"""
+    return os.getpid()
+
+
+def request_key(path: str, payload: Dict) -> str:
+    """
+    请求的缓存键：接口 + 规范化的请求内容
+
+    按名称引用角色时加上配置文件签名，配置文件修改后旧结果不再命中。
+    """
+    key = {'path': path, 'payload': payload}
+    if payload.get('character_data') is None and payload.get('character'):
+        try:
+            key['config'] = config.file_signature(payload.get('config', config.DEFAULT_CONFIG_PATH))
+        except OSError:
+            pass  # 配置文件不存在：计算时报错，错误结果不缓存
+    return json.dumps(key, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+
+
+class LRUCache:
+    """按条数限制的内存 LRU"""
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+
+    def get(self, key):
+        """读取结果（并标记为最近使用），不存在时返回 None"""
+        if key not in self._items:
+            return None
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self):
+        self._items.clear()
+
+
+class CalculatorService:
+    """
+    计算服务
+
+    call 可以直接在事件循环中调用（测试、嵌入其他 asyncio 程序），start 在此基础上提供 HTTP 接口。
+    """
+
+    def __init__(self, jobs: int = None, cache_size: int = DEFAULT_CACHE_SIZE, executor: Executor = None):
+        """
+        Args:
+            jobs: 工作进程数，默认为 CPU 核数
+            cache_size: 内存 LRU 保留的结果数，0 表示不缓存
+            executor: 自定义执行器（默认为进程池）
+        """
+        self.jobs = jobs or os.cpu_count() or 1
+        self._executor = executor
+        self._own_executor = executor is None
+        self.cache = LRUCache(cache_size)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._pending: Set[Future] = set()  # 已提交到进程池、还没有结束的计算（close 时取消排队中的）
+        self.counters = {'requests': 0, 'computed': 0, 'coalesced': 0, 'cache_hits': 0, 'errors': 0}
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.jobs)
+        return self._executor
+
+    async def warm_up(self):
+        """启动全部工作进程，第一批请求不再等待进程启动"""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, _warm_up) for _ in range(self.jobs)))
+
+    async def call(self, path: str, payload: Dict) -> Dict:
+        """
+        执行一次计算请求
+
+        相同的请求正在计算时等待同一个结果；算完的结果写入 LRU。计算出错时异常交给所有等待的请求，错误不缓存。
+        """
+        if path not in HANDLERS:
+            raise KeyError(path)
+        if not isinstance(payload, dict):
+            raise RequestError("请求内容应为 JSON 对象")
+        self.counters['requests'] += 1
+        key = request_key(path, payload)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.counters['cache_hits'] += 1
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            # 计算作为独立的任务运行：发起请求的连接断开时，其他等待同一结果的请求不受影响
+            inflight = self._inflight[key] = asyncio.ensure_future(self._compute(key, path, payload))
+            inflight.add_done_callback(lambda task: task.cancelled() or task.exception())
+        else:
+            self.counters['coalesced'] += 1
+        return await asyncio.shield(inflight)
+
+    async def _compute(self, key: str, path: str, payload: Dict) -> Dict:
+        """在执行器中计算并写入 LRU，出错时不缓存"""
+        self.counters['computed'] += 1
+        try:
+            future = self.executor.submit(run_handler, path, payload)
+            self._pending.add(future)
+            future.add_done_callback(self._pending.discard)
+            result = await asyncio.wrap_future(future)
+        except Exception:
+            self.counters['errors'] += 1
+            raise
+        finally:
+            del self._inflight[key]
+        self.cache.put(key, result)
+        return result
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, Dict]:
+        """处理一个 HTTP 请求，返回 (状态码, 响应内容)"""
+        url = urlsplit(target)
+        path = url.path.rstrip('/') or '/'
+        if path == '/health' and method == 'GET':
+            return HTTPStatus.OK, {'status': 'ok', 'jobs': self.jobs, 'cached': len(self.cache),
+                                   'inflight': len(self._inflight), **self.counters}
+        if path == '/characters' and method == 'GET':
+            config_path = parse_qs(url.query).get('config', [config.DEFAULT_CONFIG_PATH])[0]
+            try:
+                return HTTPStatus.OK, {'characters': config.character_names(config_path)}
+            except OSError as e:
+                return HTTPStatus.NOT_FOUND, {'error': str(e)}
+        if path not in HANDLERS:
+            return HTTPStatus.NOT_FOUND, {'error': f"未知的接口: {path}"}
+        if method != 'POST':
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'error': f"{path} 只接受 POST"}
+
+        try:
+            payload = json.loads(body or b'{}')
+            return HTTPStatus.OK, await self.call(path, payload)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            return HTTPStatus.BAD_REQUEST, {'error': f"请求不是有效的 JSON: {e}"}
+        except (ValueError, KeyError, TypeError) as e:
+            # 角色不存在、缺少字段、数值格式错误等
+            return HTTPStatus.BAD_REQUEST, {'error': str(e) or type(e).__name__}
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"{type(e).__name__}: {e}"}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """HTTP/1.1 连接（支持 keep-alive）"""
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body, error = request
+                if error is not None:
+                    status, response = error, {'error': HTTPStatus(error).phrase}
+                    keep_alive = False
+                else:
+                    status, response = await self.dispatch(method, target, body)
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+                _write_response(writer, status, response, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> asyncio.AbstractServer:
+        """启动 HTTP 服务（port 为 0 时随机选择端口）"""
+        await self.warm_up()
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self):
+        """关闭自己创建的进程池，排队中还没开始的计算直接取消（shutdown 的 cancel_futures 需要 Python 3.9）"""
+        if self._own_executor and self._executor is not None:
+            for future in list(self._pending):
+                future.cancel()
+            self._executor.shutdown()
+            self._executor = None
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[tuple]:
+    """
+    读取一个 HTTP 请求
+
+    Returns:
+        (方法, 路径, 请求头, 请求体, 错误状态码)；连接已关闭时返回 None
+    """
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    parts = line.decode('latin-1').split()
+    if len(parts) != 3:
+        return '', '', {}, b'', HTTPStatus.BAD_REQUEST
+    method, target, _ = parts
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        return method, target, headers, b'', HTTPStatus.BAD_REQUEST
+    if length > MAX_BODY_BYTES:
+        return method, target, headers, b'', HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+    body = await reader.readexactly(length) if length > 0 else b''
+    return method.upper(), target, headers, body, None
+
+
+def _write_response(writer: asyncio.StreamWriter, status: int, response: Dict, keep_alive: bool):
+    body = json.dumps(response, ensure_ascii=False).encode('utf-8')
+    status = HTTPStatus(status)
+    head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode('latin-1') + body)
+
+
+async def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, jobs: int = None,
+                cache_size: int = DEFAULT_CACHE_SIZE):
+    """运行服务直到进程被终止"""
+    service = CalculatorService(jobs, cache_size)
+    try:
+        server = await service.start(host, port)
+        address = server.sockets[0].getsockname()
+        print(f"计算服务已启动: http://{address[0]}:{address[1]} （{service.jobs} 个工作进程）", flush=True)
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="本地计算服务（HTTP/JSON）")
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"监听地址，默认 {DEFAULT_HOST}")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"监听端口，默认 {DEFAULT_PORT}")
+    parser.add_argument('--jobs', type=int, default=None, help="工作进程数，默认为 CPU 核数")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE, help="内存中保留的结果数")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.jobs, args.cache_size))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    freeze_support()
+    main()
@@ -0,0 +1,203 @@
+"""
+优化会话
+
+同一角色反复做"如果……会怎样"的查询时，每次调用 find_best_combination 都要重新生成布局、枚举搭配。
+OptimizerSession 只在创建时编译一次装备目录和布局（main.compile_loadouts），之后修改基础数值、
+词条统计或增益都只是改变基础属性向量和伤害项的额外加成，直接在缓存的搭配增量上重新计算和排序。
+
+只有角色类型或约束（使用默认布局时）变化才需要重新编译。
+默认布局经过剪枝，只保证最优方案不被剪掉；top 需要完整的排名，另外编译一份全部布局（第一次调用时）。
+"""
+
+from dataclasses import fields, replace
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import engine
+import layouts as layout_rules
+import search
+from main import (Character, EQUIPMENT_COSTS, Equipment, Hit, apply_affix_stats, calculate_damage, calculate_stats,
+                  compile_loadouts, rescore_combinations)
+from timeline import MODIFIER_FIELDS
+
+
+class OptimizerSession:
+    """
+    针对一个角色的优化会话
+
+    用法：
+        session = OptimizerSession(character)
+        session.best()                                  # 当前最优方案
+        session.update(base_value=2200)                 # 修改角色数值
+        session.set_affix_stats({'crit_rate': {...}})   # 修改词条统计
+        session.add_buff('协奏', dmg_bonus=0.2)          # 对所有伤害段生效的增益
+        session.what_if(base_crit_rate=0.3)             # 临时查询，不改变会话状态
+    """
+
+    def __init__(self, character: Character, catalog: Dict[str, List[Equipment]] = None,
+                 layouts=None, enumeration: str = 'multiset'):
+        """
+        Args:
+            character: 角色对象（可以带 apply_affix_stats 设置的词条统计，会作为会话的初始词条统计）
+            catalog: 装备目录，默认 EQUIPMENT_TYPES
+            layouts: 要搜索的装备布局，默认同 find_best_combination
+            enumeration: 同 compile_loadouts
+        """
+        self.affix_stats = dict(getattr(character, 'affix_stats', None) or {})
+        self.buffs: Dict[str, Dict[str, float]] = {}  # 增益名称 -> 额外加成
+        self.catalog = catalog
+        self.layouts = layouts
+        self.enumeration = enumeration
+        self.compilations = 0  # 编译次数（重新枚举搭配的次数）
+        # 词条统计会直接改变基础属性，会话保存未加词条的角色
+        self._character = replace(character)
+        if self.affix_stats:
+            self._character = _strip_affix_stats(character, self.affix_stats)
+        self._scorer = None
+        self._compiled_for = None
+        self._top_scorer = None  # 全部布局的编译结果（供 top 使用）
+        self._compile()
+
+    def _compile(self):
+        """角色类型或约束变化（使用默认布局时）后重新编译"""
+        key = (self._character.base_type, None if self.layouts is not None else repr(self._character.constraints))
+        if key != self._compiled_for:
+            self._scorer = compile_loadouts(self._character, self.catalog, self.layouts,
+                                            enumeration=self.enumeration)
+            self._compiled_for = key
+            self.compilations += 1
+
+    def _compile_top(self) -> engine.LoadoutScorer:
+        """全部布局的编译结果：指定了布局时直接使用，否则为 cost 上限内的全部布局（与角色数值无关，只编译一次）"""
+        if self.layouts is not None:
+            return self._scorer
+        if self._top_scorer is None:
+            self._top_scorer = compile_loadouts(self._character, self.catalog,
+                                                layout_rules.generate_layouts(EQUIPMENT_COSTS),
+                                                enumeration=self.enumeration)
+            self.compilations += 1
+        return self._top_scorer
+
+    @property
+    def character(self) -> Character:
+        """当前生效的角色：基础数值 + 增益 + 词条统计"""
+        return self._effective(self._character, self.buffs, self.affix_stats)
+
+    def update(self, **changes):
+        """修改角色字段，如 update(base_value=2200, base_crit_rate=0.3)"""
+        names = {f.name for f in fields(Character)}
+        unknown = set(changes) - names
+        if unknown:
+            raise ValueError(f"未知的角色字段: {', '.join(sorted(unknown))}")
+        self._character = replace(self._character, **changes)
+        self._compile()
+
+    def set_affix_stats(self, affix_stats: Dict[str, Dict[str, float]]):
+        """替换词条统计（格式同 apply_affix_stats）"""
+        self.affix_stats = dict(affix_stats)
+
+    def update_affix(self, key: str, count: int = None, avg: float = None):
+        """修改单项词条的条数或平均值，总计自动更新"""
+        entry = dict(self.affix_stats.get(key, {'count': 0, 'avg': 0.0}))
+        if count is not None:
+            entry['count'] = count
+        if avg is not None:
+            entry['avg'] = avg
+        entry['total'] = entry['count'] * entry['avg']
+        self.affix_stats[key] = entry
+
+    def add_buff(self, name: str, **modifiers: float):
+        """
+        添加（或替换）对所有伤害段生效的增益
+
+        Args:
+            name: 增益名称
+            modifiers: 额外加成，字段同 timeline.MODIFIER_FIELDS（percent, flat, dmg_bonus, crit_rate, crit_dmg）
+        """
+        unknown = set(modifiers) - set(MODIFIER_FIELDS)
+        if unknown:
+            raise ValueError(f"未知的增益字段: {', '.join(sorted(unknown))}")
+        self.buffs[name] = dict(modifiers)
+
+    def remove_buff(self, name: str):
+        """移除增益"""
+        self.buffs.pop(name, None)
+
+    def best(self, verbose: bool = False):
+        """当前最优方案，返回值同 find_best_combination"""
+        return rescore_combinations(self.character, self._scorer, verbose)
+
+    def what_if(self, affix_stats: Dict[str, Dict[str, float]] = None,
+                buffs: Dict[str, Dict[str, float]] = None, verbose: bool = False, **changes):
+        """
+        临时修改后的最优方案，不改变会话状态
+
+        Args:
+            affix_stats: 替换词条统计（为空时沿用当前的）
+            buffs: 追加的增益：{名称: 额外加成}
+            changes: 修改的角色字段；修改角色类型或约束需要重新编译，请使用 update
+        """
+        if 'base_type' in changes or ('constraints' in changes and self.layouts is None):
+            raise ValueError("修改角色类型或约束请使用 update")
+        character = self._effective(replace(self._character, **changes), {**self.buffs, **(buffs or {})},
+                                    self.affix_stats if affix_stats is None else affix_stats)
+        return rescore_combinations(character, self._scorer, verbose)
+
+    def top(self, k: int = 10) -> List[Dict]:
+        """
+        所有布局中伤害最高的 K 个搭配（满足约束的），直接在缓存的伤害数组上排序
+
+        未指定布局时在 cost 上限内的全部布局上排序（不使用剪枝后的默认布局）。
+
+        Returns:
+            方案结果列表（格式同 find_top_combinations），按伤害从高到低排列
+        """
+        character = self.character
+        base_stats = calculate_stats(character, [])
+        base_vector = engine.stats_to_vector(base_stats)
+        constraints = engine.parse_constraints(character, character.constraints)
+        scorer = self._compile_top()
+        top = search.TopK(k)
+        for layout, damages in zip(scorer.layouts, scorer.score(character, base_stats)):
+            if constraints:
+                feasible = engine.feasible_mask(character, base_stats.base_value, base_vector + layout.deltas,
+                                                constraints)
+                damages = np.where(feasible, damages, -np.inf)
+            # 每个布局只需把本布局的前 K 名放进堆，按枚举顺序加入以保证并列时的顺序稳定
+            for i in np.sort(np.argsort(-damages, kind='stable')[:k]).tolist():
+                if np.isfinite(damages[i]):
+                    equipments = [layout.slot_options[slot][j] for slot, j in enumerate(layout.indices[i])]
+                    top.push(float(damages[i]), (layout.name, equipments))
+
+        results = []
+        for _, (combo_name, equipments) in top.items():
+            stats = calculate_stats(character, equipments)
+            results.append({'combination': combo_name, 'equipments': equipments, 'stats': stats,
+                            'damage': calculate_damage(character, stats)})
+        return results
+
+    @staticmethod
+    def _effective(character: Character, buffs: Dict[str, Dict[str, float]],
+                   affix_stats: Optional[Dict[str, Dict[str, float]]]) -> Character:
+        """把增益加到每段伤害上，再加上词条统计"""
+        if buffs:
+            rotation = character.rotation or [Hit(character.name, character.skill_multiplier)]
+            totals = {f: sum(buff.get(f, 0.0) for buff in buffs.values()) for f in MODIFIER_FIELDS}
+            character = replace(character, rotation=[
+                replace(hit, **{f: getattr(hit, f) + totals[f] for f in MODIFIER_FIELDS}) for hit in rotation])
+        return apply_affix_stats(character, affix_stats or {})
+
+
+def _strip_affix_stats(character: Character, affix_stats: Dict[str, Dict[str, float]]) -> Character:
+    """apply_affix_stats 的逆操作：从角色基础属性中减去词条统计"""
+    def total(key):
+        return affix_stats.get(key, {}).get('total', 0)
+
+    return replace(
+        character,
+        base_crit_rate=character.base_crit_rate - total('crit_rate'),
+        base_crit_dmg=character.base_crit_dmg - total('crit_dmg'),
+        base_dmg_bonus=character.base_dmg_bonus - total('dmg_bonus'),
+        base_multiplier=character.base_multiplier - total('percent')
+    )
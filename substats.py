@@ -0,0 +1,235 @@
+"""
+副词条分配优化
+
+给定副词条总条数和每类词条的平均值，求使期望伤害最大的整数分配
+（暴击、爆伤、百分比、固定值、伤害加成各多少条），并可与主词条装备搭配联合求解。
+
+期望伤害 = 基础数值区 × 伤害加成区 × 暴击区 × 技能倍率，每类词条只进入一个乘区：
+- 基础数值区：百分比、固定值
+- 伤害加成区：伤害加成
+- 暴击区：暴击、爆伤
+先在每个乘区内枚举分配，得到"给该乘区 k 条时的最大值"，再对三个乘区做
+最大乘积的动态规划（各乘区取值均为正，最优解可以按乘区分解），结果是精确最优解。
+
+允许部分词条不进入这五类（如分到无关属性），即总条数可以不用满。
+技能循环各段都没有额外加成时按总倍率计算；有额外加成时乘区不可分解，不支持。
+"""
+
+from itertools import product
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import engine
+import layouts as layout_rules
+from main import (Character, EQUIPMENT_TYPES, EQUIPMENT_COSTS, apply_affix_stats,
+                  calculate_stats, calculate_damage)
+
+
+def affix_keys(base_type: str) -> Tuple[str, ...]:
+    """参与分配的词条键，固定值按角色类型区分"""
+    flat_key = 'flat_atk' if base_type == 'attack' else 'flat_hp'
+    return ('crit_rate', 'crit_dmg', 'percent', flat_key, 'dmg_bonus')
+
+
+def allocation_table(character: Character, base_value, totals: np.ndarray, total_rolls: int,
+                     affix_avg_values: Dict[str, float],
+                     max_counts: Dict[str, int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    批量求每组属性下的最优副词条分配
+
+    Args:
+        character: 角色对象（不含待分配的词条）
+        base_value: 基础攻击力或基础生命值
+        totals: (搭配数, 属性数) 的总属性数组
+        total_rolls: 副词条总条数
+        affix_avg_values: 词条平均值字典，格式: {"crit_rate": 0.093, "crit_dmg": 0.186, ...}
+        max_counts: 每类词条的条数上限（如每件装备同类词条最多一条），默认不限
+
+    Returns:
+        (counts, damages)：counts 为 (搭配数, 5) 的最优条数，列顺序同 affix_keys；
+        damages 为分配后的期望伤害
+    """
+    skill_multiplier = engine.plain_skill_multiplier(character)
+    if skill_multiplier is None:
+        raise ValueError("技能循环中有带额外加成的段，各乘区无法分开优化")
+
+    keys = affix_keys(character.base_type)
+    crit_key, crit_dmg_key, percent_key, flat_key, bonus_key = keys
+    values = {key: affix_avg_values.get(key, 0.0) for key in keys}
+    caps = {key: min(total_rolls, (max_counts or {}).get(key, total_rolls)) for key in keys}
+
+    if character.base_type == 'attack':
+        x_percent = totals[:, engine.STAT_INDEX['percent_attack']]
+        y = totals[:, engine.STAT_INDEX['flat_attack']]
+    else:  # hp
+        x_percent = totals[:, engine.STAT_INDEX['percent_hp']]
+        y = totals[:, engine.STAT_INDEX['flat_hp']]
+    crit_rate = totals[:, engine.STAT_INDEX['crit_rate']]
+    crit_dmg = totals[:, engine.STAT_INDEX['crit_dmg']]
+    dmg_bonus = totals[:, engine.STAT_INDEX['dmg_bonus']]
+
+    # 各乘区：(词条键, 给定条数时的乘区值)
+    zones = [
+        ((percent_key, flat_key),
+         lambda p, f: base_value * (1 + x_percent + character.base_multiplier + p * values[percent_key])
+         + y + f * values[flat_key]),
+        ((bonus_key,),
+         lambda b: 1 + dmg_bonus + b * values[bonus_key]),
+        ((crit_key, crit_dmg_key),
+         lambda r, d: 1 + np.minimum(crit_rate + r * values[crit_key], 1.0)
+         * (crit_dmg + d * values[crit_dmg_key] - 1)),
+    ]
+
+    n = totals.shape[0]
+    tables = [_zone_table(fn, [caps[key] for key in zone_keys], total_rolls, n)
+              for zone_keys, fn in zones]
+
+    # 最大乘积动态规划：acc[:, k] 为前若干乘区共用 k 条时的最大乘积
+    acc, _ = tables[0]
+    splits = []
+    for best, _ in tables[1:]:
+        combined = np.full((n, total_rolls + 1), -np.inf)
+        split = np.zeros((n, total_rolls + 1), dtype=np.intp)
+        for k in range(total_rolls + 1):
+            for j in range(k + 1):
+                value = acc[:, k - j] * best[:, j]
+                better = value > combined[:, k]
+                combined[better, k] = value[better]
+                split[better, k] = j
+        acc = combined
+        splits.append(split)
+
+    # 回溯每个乘区分到的条数
+    rows = np.arange(n)
+    remaining = np.full(n, total_rolls)
+    zone_rolls = [None] * len(tables)
+    for z in range(len(tables) - 1, 0, -1):
+        zone_rolls[z] = splits[z - 1][rows, remaining]
+        remaining = remaining - zone_rolls[z]
+    zone_rolls[0] = remaining
+
+    counts = np.zeros((n, len(keys)), dtype=np.int64)
+    for (zone_keys, _), (_, choice), rolls in zip(zones, tables, zone_rolls):
+        zone_counts = choice[rows, rolls]
+        for i, key in enumerate(zone_keys):
+            counts[:, keys.index(key)] = zone_counts[:, i]
+
+    damages = acc[:, total_rolls] * skill_multiplier
+    return counts, damages
+
+
+def _zone_table(fn, caps: List[int], total_rolls: int, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    单个乘区的最优值表
+
+    Returns:
+        (best, choice)：best[:, k] 为该乘区最多用 k 条时的最大值，
+        choice[:, k] 为对应的各词条条数
+    """
+    best = np.full((n, total_rolls + 1), -np.inf)
+    choice = np.zeros((n, total_rolls + 1, len(caps)), dtype=np.int64)
+    for counts in product(*(range(cap + 1) for cap in caps)):
+        k = sum(counts)
+        if k > total_rolls:
+            continue
+        value = np.broadcast_to(fn(*counts), (n,))
+        better = value > best[:, k]
+        best[better, k] = value[better]
+        choice[better, k] = counts
+
+    # 允许不用满：多给的条数可以分到无关属性
+    for k in range(1, total_rolls + 1):
+        better = best[:, k - 1] > best[:, k]
+        best[better, k] = best[better, k - 1]
+        choice[better, k] = choice[better, k - 1]
+    return best, choice
+
+
+def counts_to_affix_stats(character: Character, counts, affix_avg_values: Dict[str, float]) -> dict:
+    """将条数转换为词条统计格式: {"crit_rate": {"count": 4, "avg": 0.093, "total": 0.372}, ...}"""
+    affix_stats = {}
+    for key, count in zip(affix_keys(character.base_type), counts):
+        avg = affix_avg_values.get(key, 0.0)
+        affix_stats[key] = {"count": int(count), "avg": avg, "total": int(count) * avg}
+    return affix_stats
+
+
+def optimize_allocation(character: Character, total_rolls: int, affix_avg_values: Dict[str, float],
+                        equipments: List = None, max_counts: Dict[str, int] = None) -> dict:
+    """
+    求指定装备下的最优副词条分配
+
+    Args:
+        character: 角色对象（不含待分配的词条）
+        total_rolls: 副词条总条数
+        affix_avg_values: 词条平均值字典
+        equipments: 装备列表，默认不穿装备
+        max_counts: 每类词条的条数上限
+
+    Returns:
+        {'affix_stats': 词条统计, 'damage': 期望伤害}
+    """
+    stats = calculate_stats(character, equipments or [])
+    counts, damages = allocation_table(character, stats.base_value, engine.stats_to_vector(stats)[None, :],
+                                       total_rolls, affix_avg_values, max_counts)
+    affix_stats = counts_to_affix_stats(character, counts[0], affix_avg_values)
+    allocated = apply_affix_stats(character, affix_stats)
+    return {
+        'affix_stats': affix_stats,
+        'damage': calculate_damage(allocated, calculate_stats(allocated, equipments or []))
+    }
+
+
+def optimize_loadout_and_allocation(character: Character, total_rolls: int,
+                                    affix_avg_values: Dict[str, float],
+                                    max_counts: Dict[str, int] = None, verbose: bool = False,
+                                    catalog: Dict[str, List] = None,
+                                    layouts: List[layout_rules.Layout] = None):
+    """
+    联合求解主词条装备搭配和副词条分配
+
+    对每个布局下的每个搭配都求出最优副词条分配，再取伤害最高的组合。
+
+    Returns:
+        与 find_best_combination 相同格式的方案结果，另含 'affix_stats'；
+        用 apply_affix_stats(character, result['affix_stats']) 得到分配后的角色
+    """
+    if catalog is None:
+        catalog = EQUIPMENT_TYPES
+    if layouts is None:
+        layouts = layout_rules.get_layouts(catalog, EQUIPMENT_COSTS, character.base_type)
+
+    base_stats = calculate_stats(character, [])
+    best_result = None
+    all_results = []
+
+    for layout in layouts:
+        groups = layout.groups(catalog)
+        totals, indices, _ = engine.layout_totals(base_stats, groups, 'multiset')
+        if len(totals) == 0:
+            continue
+        counts, damages = allocation_table(character, base_stats.base_value, totals,
+                                           total_rolls, affix_avg_values, max_counts)
+        best = int(np.argmax(damages))
+
+        slot_options = engine.slot_options_of(groups)
+        equipments = [slot_options[slot][i] for slot, i in enumerate(indices[best])]
+        affix_stats = counts_to_affix_stats(character, counts[best], affix_avg_values)
+        allocated = apply_affix_stats(character, affix_stats)
+        stats = calculate_stats(allocated, equipments)
+        result = {
+            'combination': layout.name,
+            'equipments': equipments,
+            'stats': stats,
+            'damage': calculate_damage(allocated, stats),
+            'affix_stats': affix_stats
+        }
+        all_results.append(result)
+        if best_result is None or result['damage'] > best_result['damage']:
+            best_result = result
+
+    if verbose:
+        return best_result, all_results
+    else:
+        return best_result
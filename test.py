@@ -2,15 +2,15 @@
 测试脚本 - 自动测试所有角色
 """
 
-from main import load_character, find_best_combination, print_result, print_all_combinations
-import yaml
+import sys
 
-def test_all_characters():
-    """测试所有配置的角色"""
-    with open('characters.yml', 'r', encoding='utf-8') as f:
-        data = yaml.safe_load(f)
+from main import load_character, print_result, print_all_combinations
+from result_cache import cached_find_best_combination
+import config
 
-    character_names = list(data['characters'].keys())
+def test_all_characters(use_cache=True):
+    """测试所有配置的角色（输入未变化的角色直接读取缓存结果）"""
+    character_names = config.character_names()
 
     print("=== 自动测试所有角色 ===\n")
 
@@ -18,7 +18,7 @@ def test_all_characters():
         print(f"正在计算 {name} 的最优装备方案...\n")
 
         character = load_character(name)
-        best_result, all_results = find_best_combination(character, verbose=True)
+        best_result, all_results = cached_find_best_combination(character, use_cache=use_cache, verbose=True)
 
         # 输出所有方案对比
         print_all_combinations(character, all_results)
@@ -29,4 +29,4 @@ def test_all_characters():
         print("\n" + "="*80 + "\n")
 
 if __name__ == '__main__':
-    test_all_characters()
+    test_all_characters(use_cache='--no-cache' not in sys.argv)
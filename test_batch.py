@@ -0,0 +1,67 @@
+"""
+测试批量优化 - 多进程结果与顺序执行一致，非交互命令行输出 JSON Lines / CSV
+"""
+
+import csv
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+import batch
+from batch import build_tasks, iter_results, optimize_roster
+
+
+def test_roster_order_is_deterministic():
+    """多进程结果应与单进程完全一致，且按配置文件顺序排列"""
+    serial = optimize_roster(jobs=1)
+    parallel = optimize_roster(jobs=2)
+
+    assert serial == parallel
+    for record in parallel:
+        assert 'best' in record or 'error' in record
+
+
+def test_streamed_results():
+    """按完成顺序产出的结果与按配置顺序的结果是同一组"""
+    tasks = build_tasks('characters.yml')
+    streamed = list(iter_results(tasks, jobs=2))
+    ordered = list(iter_results(tasks, jobs=2, ordered=True))
+    assert [r['character'] for r in ordered] == [task[1] for task in tasks]
+    key = lambda r: r['character']
+    assert sorted(streamed, key=key) == sorted(ordered, key=key)
+
+
+def test_cli_formats():
+    """指定角色、从标准输入读取场景，输出 JSON Lines 和 CSV"""
+    expected = optimize_roster(jobs=1)
+    name = expected[0]['character']
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'out.jsonl')
+        assert batch.main(['-c', name, '--jobs', '1', '-o', path]) == 0
+        with open(path, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        assert [r['character'] for r in records] == [name]
+        assert records[0]['best']['damage'] == expected[0]['best']['damage']
+
+        scenario = json.dumps({'characters': {'输入角色': {
+            'base_type': 'attack', 'base_value': 2000, 'base_multiplier': 0.0, 'base_crit_rate': 0.05,
+            'base_crit_dmg': 1.5, 'base_dmg_bonus': 0.0, 'skill_multiplier': 2.0}}})
+        path = os.path.join(tmp, 'out.csv')
+        with mock.patch('sys.stdin', io.StringIO(scenario)):
+            assert batch.main(['-', '--format', 'csv', '--jobs', '1', '-o', path]) == 0
+        with open(path, encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+        assert len(rows) == 1 and rows[0]['character'] == '输入角色' and not rows[0]['error']
+        assert float(rows[0]['damage']) > 0 and rows[0]['equipments']
+
+    # 角色不存在：参数错误
+    assert batch.main(['-c', '不存在的角色']) == 2
+
+
+if __name__ == '__main__':
+    test_roster_order_is_deterministic()
+    test_streamed_results()
+    test_cli_formats()
+    print("批量优化测试通过")
@@ -0,0 +1,74 @@
+"""
+测试性能基准 - 合成数据可重复、历史记录读写、回归判定
+"""
+
+import math
+import os
+import tempfile
+
+import benchmark
+from benchmark import build_cases, compare, load_history, measure, save_history, synthetic_catalog
+from main import find_best_combination
+
+
+def test_synthetic_data():
+    """同样的规模和种子得到同样的目录，所有基准都能运行"""
+    catalog = synthetic_catalog(3)
+    assert [len(options) for options in catalog.values()] == [3, 3, 3]
+    assert repr(catalog) == repr(synthetic_catalog(3))
+    assert [eq.substats for eq in catalog['4']] == [eq.substats for eq in synthetic_catalog(3)['4']]
+
+    cases = build_cases(sizes=(2,), slot_counts=(4,), roster_sizes=(2,))
+    names = [case.name for case in cases]
+    assert len(names) == len(set(names))
+    for case in cases:
+        case.func()
+    # 分支定界与穷举在合成目录上结果一致
+    character = benchmark.synthetic_roster(1)[0]
+    assert math.isclose(find_best_combination(character, catalog=catalog, method='branch_and_bound')['damage'],
+                        find_best_combination(character, catalog=catalog)['damage'], rel_tol=1e-9)
+
+
+def test_measure():
+    """每轮至少 min_time 秒，返回单次耗时"""
+    calls = []
+    result = measure(lambda: calls.append(1), min_time=0.001, repeat=3)
+    assert result['loops'] >= 1 and len(calls) >= 3 * result['loops']
+    assert 0 < result['seconds'] <= result['median']
+
+
+def test_history_and_regressions():
+    """历史记录读写；比最近几次的中位数慢超过阈值时标记为回归"""
+    history = [{'machine': 'a', 'results': {'x': {'seconds': seconds}, 'y': {'seconds': 1.0}}}
+               for seconds in (1.0, 1.1, 0.9)]
+    history.append({'machine': 'b', 'results': {'x': {'seconds': 10.0}}})
+    results = {'x': {'seconds': 1.3}, 'y': {'seconds': 1.1}, 'z': {'seconds': 1.0}}
+
+    rows = {row[0]: row for row in compare(results, history, threshold=0.2, machine='a')}
+    assert rows['x'][2] == 1.0 and rows['x'][4]
+    assert not rows['y'][4]
+    assert math.isnan(rows['z'][2]) and not rows['z'][4]
+    # 不限机器时其他机器的慢结果拉高基准
+    assert not {row[0]: row for row in compare(results, history, window=2)}['x'][4]
+
+    # 快速模式的数据规模不同，只与快速模式的历史比较
+    quick_run = {'machine': 'a', 'quick': True, 'results': {'x': {'seconds': 0.1}}}
+    assert compare(results, history + [quick_run], machine='a')[0][2] == 1.0
+    assert compare(results, history + [quick_run], machine='a', quick=True)[0][2] == 0.1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'history.json')
+        assert load_history(path) == []
+        save_history(history, path)
+        assert load_history(path) == history
+
+        assert benchmark.main(['--quick', '-k', 'calculate_damage', '--history', path]) == 0
+        runs = load_history(path)
+        assert len(runs) == len(history) + 1 and list(runs[-1]['results']) == ['calculate_damage']
+
+
+if __name__ == '__main__':
+    test_synthetic_data()
+    test_measure()
+    test_history_and_regressions()
+    print("性能基准测试通过")
@@ -0,0 +1,75 @@
+"""
+测试配置缓存 - 文件修改后自动失效，快照可用于冷启动
+"""
+
+import os
+import tempfile
+
+import config
+from main import load_character
+
+CONFIG_TEXT = """characters:
+  测试角色:
+    base_type: attack
+    base_value: {base_value}
+    base_crit_rate: 0.05
+    base_crit_dmg: 1.50
+    base_dmg_bonus: 0.0
+    constraints:
+      crit_rate: {{min: 0.5}}
+    rotation:
+      - {{name: 普攻, multiplier: 0.5, count: 4}}
+"""
+
+
+def write_config(path, base_value):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(CONFIG_TEXT.format(base_value=base_value))
+
+
+def test_cache_invalidation():
+    """同一文件只解析一次，文件内容变化后重新解析"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'characters.yml')
+        write_config(path, 2000)
+
+        assert config.load(path) is config.load(path)
+        character = load_character('测试角色', path)
+        assert character.base_value == 2000
+
+        # 修改返回的角色（包括约束和技能循环）不影响缓存
+        character.base_value = 1
+        character.constraints['crit_rate']['min'] = 0.9
+        character.constraints['dmg_bonus'] = {'min': 0.1}
+        character.rotation[0].multiplier = 9.0
+        character.rotation.append(character.rotation[0])
+        fresh = load_character('测试角色', path)
+        assert fresh.base_value == 2000
+        assert fresh.constraints == {'crit_rate': {'min': 0.5}}
+        assert [(hit.name, hit.multiplier, hit.count) for hit in fresh.rotation] == [('普攻', 0.5, 4)]
+
+        write_config(path, 25000)
+        assert load_character('测试角色', path).base_value == 25000
+
+
+def test_snapshot():
+    """快照与配置文件签名一致时直接使用，配置文件变化后失效"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'characters.yml')
+        write_config(path, 2000)
+
+        data = config.load(path, snapshot=True).data
+        assert os.path.exists(path + config.SNAPSHOT_SUFFIX)
+
+        config.invalidate()
+        assert config.load(path, snapshot=True).data == data
+
+        write_config(path, 25000)
+        config.invalidate()
+        assert config.load_characters(path, snapshot=True)['测试角色']['base_value'] == 25000
+
+
+if __name__ == '__main__':
+    test_cache_invalidation()
+    test_snapshot()
+    print("配置缓存测试通过")
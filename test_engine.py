@@ -0,0 +1,232 @@
+"""
+测试向量化引擎 - 与逐个搭配计算的结果对比
+"""
+
+from dataclasses import asdict, fields, replace
+
+import pytest
+
+from conftest import make_character, make_hp_character
+import engine
+from main import (Equipment, Hit, Stats, EQUIPMENT_TYPES, EQUIPMENT_COSTS, apply_affix_stats, find_best_combination,
+                  calculate_stats, calculate_damage, calculate_next_affix_gain, calculate_next_affix_gain_batch,
+                  compile_loadouts, rescore_combinations)
+from layouts import generate_layouts, get_layouts
+
+
+def make_characters():
+    """构造攻击型（带固定攻击词条）和生命型测试角色"""
+    attack = make_character()
+    attack.affix_stats = {"flat_atk": {"count": 4, "avg": 40, "total": 160}}
+    return [attack, make_hp_character()]
+
+
+def test_vectorized_matches_python():
+    """向量化结果应与逐个计算完全一致"""
+    for character in make_characters():
+        fast_best, fast_all = find_best_combination(character, verbose=True)
+        slow_best, slow_all = find_best_combination(character, verbose=True, vectorized=False)
+
+        assert fast_best['combination'] == slow_best['combination']
+        assert fast_best['damage'] == slow_best['damage']
+        assert len(fast_all) == len(slow_all)
+        for fast, slow in zip(fast_all, slow_all):
+            assert fast['combination'] == slow['combination']
+            assert fast['equipments'] == slow['equipments']
+            assert fast['stats'] == slow['stats']
+            assert fast['damage'] == slow['damage']
+
+
+def test_multiset_enumeration():
+    """多重集枚举应得到相同的最优伤害，并跳过重复排列"""
+    for character in make_characters():
+        _, product_all = find_best_combination(character, verbose=True)
+        _, multiset_all = find_best_combination(character, verbose=True, enumeration='multiset')
+        _, python_all = find_best_combination(character, verbose=True, vectorized=False,
+                                              enumeration='multiset')
+
+        for full, fast, slow in zip(product_all, multiset_all, python_all):
+            assert abs(fast['damage'] - full['damage']) < 1e-9 * full['damage']
+            assert fast['damage'] == slow['damage']
+            assert fast['evaluated'] == slow['evaluated']
+            assert fast['evaluated'] + fast['skipped_permutations'] == full['evaluated']
+
+        # 44111: 4类2件 C(3,2)=3 种 × 1类3件 C(4,3)=4 种，共 12 种，原为 2^2 × 2^3 = 32 种排列
+        assert multiset_all[0]['evaluated'] == 12
+        assert multiset_all[0]['skipped_permutations'] == 20
+
+
+def test_generated_layouts():
+    """按 cost 规则生成布局，并剔除被支配的布局"""
+    names = [layout.name for layout in generate_layouts(EQUIPMENT_COSTS)]
+    assert names[:3] == ['44111', '43311', '43111']
+    assert '33311' in names
+    assert all(layout.cost <= 12 for layout in generate_layouts(EQUIPMENT_COSTS))
+
+    # 攻击型角色：1类装备被3类装备支配，43111 不需要再搜索
+    attack_names = [layout.name for layout in get_layouts(EQUIPMENT_TYPES, EQUIPMENT_COSTS, 'attack')]
+    assert '43111' not in attack_names
+    assert attack_names[:2] == ['44111', '43311']
+
+    # 剔除布局不应影响最优结果
+    for character in make_characters():
+        pruned = find_best_combination(character)
+        full = find_best_combination(character, layouts=generate_layouts(EQUIPMENT_COSTS))
+        assert pruned['damage'] == full['damage']
+
+
+def test_affix_gain_closed_form():
+    """解析收益率应与修改属性后重新计算伤害一致，批量结果与逐个计算一致"""
+    affix_avg_values = {"crit_rate": 0.093, "crit_dmg": 0.186, "percent": 0.101,
+                        "dmg_bonus": 0.101, "flat_hp": 510, "flat_atk": 40}
+    fields = {"暴击": "crit_rate", "爆伤": "crit_dmg", "伤害加成": "dmg_bonus",
+              "攻击百分比": "percent_attack", "攻击固定值": "flat_attack",
+              "生命百分比": "percent_hp", "生命固定值": "flat_hp"}
+
+    for character in make_characters():
+        _, all_results = find_best_combination(character, verbose=True)
+        stats_list = [result['stats'] for result in all_results]
+        # 暴击率超过上限的情况
+        stats_list.append(replace(stats_list[0], crit_rate=0.95))
+
+        batch = calculate_next_affix_gain_batch(character, stats_list, affix_avg_values)
+        for stats, gains in zip(stats_list, batch):
+            assert gains == calculate_next_affix_gain(character, stats, affix_avg_values)
+            current = calculate_damage(character, stats)
+            for label, info in gains.items():
+                field = fields[label]
+                probed = replace(stats, **{field: getattr(stats, field) + info['avg_value']})
+                expected = calculate_damage(character, probed) - current
+                assert abs(info['damage_increase'] - expected) < 1e-9 * current
+
+
+def test_rotation_scoring():
+    """技能循环的伤害应等于各段单独计算后求和，各搜索方法结果一致"""
+    for character in make_characters():
+        character.rotation = [
+            Hit('普攻', 0.5, count=4),
+            Hit('重击', 1.2, count=2, dmg_bonus=0.2),
+            Hit('大招', 3.0, crit_rate=0.3, crit_dmg=0.5),
+            Hit('协奏', 0.4, dmg_bonus=0.2),
+        ]
+        single_hits = [replace(character, rotation=[], skill_multiplier=hit.multiplier * hit.count,
+                               base_dmg_bonus=character.base_dmg_bonus + hit.dmg_bonus,
+                               base_crit_rate=character.base_crit_rate + hit.crit_rate,
+                               base_crit_dmg=character.base_crit_dmg + hit.crit_dmg)
+                       for hit in character.rotation]
+        for single in single_hits:
+            if hasattr(character, 'affix_stats'):
+                single.affix_stats = character.affix_stats
+
+        best, all_results = find_best_combination(character, verbose=True)
+        _, python_all = find_best_combination(character, verbose=True, vectorized=False)
+        bnb_best = find_best_combination(character, method='branch_and_bound')
+        assert abs(bnb_best['damage'] - best['damage']) < 1e-9 * best['damage']
+        for fast, slow in zip(all_results, python_all):
+            assert fast['damage'] == slow['damage']
+            expected = sum(calculate_damage(single, calculate_stats(single, fast['equipments']))
+                           for single in single_hits)
+            assert abs(fast['damage'] - expected) < 1e-9 * expected
+
+        # 有额外加成时收益率改为重新计算伤害
+        affix_avg_values = {"crit_rate": 0.093, "crit_dmg": 0.186, "dmg_bonus": 0.101}
+        gains = calculate_next_affix_gain(character, best['stats'], affix_avg_values)
+        probed = replace(best['stats'], crit_rate=best['stats'].crit_rate + 0.093)
+        expected = calculate_damage(character, probed) - best['damage']
+        assert abs(gains['暴击']['damage_increase'] - expected) < 1e-9 * best['damage']
+
+
+
+def test_rescore_compiled_loadouts():
+    """在编译好的搭配上重新计算与完整搜索一致，只改暴击相关数值时只重算暴击区"""
+    for character in make_characters():
+        scorer = compile_loadouts(character)
+        edits = [
+            {},
+            {'base_crit_rate': character.base_crit_rate + 0.3},
+            {'base_crit_dmg': 2.4},
+            {'base_value': character.base_value * 1.1, 'base_dmg_bonus': 0.2},
+            {'rotation': [Hit('普攻', 0.5, 4), Hit('大招', 3.0, dmg_bonus=0.2)]},
+        ]
+        for edit in edits:
+            edited = replace(character, **edit)
+            edited.affix_stats = getattr(character, 'affix_stats', {})
+            best, all_results = rescore_combinations(edited, scorer, verbose=True)
+            expected, expected_all = find_best_combination(edited, verbose=True)
+            assert best['combination'] == expected['combination']
+            assert abs(best['damage'] - expected['damage']) < 1e-9 * expected['damage']
+            assert [r['combination'] for r in all_results] == [r['combination'] for r in expected_all]
+
+    character = make_characters()[0]
+    scorer = compile_loadouts(character)
+    rescore_combinations(character, scorer)
+    before = dict(scorer.recomputed)
+    affix = {**character.affix_stats, 'crit_rate': {'count': 3, 'avg': 0.081, 'total': 0.243}}
+    rescore_combinations(apply_affix_stats(character, affix), scorer)
+    changed = {part for part in before if scorer.recomputed[part] != before[part]}
+    assert changed == {'crit_part'}
+
+
+# 按名称逐项比较的属性汇总（改用属性编号之前的 calculate_stats 写法），作为对照
+STAT_NAMES = {'暴击': 'crit_rate', '爆伤': 'crit_dmg', '攻击%': 'percent_attack', '生命%': 'percent_hp',
+              '伤害加成': 'dmg_bonus', '固定攻击': 'flat_attack', '固定生命': 'flat_hp'}
+
+
+def reference_stats(character, equipments):
+    """逐件装备按词条名称累加属性"""
+    totals = {name: 0.0 for name in engine.STAT_FIELDS}
+    totals.update(crit_rate=character.base_crit_rate, crit_dmg=character.base_crit_dmg,
+                  dmg_bonus=character.base_dmg_bonus)
+    for eq in equipments:
+        terms = [(eq.main_stat_type, eq.main_stat_value), (eq.sub_stat_type, eq.sub_stat_value)]
+        for name, value in terms + list(eq.substats.items()):
+            name = STAT_NAMES.get(name, name)
+            if name in totals:
+                totals[name] += value
+    affix_stats = getattr(character, 'affix_stats', {})
+    totals['flat_attack'] += affix_stats.get('flat_atk', {}).get('total', 0)
+    totals['flat_hp'] += affix_stats.get('flat_hp', {}).get('total', 0)
+    return totals
+
+
+def test_stat_codes_and_slotted_stats():
+    """
+    按属性编号累加的属性与按词条名称比较的结果一致（含随机词条和不影响伤害的词条），
+    Stats 使用 __slots__ 后仍可用 replace/asdict
+    """
+    pieces = [eq for options in EQUIPMENT_TYPES.values() for eq in options] + [
+        Equipment('4', '暴击', 0.22, '固定攻击', 150, substats={'爆伤': 0.1, '防御': 60, 'crit_rate': 0.05}),
+        Equipment('3', '共鸣效率', 0.32, '固定生命', 2280, substats={'固定攻击': 40, '生命%': 0.086}),
+    ]
+    assert pieces[-1].main_stat_code == -1 and pieces[-1].sub_stat_code == engine.STAT_INDEX['flat_hp']
+    assert pieces[-2].substat_codes == [(engine.STAT_INDEX['crit_dmg'], 0.1), (engine.STAT_INDEX['crit_rate'], 0.05)]
+
+    for character in make_characters():
+        for equipments in ([], pieces[:3], pieces[-2:], pieces):
+            stats = calculate_stats(character, equipments)
+            expected = reference_stats(character, equipments)
+            assert stats.base_value == character.base_value
+            for name in engine.STAT_FIELDS:
+                assert getattr(stats, name) == pytest.approx(expected[name], rel=1e-12, abs=1e-12)
+
+    stats = calculate_stats(make_characters()[0], pieces)
+    assert not hasattr(stats, '__dict__')
+    with pytest.raises(AttributeError):
+        stats.speed = 1.0
+    record = asdict(stats)
+    assert list(record) == ['base_value'] + list(engine.STAT_FIELDS) == [f.name for f in fields(Stats)]
+    assert Stats(**record) == stats
+    changed = replace(stats, crit_rate=0.5)
+    assert changed.crit_rate == 0.5 and stats.crit_rate != 0.5
+    assert asdict(changed) == {**record, 'crit_rate': 0.5}
+
+
+if __name__ == '__main__':
+    test_vectorized_matches_python()
+    test_multiset_enumeration()
+    test_generated_layouts()
+    test_affix_gain_closed_form()
+    test_rotation_scoring()
+    test_rescore_compiled_loadouts()
+    test_stat_codes_and_slotted_stats()
+    print("向量化引擎结果一致")
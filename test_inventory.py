@@ -0,0 +1,147 @@
+"""
+测试背包装备优化 - 导入、支配剪枝，以及与不重复穷举的结果对比
+"""
+
+import csv
+import json
+import os
+import random
+import tempfile
+from collections import Counter
+from dataclasses import replace
+
+import numpy as np
+
+from conftest import make_character
+import engine
+from inventory import (InventoryColumns, dominated_mask, find_best_inventory, load_inventory, prune_columns,
+                       prune_inventory, read_accounts, read_columns)
+from layouts import generate_layouts
+from main import Equipment, EQUIPMENT_COSTS, calculate_damage, calculate_stats, find_best_combination
+
+MAIN_STATS = {'4': ['暴击', '爆伤', '攻击%', '生命%'], '3': ['攻击%', '伤害加成', '生命%'], '1': ['攻击%', '生命%']}
+MAIN_VALUES = {'暴击': 0.22, '爆伤': 0.44, '攻击%': 0.3, '生命%': 0.3, '伤害加成': 0.3}
+SUBSTATS = ['暴击', '爆伤', '攻击%', '固定攻击', '伤害加成', '生命%', '固定生命', '防御']
+
+
+def random_inventory(count, seed=1):
+    """随机生成背包装备，每件 4 条随机副词条"""
+    rng = random.Random(seed)
+    pieces = []
+    for _ in range(count):
+        category = rng.choice('431')
+        main_stat = rng.choice(MAIN_STATS[category])
+        substats = {name: rng.randint(30, 500) if name in ('固定攻击', '固定生命', '防御')
+                    else round(rng.uniform(0.06, 0.2), 3)
+                    for name in rng.sample(SUBSTATS, 4)}
+        pieces.append(Equipment(category, main_stat, MAIN_VALUES[main_stat] * (0.6 if category == '1' else 1),
+                                '固定生命' if category == '1' else '固定攻击', 100, substats=substats))
+    return pieces
+
+
+def test_load_inventory():
+    """JSON 导出文件读取后与原装备一致，副词条计入属性"""
+    pieces = random_inventory(5)
+    data = {'pieces': [{'category': p.category, 'main_stat_type': p.main_stat_type,
+                        'main_stat_value': p.main_stat_value, 'sub_stat_type': p.sub_stat_type,
+                        'sub_stat_value': p.sub_stat_value, 'substats': p.substats} for p in pieces]}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, '背包.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        loaded = load_inventory(path)
+    assert [(p.category, p.main_stat_type, p.substats) for p in loaded] == \
+        [(p.category, p.main_stat_type, p.substats) for p in pieces]
+
+    character = make_character()
+    piece = Equipment('4', '暴击', 0.22, '固定攻击', 150, substats={'爆伤': 0.1, '防御': 60})
+    plain = replace(piece, substats={})
+    assert abs(calculate_stats(character, [piece]).crit_dmg - calculate_stats(character, [plain]).crit_dmg - 0.1) < 1e-12
+
+
+def test_pruning_keeps_optimum():
+    """剪枝后的搜索结果与对全部装备做不重复穷举一致，且每件装备最多使用一次"""
+    character = make_character()
+    pieces = random_inventory(40)
+    catalog = {category: [p for p in pieces if p.category == category] for category in EQUIPMENT_COSTS}
+    exhaustive = find_best_combination(character, catalog=catalog, layouts=generate_layouts(EQUIPMENT_COSTS),
+                                       enumeration='distinct')
+
+    best = find_best_inventory(character, pieces)
+    assert abs(best['damage'] - exhaustive['damage']) < 1e-9 * exhaustive['damage']
+    assert abs(calculate_damage(character, calculate_stats(character, best['equipments'])) - best['damage']) \
+        < 1e-9 * best['damage']
+    assert max(Counter(map(id, best['equipments'])).values()) == 1
+    assert best['inventory']['candidates'] < best['inventory']['pieces']
+
+
+def test_prune_large_inventory():
+    """几千件装备剪枝后只剩少量候选，同一类别至少保留布局需要的件数"""
+    pieces = random_inventory(2000)
+    catalog = prune_inventory(pieces, 'attack', {'4': 2, '3': 3, '1': 3})
+    assert sum(len(options) for options in catalog.values()) < len(pieces) / 2
+    # 完全相同的装备也至少保留 keep 件
+    duplicates = prune_inventory([replace(pieces[0]) for _ in range(5)], 'attack', {pieces[0].category: 2})
+    assert len(duplicates[pieces[0].category]) == 2
+
+
+def test_dominated_mask_matches_pairwise():
+    """排序扫描的结果与两两比较的定义一致（包括完全相同的装备）"""
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        matrix = rng.integers(0, 4, size=(rng.integers(1, 60), 3)).astype(float)
+        for keep in (1, 2, 3):
+            expected = [sum(j != i and (matrix[j] >= matrix[i]).all() and ((matrix[j] > matrix[i]).any() or j < i)
+                            for j in range(len(matrix))) >= keep for i in range(len(matrix))]
+            assert dominated_mask(matrix, keep).tolist() == expected
+
+
+def test_streaming_columns():
+    """JSONL 与 CSV 流式读入的列数据与逐件构造的 Equipment 一致，剪枝和搜索结果相同"""
+    character = make_character()
+    pieces = random_inventory(300, seed=3)
+    expected = engine.build_delta_matrix(pieces)
+
+    with tempfile.TemporaryDirectory() as directory:
+        jsonl_path = os.path.join(directory, '背包.jsonl')
+        with open(jsonl_path, 'w', encoding='utf-8') as f:
+            for n, p in enumerate(pieces):
+                f.write(json.dumps({'account': f'账号{n // 200}', 'category': p.category,
+                                    'main_stat_type': p.main_stat_type, 'main_stat_value': p.main_stat_value,
+                                    'sub_stat_type': p.sub_stat_type, 'sub_stat_value': p.sub_stat_value,
+                                    'substats': p.substats}, ensure_ascii=False) + '\n')
+        # CSV 中每个随机词条一列，空白表示没有该词条
+        csv_path = os.path.join(directory, '背包.csv')
+        with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, ['category', 'main_stat_type', 'main_stat_value',
+                                        'sub_stat_type', 'sub_stat_value'] + SUBSTATS)
+            writer.writeheader()
+            for p in pieces:
+                writer.writerow({'category': p.category, 'main_stat_type': p.main_stat_type,
+                                 'main_stat_value': p.main_stat_value, 'sub_stat_type': p.sub_stat_type,
+                                 'sub_stat_value': p.sub_stat_value, **p.substats})
+
+        for columns in (read_columns(jsonl_path), read_columns(csv_path), InventoryColumns.from_pieces(pieces)):
+            assert len(columns) == len(pieces)
+            assert np.allclose(columns.delta_matrix(), expected)
+            assert np.allclose(engine.build_delta_matrix([columns.piece(row) for row in range(len(columns))]), expected)
+
+        accounts = [(account, len(columns)) for account, columns in read_accounts(jsonl_path)]
+        assert accounts == [('账号0', 200), ('账号1', 100)]
+
+        columns = read_columns(csv_path)
+    limits = {'4': 2, '3': 3, '1': 3}
+    assert {c: len(v) for c, v in prune_columns(columns, 'attack', limits).items()} == \
+        {c: len(v) for c, v in prune_inventory(pieces, 'attack', limits).items()}
+    best = find_best_inventory(character, pieces)
+    streamed = find_best_inventory(character, columns)
+    assert abs(streamed['damage'] - best['damage']) < 1e-9 * best['damage']
+
+
+if __name__ == '__main__':
+    test_load_inventory()
+    test_pruning_keeps_optimum()
+    test_prune_large_inventory()
+    test_dominated_mask_matches_pairwise()
+    test_streaming_columns()
+    print("背包装备优化测试通过")
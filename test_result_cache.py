@@ -0,0 +1,88 @@
+"""
+测试结果缓存 - 指纹稳定性、命中、LRU 淘汰和跳过缓存
+"""
+
+import os
+import tempfile
+from dataclasses import replace
+from unittest import mock
+
+from conftest import make_character
+import result_cache
+from main import Equipment, EQUIPMENT_TYPES, apply_affix_stats, find_best_combination
+from result_cache import ResultCache, cached_find_best_combination, scenario_fingerprint
+
+
+def test_fingerprint():
+    """相同输入得到相同指纹，任何影响结果的输入变化都得到新指纹"""
+    character = make_character()
+    key = scenario_fingerprint(character, verbose=True)
+    assert key == scenario_fingerprint(make_character(), verbose=True)
+    assert key == scenario_fingerprint(replace(character, name="改名", base_value=2000.0), verbose=True)
+
+    catalog = {category: list(options) for category, options in EQUIPMENT_TYPES.items()}
+    catalog['1'] = catalog['1'] + [Equipment('1', '攻击%', 0.18, '固定生命', 2280, substats={'暴击': 0.06})]
+    changed = [
+        scenario_fingerprint(replace(character, base_crit_rate=0.06), verbose=True),
+        scenario_fingerprint(apply_affix_stats(character, {'crit_rate': {'count': 1, 'avg': 0.0, 'total': 0.0}}),
+                             verbose=True),
+        scenario_fingerprint(character, verbose=True, catalog=catalog),
+        scenario_fingerprint(character, verbose=True, method='branch_and_bound'),
+        scenario_fingerprint(character, verbose=False),
+    ]
+    assert len({key, *changed}) == len(changed) + 1
+
+    with mock.patch('engine.ENGINE_VERSION', -1):
+        assert scenario_fingerprint(character, verbose=True) != key
+
+
+def test_cache_hit():
+    """第二次计算直接读取缓存，结果与直接计算一致；use_cache=False 时总是重新计算"""
+    character = make_character()
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResultCache(os.path.join(tmp, 'results.sqlite'))
+        best, all_results = cached_find_best_combination(character, cache=cache, verbose=True)
+        with mock.patch.object(result_cache, 'find_best_combination') as search:
+            cached_best, cached_all = cached_find_best_combination(character, cache=cache, verbose=True)
+            assert not search.called
+            cached_find_best_combination(character, cache=cache, use_cache=False, verbose=True)
+            assert search.called
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        expected = find_best_combination(character)
+        assert cached_best['damage'] == best['damage'] == expected['damage']
+        assert cached_best['equipments'] == expected['equipments']
+        assert [r['combination'] for r in cached_all] == [r['combination'] for r in all_results]
+
+        # 重新打开缓存文件后仍然命中
+        cache.close()
+        cache = ResultCache(os.path.join(tmp, 'results.sqlite'))
+        cached_find_best_combination(character, cache=cache, verbose=True)
+        assert cache.hits == 1
+        cache.close()
+
+
+def test_lru_eviction():
+    """超出大小限制时淘汰最久未使用的结果"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResultCache(os.path.join(tmp, 'results.sqlite'), max_bytes=3000)
+        payload = 'x' * 900
+        for key in ('a', 'b', 'c'):
+            cache.put(key, payload)
+        assert len(cache) == 3
+        assert cache.get('a') == payload  # a 变为最近使用
+        cache.put('d', payload)
+        assert cache.get('b') is None
+        assert cache.get('a') == payload and cache.get('c') == payload and cache.get('d') == payload
+        assert cache.size() <= 3000
+
+        cache.clear()
+        assert len(cache) == 0
+        cache.close()
+
+
+if __name__ == '__main__':
+    test_fingerprint()
+    test_cache_hit()
+    test_lru_eviction()
+    print("结果缓存测试通过")
@@ -0,0 +1,264 @@
+"""
+测试搜索模式 - 分支定界等
+"""
+
+from itertools import islice, product
+
+import numpy as np
+
+from conftest import make_character
+import engine
+from layouts import generate_layouts, get_layouts
+from main import (Equipment, EQUIPMENT_COSTS, EQUIPMENT_TYPES, calculate_stats, find_best_combination,
+                  find_pareto_combinations, find_top_combinations, iter_ranked_combinations)
+from search import ParetoFront, TopK, gray_code_steps, pareto_mask
+
+
+def make_large_catalog():
+    """构造每个类别都有多种主/副词条数值的装备目录"""
+    catalog = {'4': [], '3': [], '1': []}
+    for step in range(4):
+        scale = 1 - 0.1 * step
+        catalog['4'].append(Equipment('4', '爆伤', 0.44 * scale, '固定攻击', 150 - 20 * step))
+        catalog['4'].append(Equipment('4', '暴击', 0.22 * scale, '固定攻击', 100 + 20 * step))
+        catalog['3'].append(Equipment('3', '攻击%', 0.30 * scale, '固定攻击', 60 + 20 * step))
+        catalog['3'].append(Equipment('3', '伤害加成', 0.30 * scale, '固定攻击', 100 - 10 * step))
+        catalog['3'].append(Equipment('3', '生命%', 0.30 * scale, '固定攻击', 100))
+        catalog['1'].append(Equipment('1', '攻击%', 0.18 * scale, '固定生命', 2280))
+        catalog['1'].append(Equipment('1', '生命%', 0.228 * scale, '固定攻击', 10 * step))
+    return catalog
+
+
+def test_branch_and_bound_matches_exhaustive():
+    """分支定界应找到与穷举相同的最优伤害"""
+    character = make_character()
+    for catalog in (None, make_large_catalog()):
+        exhaustive_best, exhaustive_all = find_best_combination(
+            character, verbose=True, enumeration='multiset', catalog=catalog)
+        bnb_best, bnb_all = find_best_combination(
+            character, verbose=True, method='branch_and_bound', catalog=catalog)
+
+        assert abs(bnb_best['damage'] - exhaustive_best['damage']) < 1e-9 * exhaustive_best['damage']
+        for exhaustive, bnb in zip(exhaustive_all, bnb_all):
+            assert abs(bnb['damage'] - exhaustive['damage']) < 1e-9 * exhaustive['damage']
+            assert bnb['evaluated'] <= exhaustive['evaluated']
+
+
+def test_branch_and_bound_prunes():
+    """大目录下应剪掉大部分分支，共用当前最优时剪得更多"""
+    character = make_character()
+    catalog = make_large_catalog()
+
+    _, exhaustive_all = find_best_combination(character, verbose=True, enumeration='multiset', catalog=catalog)
+    _, bnb_all = find_best_combination(character, verbose=True, method='branch_and_bound', catalog=catalog)
+    assert all(result['nodes_pruned'] > 0 for result in bnb_all)
+    assert sum(r['evaluated'] for r in bnb_all) < sum(r['evaluated'] for r in exhaustive_all) / 10
+
+    # 非 verbose 模式下各布局共用当前最优伤害
+    best = find_best_combination(character, method='branch_and_bound', catalog=catalog)
+    assert best['damage'] == max(result['damage'] for result in bnb_all)
+
+
+def test_gray_code_steps():
+    """格雷码每步只改变一位且变化为 1，遍历所有组合各一次"""
+    radices = (3, 1, 2, 4)
+    state = [0] * len(radices)
+    seen = {tuple(state)}
+    for slot, old, new in gray_code_steps(radices):
+        assert state[slot] == old and abs(new - old) == 1
+        state[slot] = new
+        seen.add(tuple(state))
+    assert seen == set(product(*(range(r) for r in radices)))
+
+
+def test_gray_code_matches_exhaustive():
+    """格雷码增量枚举应得到与穷举相同的结果"""
+    character = make_character()
+    small_catalog = {category: pieces[:4] for category, pieces in make_large_catalog().items()}
+    for catalog in (None, small_catalog):
+        _, exhaustive_all = find_best_combination(character, verbose=True, catalog=catalog)
+        _, gray_all = find_best_combination(character, verbose=True, method='gray_code',
+                                            catalog=catalog, resync_every=64)
+
+        for exhaustive, gray in zip(exhaustive_all, gray_all):
+            assert abs(gray['damage'] - exhaustive['damage']) < 1e-9 * exhaustive['damage']
+            assert gray['evaluated'] == exhaustive['evaluated']
+            assert gray['max_drift'] < 1e-9
+
+
+def test_top_k_heap():
+    """TopK 只保留最高的 K 个，并列时先加入的优先"""
+    top = TopK(3)
+    for damage, item in [(5, 'a'), (7, 'b'), (5, 'c'), (9, 'd'), (5, 'e'), (1, 'f')]:
+        top.push(damage, item)
+    assert top.items() == [(9, 'd'), (7, 'b'), (5, 'a')]
+    assert top.threshold() == 5
+
+
+def all_layout_damages(character, catalog, layouts):
+    """完整枚举给定布局下全部不重复搭配的伤害，从高到低排列"""
+    base_stats = calculate_stats(character, [])
+    all_damages = []
+    for layout in layouts:
+        damages, _, _ = engine.evaluate_layout(character, base_stats, layout.groups(catalog), 'multiset')
+        all_damages.extend(damages.tolist())
+    return sorted(all_damages, reverse=True)
+
+
+def test_top_combinations_match_full_ranking():
+    """前 K 名应与全部布局完整枚举排序后的前 K 名一致，生成器按伤害从高到低产出"""
+    character = make_character()
+    all_layouts = generate_layouts(EQUIPMENT_COSTS)
+    for catalog in (EQUIPMENT_TYPES, make_large_catalog()):
+        all_damages = all_layout_damages(character, catalog, all_layouts)
+
+        top = find_top_combinations(character, k=20, catalog=catalog)
+        assert len(top) == 20
+        for result, expected in zip(top, all_damages):
+            assert abs(result['damage'] - expected) < 1e-9 * expected
+
+        ranked = [result['damage'] for result in islice(iter_ranked_combinations(character, catalog=catalog), 50)]
+        assert all(a >= b * (1 - 1e-12) for a, b in zip(ranked, ranked[1:]))
+        for damage, expected in zip(ranked, all_damages):
+            assert abs(damage - expected) < 1e-9 * expected
+
+    # 默认装备目录上布局剪枝会改变前 K 名（只保证第一名），上面的比较必须针对全部布局
+    pruned = all_layout_damages(character, EQUIPMENT_TYPES,
+                                get_layouts(EQUIPMENT_TYPES, EQUIPMENT_COSTS, character.base_type))
+    all_damages = all_layout_damages(character, EQUIPMENT_TYPES, all_layouts)
+    assert pruned[0] == all_damages[0] and pruned[:20] != all_damages[:20]
+
+    catalog = make_large_catalog()
+    _, all_results = find_best_combination(character, verbose=True, enumeration='multiset', catalog=catalog,
+                                           layouts=all_layouts)
+    per_layout = find_top_combinations(character, k=2, per_layout=True, catalog=catalog)
+    assert len(per_layout) == 2 * len(all_results)
+    for best, result in zip(all_results, per_layout[::2]):
+        assert result['combination'] == best['combination']
+        assert abs(result['damage'] - best['damage']) < 1e-9 * best['damage']
+
+
+def test_pareto_front():
+    """在线前沿应与两两比较得到的非支配集一致"""
+    rng = np.random.default_rng(0)
+    points = rng.integers(0, 6, size=(200, 3)).astype(float)
+    expected = [i for i in range(len(points))
+                if not any((points[j] >= points[i]).all() and ((points[j] > points[i]).any() or j < i)
+                           for j in range(len(points)) if j != i)]
+    assert np.flatnonzero(pareto_mask(points)).tolist() == expected
+
+    front = ParetoFront(3)
+    for i, point in enumerate(points):
+        front.push(point, i)
+    assert sorted(item for _, item in front.items()) == expected
+
+
+def test_pareto_combinations():
+    """前沿的第一个方案就是最优伤害方案，前沿中没有被支配的方案"""
+    character = make_character()
+    catalog = make_large_catalog()
+    best = find_best_combination(character, enumeration='multiset', catalog=catalog)
+    front = find_pareto_combinations(character, metrics=['crit_rate', 'non_crit_damage'], catalog=catalog)
+
+    assert abs(front[0]['damage'] - best['damage']) < 1e-9 * best['damage']
+    points = np.array([list(result['metrics'].values()) for result in front])
+    assert pareto_mask(points).all()
+    assert max(result['metrics']['crit_rate'] for result in front) >= best['stats'].crit_rate
+
+
+def test_constraints():
+    """各搜索方法在约束下结果一致，且与穷举后过滤的结果相同"""
+    character = make_character()
+    catalog = make_large_catalog()
+    for constraints in ({'crit_rate': {'min': 0.4}},
+                        {'crit_rate': {'max': 0.3}, 'final_attack': {'min': 3500}},
+                        {'flat_hp': {'min': 4000}}):
+        # 穷举全部搭配后过滤
+        base_stats = calculate_stats(character, [])
+        parsed = engine.parse_constraints(character, constraints)
+        expected = 0.0
+        for layout in generate_layouts(EQUIPMENT_COSTS):
+            totals, _, _ = engine.layout_totals(base_stats, layout.groups(catalog), 'multiset')
+            damages = engine.score_totals(character, base_stats.base_value, totals)
+            mask = engine.feasible_mask(character, base_stats.base_value, totals, parsed)
+            if mask.any():
+                expected = max(expected, damages[mask].max())
+
+        for options in ({'enumeration': 'multiset'}, {'method': 'branch_and_bound'},
+                        {'vectorized': False, 'enumeration': 'multiset'}):
+            best = find_best_combination(character, catalog=catalog, constraints=constraints, **options)
+            assert abs(best['damage'] - expected) < 1e-9 * expected
+            for name, bounds in constraints.items():
+                value = engine.metric_value(character, best['stats'].base_value,
+                                            engine.stats_to_vector(best['stats']).tolist(),
+                                            engine.resolve_metric(character, name))
+                assert bounds.get('min', -np.inf) <= value <= bounds.get('max', np.inf)
+
+    # 约束写在角色上时默认生效，分支定界会剪掉不可行分支
+    constrained = make_character()
+    constrained.constraints = {'crit_rate': {'min': 0.4}}
+    _, free_all = find_best_combination(make_character(), verbose=True, method='branch_and_bound', catalog=catalog)
+    best, constrained_all = find_best_combination(constrained, verbose=True, method='branch_and_bound', catalog=catalog)
+    assert best['stats'].crit_rate >= 0.4
+    assert sum(r['evaluated'] for r in constrained_all) < sum(r['evaluated'] for r in free_all)
+
+
+def test_constrained_rankings():
+    """前 K 名、排名生成器和帕累托前沿默认也只在满足角色约束的搭配中选择"""
+    character = make_character()
+    character.constraints = {'crit_rate': {'min': 0.4}}
+    catalog = make_large_catalog()
+    base_stats = calculate_stats(character, [])
+    parsed = engine.parse_constraints(character, character.constraints)
+    feasible = []
+    for layout in generate_layouts(EQUIPMENT_COSTS):
+        totals, _, _ = engine.layout_totals(base_stats, layout.groups(catalog), 'multiset')
+        damages = engine.score_totals(character, base_stats.base_value, totals)
+        feasible.extend(damages[engine.feasible_mask(character, base_stats.base_value, totals, parsed)].tolist())
+    feasible.sort(reverse=True)
+    assert feasible[0] < all_layout_damages(character, catalog, generate_layouts(EQUIPMENT_COSTS))[0]
+
+    top = find_top_combinations(character, k=20, catalog=catalog)
+    ranked = list(islice(iter_ranked_combinations(character, catalog=catalog), 20))
+    for results in (top, ranked):
+        assert len(results) == 20
+        assert all(result['stats'].crit_rate >= 0.4 for result in results)
+        for result, expected in zip(results, feasible):
+            assert abs(result['damage'] - expected) < 1e-9 * expected
+
+    front = find_pareto_combinations(character, metrics=['final_value'], catalog=catalog)
+    assert all(result['stats'].crit_rate >= 0.4 for result in front)
+    assert abs(front[0]['damage'] - feasible[0]) < 1e-9 * feasible[0]
+
+    # 显式传入的约束代替角色上的约束
+    assert find_top_combinations(character, k=1, catalog=catalog, constraints={})[0]['stats'].crit_rate < 0.4
+
+
+def test_crit_overflow_flagged():
+    """暴击率超过 100% 的方案应标记浪费的部分，无法满足的约束返回 None"""
+    character = make_character()
+    character.base_crit_rate = 0.95
+    catalog = {
+        '4': [Equipment('4', '暴击', 0.22, '固定攻击', 1500)],
+        '3': [Equipment('3', '攻击%', 0.30, '固定攻击', 100)],
+        '1': [Equipment('1', '攻击%', 0.18, '固定生命', 2280)],
+    }
+    best = find_best_combination(character, catalog=catalog)
+    assert abs(best['crit_overflow'] - (best['stats'].crit_rate - 1.0)) < 1e-12
+    assert best['crit_overflow'] > 0
+
+    assert find_best_combination(make_character(), constraints={'crit_rate': {'min': 0.9}}) is None
+
+if __name__ == '__main__':
+    test_branch_and_bound_matches_exhaustive()
+    test_branch_and_bound_prunes()
+    test_gray_code_steps()
+    test_gray_code_matches_exhaustive()
+    test_top_k_heap()
+    test_top_combinations_match_full_ranking()
+    test_pareto_front()
+    test_pareto_combinations()
+    test_constraints()
+    test_constrained_rankings()
+    test_crit_overflow_flagged()
+    print("搜索模式测试通过")
@@ -0,0 +1,150 @@
+"""
+测试本地计算服务 - 并发请求合并、LRU、HTTP 接口
+"""
+
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import service
+from main import calculate_next_affix_gain, find_best_combination, load_character
+from service import CalculatorService, LRUCache
+
+
+def test_coalescing_and_cache():
+    """相同的并发请求只计算一次；算完后命中 LRU；出错时不缓存"""
+    calls = []
+    lock = threading.Lock()
+
+    def slow(payload):
+        with lock:
+            calls.append(payload)
+        time.sleep(0.1)
+        if payload.get('fail'):
+            raise ValueError("计算失败")
+        return {'value': payload['x'] * 2}
+
+    async def run():
+        service_ = CalculatorService(jobs=2, executor=ThreadPoolExecutor(2))
+        results = await asyncio.gather(*(service_.call('/optimize', {'x': 1}) for _ in range(5)),
+                                       service_.call('/optimize', {'x': 2}))
+        assert results == [{'value': 2}] * 5 + [{'value': 4}]
+        assert len(calls) == 2
+        assert service_.counters['coalesced'] == 4
+
+        assert await service_.call('/optimize', {'x': 1}) == {'value': 2}
+        assert len(calls) == 2 and service_.counters['cache_hits'] == 1
+
+        outcomes = await asyncio.gather(*(service_.call('/optimize', {'x': 3, 'fail': True}) for _ in range(3)),
+                                        return_exceptions=True)
+        assert all(isinstance(e, ValueError) for e in outcomes)
+        assert len(calls) == 3 and len(service_.cache) == 2
+
+    with mock.patch.dict(service.HANDLERS, {'/optimize': slow}):
+        asyncio.run(run())
+
+
+def test_lru():
+    """超出条数时淘汰最久未使用的结果"""
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None and cache.get('a') == 1 and cache.get('c') == 3
+
+
+def test_close_cancels_pending():
+    """关闭服务时排队中的计算被取消，正在进行的计算正常完成"""
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking(payload):
+        started.set()
+        release.wait(5)
+        return payload
+
+    async def run():
+        service_ = CalculatorService(jobs=1)
+        service_._executor = ThreadPoolExecutor(1)  # 代替进程池，仍视为服务自己创建的
+        running = asyncio.ensure_future(service_.call('/optimize', {'x': 1}))
+        queued = asyncio.ensure_future(service_.call('/optimize', {'x': 2}))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        assert len(service_._pending) == 2
+
+        # close 先取消排队的计算，再等正在进行的计算结束（稍后放行）
+        threading.Timer(0.1, release.set).start()
+        service_.close()
+        assert await running == {'x': 1}
+        results = await asyncio.gather(queued, return_exceptions=True)
+        assert isinstance(results[0], asyncio.CancelledError)
+        assert not service_._pending
+
+    with mock.patch.dict(service.HANDLERS, {'/optimize': blocking}):
+        asyncio.run(run())
+
+
+async def http_request(port, method, path, payload=None):
+    """发送一个 HTTP 请求，返回 (状态码, 响应内容)"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n"
+                 f"Connection: close\r\n\r\n".encode('latin-1') + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(content)
+
+
+def test_http_endpoints():
+    """HTTP 接口的结果与直接调用一致，错误请求返回 400/404"""
+    async def run():
+        service_ = CalculatorService(jobs=1)
+        server = await service_.start('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            status, names = await http_request(port, 'GET', '/characters')
+            assert status == 200
+            name = names['characters'][0]
+            character = load_character(name)
+
+            status, result = await http_request(port, 'POST', '/optimize', {'character': name, 'verbose': True})
+            expected, all_results = find_best_combination(character, verbose=True)
+            assert status == 200
+            assert result['best']['damage'] == expected['damage']
+            assert len(result['layouts']) == len(all_results)
+
+            avg = {'crit_rate': 0.08, 'crit_dmg': 0.16}
+            status, result = await http_request(port, 'POST', '/affix_gain',
+                                                {'character': name, 'affix_avg_values': avg})
+            assert status == 200
+            assert result['gains'] == calculate_next_affix_gain(character, expected['stats'], avg)
+
+            status, result = await http_request(port, 'POST', '/character', {'character': name})
+            assert status == 200 and result['character']['base_value'] == character.base_value
+
+            assert (await http_request(port, 'POST', '/optimize', {'character': '不存在的角色'}))[0] == 400
+            assert (await http_request(port, 'POST', '/optimize', {}))[0] == 400
+            assert (await http_request(port, 'GET', '/optimize'))[0] == 405
+            assert (await http_request(port, 'GET', '/unknown'))[0] == 404
+
+            status, health = await http_request(port, 'GET', '/health')
+            assert status == 200 and health['computed'] >= 3
+        finally:
+            server.close()
+            await server.wait_closed()
+            service_.close()
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    test_coalescing_and_cache()
+    test_lru()
+    test_close_cancels_pending()
+    test_http_endpoints()
+    print("计算服务测试通过")
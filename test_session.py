@@ -0,0 +1,120 @@
+"""
+测试优化会话 - 增量修改后的结果与重新搜索一致，且不重新编译
+"""
+
+from dataclasses import replace
+
+import pytest
+
+from conftest import make_character
+import engine
+from layouts import generate_layouts
+from main import (EQUIPMENT_COSTS, EQUIPMENT_TYPES, Hit, apply_affix_stats, calculate_stats,
+                  find_best_combination)
+from session import OptimizerSession
+
+
+AFFIX_STATS = {
+    'crit_rate': {'count': 4, 'avg': 0.08, 'total': 0.32},
+    'flat_atk': {'count': 2, 'avg': 50, 'total': 100},
+}
+
+
+def assert_same_best(actual, expected):
+    assert actual['combination'] == expected['combination']
+    assert actual['equipments'] == expected['equipments']
+    assert actual['damage'] == pytest.approx(expected['damage'], rel=1e-9)
+
+
+def test_incremental_updates():
+    """修改数值、词条统计和增益后的最优方案与重新搜索一致，只编译一次"""
+    character = make_character()
+    session = OptimizerSession(character)
+    assert_same_best(session.best(), find_best_combination(character))
+
+    session.update(base_value=2300, base_crit_dmg=1.8)
+    character = replace(character, base_value=2300, base_crit_dmg=1.8)
+    assert_same_best(session.best(), find_best_combination(character))
+
+    session.set_affix_stats(AFFIX_STATS)
+    assert calculate_stats(session.character, []).flat_attack == 100  # 固定值词条参与计算
+    assert_same_best(session.best(), find_best_combination(apply_affix_stats(character, AFFIX_STATS)))
+    without_flat = find_best_combination(apply_affix_stats(character, {'crit_rate': AFFIX_STATS['crit_rate']}))
+    assert session.best()['damage'] > without_flat['damage']
+
+    session.update_affix('crit_rate', count=6)
+    assert session.affix_stats['crit_rate']['total'] == pytest.approx(0.48)
+
+    # 增益加到每段伤害上，等价于带有该加成的单段技能循环
+    session.set_affix_stats({})
+    session.add_buff('协奏', dmg_bonus=0.2, crit_rate=0.1)
+    buffed = replace(character, rotation=[Hit(character.name, character.skill_multiplier,
+                                              dmg_bonus=0.2, crit_rate=0.1)])
+    assert_same_best(session.best(), find_best_combination(buffed))
+    session.remove_buff('协奏')
+    assert_same_best(session.best(), find_best_combination(character))
+
+    best, all_results = session.best(verbose=True)
+    assert len(all_results) == len(find_best_combination(character, verbose=True)[1])
+    assert session.compilations == 1
+
+    # 修改角色类型需要重新编译
+    session.update(base_type='hp', base_value=15000)
+    assert session.compilations == 2
+    assert_same_best(session.best(), find_best_combination(replace(character, base_type='hp', base_value=15000)))
+
+    with pytest.raises(ValueError):
+        session.update(unknown=1)
+    with pytest.raises(ValueError):
+        session.add_buff('错误', speed=1)
+
+
+def test_initial_affix_stats():
+    """传入带词条统计的角色时，词条统计作为会话的初始状态，可以单独替换"""
+    base = make_character()
+    session = OptimizerSession(apply_affix_stats(base, AFFIX_STATS))
+    assert session.affix_stats == AFFIX_STATS
+    assert session.character.base_crit_rate == pytest.approx(base.base_crit_rate + 0.32)
+    assert_same_best(session.best(), find_best_combination(apply_affix_stats(base, AFFIX_STATS)))
+
+    session.set_affix_stats({})
+    assert session.character.base_crit_rate == pytest.approx(base.base_crit_rate)
+
+
+def test_what_if_and_top():
+    """what_if 不改变会话状态；top 与全部布局的完整排序一致"""
+    character = make_character()
+    session = OptimizerSession(character)
+    changed = session.what_if(base_crit_rate=0.4, buffs={'增益': {'percent': 0.2}})
+    expected = find_best_combination(replace(character, base_crit_rate=0.4, rotation=[
+        Hit(character.name, character.skill_multiplier, percent=0.2)]))
+    assert_same_best(changed, expected)
+    assert session.character.base_crit_rate == character.base_crit_rate and not session.buffs
+    with pytest.raises(ValueError):
+        session.what_if(base_type='hp')
+
+    assert session.compilations == 1
+
+    # top 在全部布局上排序：与完整枚举所有布局后的前 K 名一致（剪枝后的默认布局会漏掉其中的搭配）
+    base_stats = calculate_stats(character, [])
+    all_damages = []
+    for layout in generate_layouts(EQUIPMENT_COSTS):
+        damages, _, _ = engine.evaluate_layout(character, base_stats, layout.groups(EQUIPMENT_TYPES), 'multiset')
+        all_damages.extend(damages.tolist())
+    all_damages.sort(reverse=True)
+    top = session.top(20)
+    assert [r['damage'] for r in top] == pytest.approx(all_damages[:20], rel=1e-9)
+    assert top[0]['equipments'] == session.best()['equipments']
+
+    # 全部布局只编译一次，修改数值后直接重新排序
+    session.update(base_crit_rate=0.3)
+    top = session.top(20)
+    assert top[0]['damage'] == pytest.approx(session.best()['damage'], rel=1e-9)
+    assert session.compilations == 2
+
+
+if __name__ == '__main__':
+    test_incremental_updates()
+    test_initial_affix_stats()
+    test_what_if_and_top()
+    print("优化会话测试通过")
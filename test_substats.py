@@ -0,0 +1,85 @@
+"""
+测试副词条分配优化 - 与暴力枚举对比
+"""
+
+from itertools import product
+
+import pytest
+
+from conftest import make_character, make_hp_character
+from main import apply_affix_stats, calculate_stats, calculate_damage, find_best_combination
+from montecarlo import simulate_upgrades
+from substats import affix_keys, counts_to_affix_stats, optimize_allocation, optimize_loadout_and_allocation
+
+AFFIX_AVG_VALUES = {"crit_rate": 0.081, "crit_dmg": 0.162, "percent": 0.094,
+                    "dmg_bonus": 0.094, "flat_hp": 470, "flat_atk": 50}
+
+
+def make_characters():
+    """构造攻击型和生命型测试角色"""
+    return [make_character(), make_hp_character(base_crit_rate=0.6, base_dmg_bonus=0.1)]
+
+
+def brute_force(character, equipments, total_rolls, max_count):
+    """枚举所有不超过总条数的分配"""
+    best = 0
+    for counts in product(range(max_count + 1), repeat=5):
+        if sum(counts) > total_rolls:
+            continue
+        allocated = apply_affix_stats(character, counts_to_affix_stats(character, counts, AFFIX_AVG_VALUES))
+        best = max(best, calculate_damage(allocated, calculate_stats(allocated, equipments)))
+    return best
+
+
+def test_allocation_matches_brute_force():
+    """动态规划结果应与暴力枚举一致"""
+    for character in make_characters():
+        equipments = find_best_combination(character)['equipments']
+        for total_rolls, max_count in ((6, 6), (12, 5), (9, 2)):
+            max_counts = {key: max_count for key in affix_keys(character.base_type)}
+            result = optimize_allocation(character, total_rolls, AFFIX_AVG_VALUES, equipments, max_counts)
+            counts = [info['count'] for info in result['affix_stats'].values()]
+
+            assert sum(counts) <= total_rolls
+            assert max(counts) <= max_count
+            expected = brute_force(character, equipments, total_rolls, max_count)
+            assert abs(result['damage'] - expected) < 1e-9 * expected
+
+
+def test_joint_optimization():
+    """联合求解不应差于先选装备再分配词条"""
+    for character in make_characters():
+        equipments = find_best_combination(character)['equipments']
+        separate = optimize_allocation(character, 20, AFFIX_AVG_VALUES, equipments)
+        best, all_results = optimize_loadout_and_allocation(character, 20, AFFIX_AVG_VALUES, verbose=True)
+
+        assert best['damage'] >= separate['damage'] * (1 - 1e-12)
+        assert best['damage'] == max(result['damage'] for result in all_results)
+        assert sum(info['count'] for info in best['affix_stats'].values()) <= 20
+
+
+def test_monte_carlo_reproducible():
+    """相同种子和分片数的结果应与进程数无关；不强化时分布退化为当前伤害"""
+    character = make_characters()[0]
+    serial = simulate_upgrades(character, 10, samples=20000, seed=7, shards=4)
+    parallel = simulate_upgrades(character, 10, samples=20000, seed=7, shards=4, jobs=2)
+    assert serial == parallel
+    assert serial != simulate_upgrades(character, 10, samples=20000, seed=8, shards=4)
+
+    percentiles = serial['percentiles']
+    assert percentiles[5] <= percentiles[50] <= percentiles[95]
+    assert serial['mean'] > serial['baseline']
+
+    unchanged = simulate_upgrades(character, 0, samples=1000)
+    assert unchanged['std'] == 0
+    assert all(abs(v - unchanged['baseline']) < 1e-9 for v in unchanged['percentiles'].values())
+
+    with pytest.raises(ValueError):
+        simulate_upgrades(character, 10, samples=0)
+
+
+if __name__ == '__main__':
+    test_allocation_matches_brute_force()
+    test_joint_optimization()
+    test_monte_carlo_reproducible()
+    print("副词条分配测试通过")
@@ -0,0 +1,115 @@
+"""
+测试增益时间轴 - 事件顺序、增益刷新、快照复用，以及作为技能循环参与搜索
+"""
+
+from dataclasses import replace
+
+import pytest
+
+from main import Hit, character_from_dict, character_rotation, calculate_stats, calculate_damage, find_best_combination
+from timeline import Buff, Skill, simulate
+
+TIMELINE = {
+    'duration': 25,
+    'buffs': [
+        {'name': '协奏', 'duration': 10, 'dmg_bonus': 0.2, 'windows': [0, 15]},
+        {'name': '爆发', 'duration': 5, 'crit_rate': 0.2},
+    ],
+    'skills': [
+        {'name': '普攻', 'multiplier': 0.5, 'cooldown': 1},
+        {'name': '大招', 'multiplier': 3.0, 'cooldown': 20, 'first_cast': 2, 'applies': ['爆发']},
+    ],
+}
+
+
+def test_simulate_counts():
+    """逐秒核对各增益状态下的命中次数和增益覆盖率"""
+    skills = [Skill(**data) for data in TIMELINE['skills']]
+    buffs = [Buff(**data) for data in TIMELINE['buffs']]
+    result = simulate(skills, buffs, TIMELINE['duration'])
+
+    hits = {hit['name']: hit['count'] for hit in result.rotation}
+    # 协奏 [0,10) [15,25)；爆发由 2 秒和 22 秒的大招触发，[2,7) [22,27)，
+    # 同一时刻普攻排在大招之前，2 秒和 22 秒的普攻不受爆发影响
+    assert hits == {'普攻（协奏）': 14, '大招（协奏）': 2, '普攻（协奏+爆发）': 6, '普攻': 5}
+    assert result.casts == 27
+    assert result.snapshots == 3
+    assert abs(result.uptime['协奏'] - 0.8) < 1e-12
+    assert abs(result.uptime['爆发'] - 8 / 25) < 1e-12
+
+
+def test_buff_refresh():
+    """增益生效期间再次触发只刷新持续时间，结束时刻以最后一次为准"""
+    skills = [Skill('普攻', 1.0, cooldown=1), Skill('触发', 0.0, cooldown=3, applies=['增益'])]
+    result = simulate(skills, [Buff('增益', 4, dmg_bonus=0.5)], 12)
+
+    hits = {hit['name']: hit['count'] for hit in result.rotation}
+    # 0 秒触发后每 3 秒刷新一次，增益一直持续到结束；同一时刻按列表顺序释放，0 秒的普攻在触发之前
+    assert hits['普攻（增益）'] == 11
+    assert hits['普攻'] == 1
+    assert abs(result.uptime['增益'] - 1.0) < 1e-12
+
+
+def test_duplicate_skill_names():
+    """同名技能（如不同形态的同名招式）各自按自己的倍率和加成计算，不合并"""
+    skills = [Skill('斩击', 1.0, cooldown=2), Skill('斩击', 3.0, cooldown=5, dmg_bonus=0.2)]
+    result = simulate(skills, [], 10)
+
+    hits = sorted((hit['multiplier'], hit['count'], hit.get('dmg_bonus', 0.0)) for hit in result.rotation)
+    assert hits == [(1.0, 5, 0.0), (3.0, 2, 0.2)]
+    assert all(hit['name'] == '斩击' for hit in result.rotation)
+
+
+def test_timeline_character():
+    """配置了时间轴的角色按各增益快照分段计算伤害"""
+    char_data = {
+        'base_type': 'attack', 'base_value': 2000, 'base_crit_rate': 0.05,
+        'base_crit_dmg': 1.5, 'base_dmg_bonus': 0.0, 'timeline': TIMELINE,
+    }
+    character = character_from_dict('时间轴角色', char_data)
+    # 图形界面用 character_rotation 取技能循环；同时写了 rotation 时无法确定以哪个为准，报错
+    assert character_rotation(char_data) == character.rotation
+    with pytest.raises(ValueError):
+        character_from_dict('时间轴角色', {**char_data, 'rotation': [{'multiplier': 2.5}]})
+    best = find_best_combination(character)
+    bnb_best = find_best_combination(character, method='branch_and_bound')
+    assert abs(bnb_best['damage'] - best['damage']) < 1e-9 * best['damage']
+
+    expected = 0.0
+    for hit in character.rotation:
+        single = replace(character, rotation=[Hit(hit.name, hit.multiplier, hit.count)],
+                         base_dmg_bonus=character.base_dmg_bonus + hit.dmg_bonus,
+                         base_crit_rate=character.base_crit_rate + hit.crit_rate)
+        expected += calculate_damage(single, calculate_stats(single, best['equipments']))
+    assert abs(best['damage'] - expected) < 1e-9 * expected
+
+    # 时间轴没有产生任何伤害段时报错，而不是按默认技能倍率给出看似合理的结果
+    empty = {**char_data, 'timeline': {**TIMELINE, 'skills': []}}
+    with pytest.raises(ValueError):
+        character_from_dict('时间轴角色', empty)
+
+
+def test_malformed_entries():
+    """技能循环或时间轴某一项缺少字段、带有未知字段时抛出 ValueError（而不是 TypeError），并指出是哪一项"""
+    char_data = {'base_type': 'attack', 'base_value': 2000, 'base_crit_rate': 0.05,
+                 'base_crit_dmg': 1.5, 'base_dmg_bonus': 0.0}
+    with pytest.raises(ValueError, match="第2段"):
+        character_rotation({**char_data, 'rotation': [{'multiplier': 2.5}, {'multiplier': 1.0, 'speed': 2}]})
+    with pytest.raises(ValueError, match="第1段"):
+        character_from_dict('测试角色', {**char_data, 'rotation': [{'count': 2}]})
+
+    bad_skill = {**TIMELINE, 'skills': TIMELINE['skills'] + [{'name': '缺少倍率'}]}
+    with pytest.raises(ValueError, match="第3个技能"):
+        character_rotation({**char_data, 'timeline': bad_skill})
+    bad_buff = {**TIMELINE, 'buffs': [{'name': '协奏', 'duration': 10, 'atk': 0.2}]}
+    with pytest.raises(ValueError, match="第1个增益"):
+        character_rotation({**char_data, 'timeline': bad_buff})
+
+
+if __name__ == '__main__':
+    test_simulate_counts()
+    test_buff_refresh()
+    test_duplicate_skill_names()
+    test_timeline_character()
+    test_malformed_entries()
+    print("时间轴测试通过")
@@ -0,0 +1,110 @@
+"""
+测试后台计算 - 进度回调、取消、丢弃过时结果
+"""
+
+import threading
+import time
+
+from conftest import make_character
+import worker
+from main import SearchCancelled, find_best_combination
+from worker import Worker
+
+
+def collect(w, timeout=10.0):
+    """轮询直到任务结束，返回全部事件"""
+    events = []
+    deadline = time.time() + timeout
+    while w.active and time.time() < deadline:
+        events.extend(w.poll())
+        time.sleep(0.01)
+    return events
+
+
+def test_progress_callback():
+    """find_best_combination 每算完一个布局报告一次进度，回调抛出 SearchCancelled 时中止"""
+    calls = []
+    best = find_best_combination(make_character(), progress=lambda done, total: calls.append((done, total)))
+    total = calls[0][1]
+    assert calls == [(done, total) for done in range(total + 1)]
+    assert best == find_best_combination(make_character())
+
+    def stop_after_first(done, total):
+        if done == 1:
+            raise SearchCancelled()
+    try:
+        find_best_combination(make_character(), progress=stop_after_first)
+    except SearchCancelled:
+        pass
+    else:
+        assert False, "应当中止搜索"
+
+
+def test_worker_result():
+    """后台计算的结果与直接计算一致，进度按顺序到达"""
+    w = Worker()
+    w.submit(find_best_combination, make_character(), verbose=True)
+    events = collect(w)
+    progress = [event[1:] for event in events if event[0] == worker.PROGRESS]
+    assert progress == sorted(progress) and progress[-1][0] == progress[-1][1]
+    assert events[-1][0] == worker.DONE
+    best, _ = events[-1][1]
+    assert best['damage'] == find_best_combination(make_character())['damage']
+
+
+def test_cancel_and_stale_results():
+    """取消后计算在下一次进度回调时中止；新任务提交后旧任务的事件全部丢弃"""
+    started = threading.Event()
+    stopped = []
+
+    def slow(progress=None):
+        try:
+            for step in range(1000):
+                progress(step, 1000)
+                started.set()
+                time.sleep(0.005)
+        except SearchCancelled:
+            stopped.append(step)
+            raise
+        return 'slow'
+
+    w = Worker()
+    w.submit(slow)
+    started.wait(5)
+    w.cancel()
+    w.wait(5)
+    assert stopped and stopped[0] < 999
+    assert not w.active
+    assert all(event[0] == worker.CANCELLED for event in w.poll())
+
+    # 旧任务还在运行时提交新任务：只会收到新任务的结果
+    started.clear()
+    stopped.clear()
+    w.submit(slow)
+    started.wait(5)
+    w.submit(lambda progress=None: 'fast')
+    events = collect(w)
+    assert events == [(worker.DONE, 'fast')]
+    deadline = time.time() + 5
+    while not stopped and time.time() < deadline:
+        time.sleep(0.01)
+    assert stopped
+
+
+def test_worker_error():
+    """计算中抛出的异常交回主线程"""
+    def fail(progress=None):
+        raise ValueError("错误")
+
+    w = Worker()
+    w.submit(fail)
+    events = collect(w)
+    assert events[-1][0] == worker.ERROR and isinstance(events[-1][1], ValueError)
+
+
+if __name__ == '__main__':
+    test_progress_callback()
+    test_worker_result()
+    test_cancel_and_stale_results()
+    test_worker_error()
+    print("后台计算测试通过")
@@ -0,0 +1,209 @@
+"""
+增益时间轴模拟
+
+把限时增益（buff）、技能释放和冷却放在一条按时间排序的事件队列（最小堆）上，
+只在事件发生的时刻推进时间，不按固定步长逐帧模拟。每次技能释放按当时生效的增益
+快照计算，快照按"当前生效的增益集合"缓存，增益状态不变时直接复用。
+
+增益只改变各段伤害的额外加成，不依赖装备，因此时间轴对每个角色只需模拟一次：
+模拟结果汇总为技能循环（每个 (技能, 增益快照) 一段），再交给 engine 在搜索中
+对所有搭配一次数组运算算出总伤害。
+
+同一时刻的事件按 增益结束 → 增益开始 → 技能释放 的顺序处理，即增益在 [开始, 结束)
+区间内生效；同一时刻的技能按列表顺序释放，技能触发的增益从下一次伤害开始生效。
+重复触发已生效的增益只刷新持续时间，不叠层。
+"""
+
+import heapq
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Dict, List, Sequence, Tuple
+
+
+# 增益可以提供的加成（与 main.Hit 的额外加成字段一致）
+MODIFIER_FIELDS = ('percent', 'flat', 'dmg_bonus', 'crit_rate', 'crit_dmg')
+
+# 同一时刻事件的处理顺序
+_BUFF_END = 0
+_BUFF_START = 1
+_CAST = 2
+
+
+@dataclass
+class Buff:
+    """限时增益"""
+    name: str
+    duration: float  # 持续时间（秒）
+    percent: float = 0.0  # 攻击%/生命%
+    flat: float = 0.0  # 固定攻击/固定生命
+    dmg_bonus: float = 0.0  # 伤害加成
+    crit_rate: float = 0.0  # 暴击率
+    crit_dmg: float = 0.0  # 暴击伤害
+    windows: List[float] = field(default_factory=list)  # 固定的生效时刻（如队友释放技能的时间）
+
+
+@dataclass
+class Skill:
+    """按冷却循环释放的技能"""
+    name: str
+    multiplier: float  # 每次命中的技能倍率
+    cooldown: float = 0.0  # 冷却时间（秒），0 表示只释放一次
+    first_cast: float = 0.0  # 第一次释放的时刻
+    hits: int = 1  # 每次释放的命中次数
+    applies: List[str] = field(default_factory=list)  # 释放后触发的增益名称
+    percent: float = 0.0  # 技能自身的额外加成（各字段含义同 Buff）
+    flat: float = 0.0
+    dmg_bonus: float = 0.0
+    crit_rate: float = 0.0
+    crit_dmg: float = 0.0
+
+
+@dataclass
+class TimelineResult:
+    """时间轴模拟结果"""
+    rotation: List[dict]  # 技能循环，格式同 characters.yml 中的 rotation
+    casts: int = 0  # 技能释放次数
+    events: int = 0  # 处理的事件数
+    snapshots: int = 0  # 计算过的增益快照数（其余均为复用）
+    uptime: Dict[str, float] = field(default_factory=dict)  # 各增益的生效时长占比
+
+
+def simulate(skills: Sequence[Skill], buffs: Sequence[Buff], duration: float) -> TimelineResult:
+    """
+    模拟 [0, duration) 内的技能释放和增益变化
+
+    Args:
+        skills: 技能列表
+        buffs: 增益列表
+        duration: 模拟时长（秒）
+
+    Returns:
+        TimelineResult，其中 rotation 的每一段为某个技能在某个增益快照下的全部命中
+    """
+    buff_by_name = {buff.name: buff for buff in buffs}
+    for skill in skills:
+        for name in skill.applies:
+            if name not in buff_by_name:
+                raise ValueError(f"技能 {skill.name} 触发了未定义的增益: {name}")
+
+    # 队列元素：(时刻, 事件类型, 同一时刻的先后顺序, 数据)；技能按列表中的下标排序
+    queue = []
+    order = count()
+    for buff in buffs:
+        for start in buff.windows:
+            heapq.heappush(queue, (start, _BUFF_START, next(order), buff.name))
+    for index, skill in enumerate(skills):
+        heapq.heappush(queue, (skill.first_cast, _CAST, index, skill))
+
+    expires = {}  # 生效中的增益 -> 到期时刻
+    active_since = {}  # 生效中的增益 -> 本次生效的开始时刻
+    uptime = {buff.name: 0.0 for buff in buffs}
+    snapshots = {}  # 生效的增益集合 -> 加成元组
+    current = None  # 当前快照对应的增益集合（增益变化后置空，下次释放时再取）
+    segments = {}  # (技能下标, 增益集合) -> 命中次数（同名技能按下标区分，倍率和加成各自计算）
+    casts = 0
+    events = 0
+
+    def expire(name: str, time: float):
+        uptime[name] += min(time, duration) - active_since.pop(name)
+        del expires[name]
+
+    while queue:
+        time, kind, rank, payload = heapq.heappop(queue)
+        if time >= duration:
+            break
+        events += 1
+
+        if kind == _BUFF_END:
+            # 增益被刷新过时，旧的结束事件作废
+            if expires.get(payload) == time:
+                expire(payload, time)
+                current = None
+        elif kind == _BUFF_START:
+            if _start_buff(buff_by_name[payload], time, queue, order, expires, active_since):
+                current = None
+        else:
+            skill = payload
+            if current is None:
+                key = frozenset(expires)
+                if key not in snapshots:
+                    snapshots[key] = tuple(sum(getattr(buff_by_name[name], f) for name in key)
+                                           for f in MODIFIER_FIELDS)
+                current = key
+            segment = (rank, current)
+            segments[segment] = segments.get(segment, 0) + skill.hits
+            casts += 1
+
+            for name in skill.applies:
+                if _start_buff(buff_by_name[name], time, queue, order, expires, active_since):
+                    current = None
+            if skill.cooldown > 0:
+                heapq.heappush(queue, (time + skill.cooldown, _CAST, rank, skill))
+
+    for name in list(expires):
+        expire(name, duration)
+
+    rotation = []
+    for (index, key), hits in segments.items():
+        skill = skills[index]
+        label = f"{skill.name}（{'+'.join(sorted(key))}）" if key else skill.name
+        hit = {'name': label, 'multiplier': skill.multiplier, 'count': hits}
+        for f, value in zip(MODIFIER_FIELDS, snapshots[key]):
+            value += getattr(skill, f)
+            if value:
+                hit[f] = value
+        rotation.append(hit)
+
+    return TimelineResult(
+        rotation=rotation,
+        casts=casts,
+        events=events,
+        snapshots=len(snapshots),
+        uptime={name: total / duration for name, total in uptime.items()} if duration > 0 else uptime
+    )
+
+
+def _start_buff(buff: Buff, time: float, queue: list, order, expires: Dict[str, float],
+                active_since: Dict[str, float]) -> bool:
+    """开始（或刷新）增益，返回生效的增益集合是否发生了变化"""
+    newly_active = buff.name not in expires
+    if newly_active:
+        active_since[buff.name] = time
+    expires[buff.name] = time + buff.duration
+    heapq.heappush(queue, (time + buff.duration, _BUFF_END, next(order), buff.name))
+    return newly_active
+
+
+def from_config(timeline_data: dict) -> Tuple[List[Skill], List[Buff], float]:
+    """
+    由配置文件中的 timeline 项构造技能和增益
+
+    格式：
+        timeline:
+          duration: 25
+          buffs:
+            - {name: 协奏, duration: 10, dmg_bonus: 0.2, windows: [0]}
+          skills:
+            - {name: 普攻, multiplier: 0.5, cooldown: 1}
+            - {name: 大招, multiplier: 3.0, cooldown: 20, applies: [协奏]}
+
+    某个增益或技能缺少字段、带有未知字段时抛出 ValueError
+    """
+    buffs = [_from_entry(Buff, '增益', i, data) for i, data in enumerate(timeline_data.get('buffs') or [], 1)]
+    skills = [_from_entry(Skill, '技能', i, data) for i, data in enumerate(timeline_data.get('skills') or [], 1)]
+    if 'duration' not in timeline_data:
+        raise ValueError("时间轴缺少 duration")
+    return skills, buffs, float(timeline_data['duration'])
+
+
+def _from_entry(cls, kind: str, index: int, data: dict):
+    """由一项配置构造 Buff/Skill；缺少字段或带有未知字段时抛出 ValueError，指出是哪一项"""
+    try:
+        return cls(**data)
+    except TypeError as e:
+        raise ValueError(f"时间轴第{index}个{kind}格式错误: {data}（{e}）") from e
+
+
+def rotation_from_config(timeline_data: dict) -> List[dict]:
+    """模拟配置文件中的时间轴，返回技能循环（格式同 characters.yml 中的 rotation）"""
+    return simulate(*from_config(timeline_data)).rotation
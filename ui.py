@@ -3,10 +3,24 @@
 使用 tkinter 实现简单的 GUI
 """
 
+import json
+import threading
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 import yaml
-from main import Character, find_best_combination, calculate_stats, calculate_damage, calculate_next_affix_gain
+from dataclasses import asdict
+import config
+from main import Character, apply_affix_stats, calculate_stats, calculate_damage, calculate_next_affix_gain
+from main import character_rotation, rotation_multiplier, compile_loadouts, rescore_combinations
+from result_cache import cached_find_best_combination
+import worker
+
+
+# 轮询后台计算结果的间隔（毫秒）
+POLL_INTERVAL_MS = 50
+
+# 输入停止变化多久之后实时更新结果（毫秒）
+LIVE_UPDATE_DELAY_MS = 300
 
 
 class DamageCalculatorUI:
@@ -18,6 +32,17 @@ class DamageCalculatorUI:
         # 加载现有角色配置
         self.load_characters()
 
+        # 计算在后台线程中执行，界面通过定时轮询取回进度和结果
+        self.worker = worker.Worker()
+        self.polling = False  # 是否已安排了轮询
+
+        # 实时更新：编译好的搭配集合只在角色类型或约束变化时重建，其余修改直接在上面重新计算
+        self.live_job = None  # 等待执行的实时更新（root.after 的编号）
+        self.live_task = False  # 当前后台任务是否为实时更新
+        self.scorer = None
+        self.scorer_key = None
+        self.scorer_lock = threading.Lock()
+
         # 创建界面
         self.create_widgets()
 
@@ -61,9 +86,8 @@ class DamageCalculatorUI:
     def load_characters(self):
         """加载角色配置"""
         try:
-            with open('characters.yml', 'r', encoding='utf-8') as f:
-                data = yaml.safe_load(f)
-            self.characters = data['characters']
+            # 复制一份，保存角色时不会改动共享的配置缓存
+            self.characters = dict(config.load_characters())
         except FileNotFoundError:
             self.characters = {}
 
@@ -199,15 +223,33 @@ class DamageCalculatorUI:
 
         ttk.Button(button_frame, text="计算最优方案", command=self.calculate,
                   width=20).pack(side=tk.LEFT, padx=5)
+        self.cancel_button = ttk.Button(button_frame, text="取消计算", command=self.cancel_calculation,
+                                        width=12, state='disabled')
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="保存为新角色", command=self.save_character,
                   width=20).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="清空结果", command=self.clear_results,
                   width=20).pack(side=tk.LEFT, padx=5)
+        # 输入与之前某次计算完全相同时直接读取缓存的结果
+        self.use_cache_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(button_frame, text="使用缓存", variable=self.use_cache_var).pack(side=tk.LEFT, padx=5)
+        # 修改数值后自动在编译好的搭配上重新计算
+        self.live_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(button_frame, text="实时更新", variable=self.live_var).pack(side=tk.LEFT, padx=5)
+
+        # 计算进度
+        progress_frame = ttk.Frame(main_frame)
+        progress_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E))
+        progress_frame.columnconfigure(0, weight=1)
+        self.progress_bar = ttk.Progressbar(progress_frame, mode='determinate')
+        self.progress_bar.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        self.status_var = tk.StringVar()
+        ttk.Label(progress_frame, textvariable=self.status_var, width=30).grid(row=0, column=1, padx=(10, 0))
 
         # ===== 结果显示区 =====
         result_frame = ttk.LabelFrame(main_frame, text="计算结果", padding="10")
-        result_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0))
-        main_frame.rowconfigure(2, weight=1)
+        result_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0))
+        main_frame.rowconfigure(3, weight=1)
 
         self.result_text = scrolledtext.ScrolledText(result_frame, wrap=tk.WORD,
                                                      width=80, height=20, font=("Consolas", 9))
@@ -217,6 +259,15 @@ class DamageCalculatorUI:
         self.toggle_mode()
         self.on_character_selected(None)
 
+        # 计算过程中修改任何输入，都会取消这次计算（结果已经过时）
+        input_vars = [self.mode_var, self.character_var, self.name_var, self.type_var, self.base_value_var,
+                      self.base_mult_var, self.crit_rate_var, self.crit_dmg_var, self.dmg_bonus_var,
+                      self.skill_mult_var, self.use_cache_var]
+        for affix_vars in self.affix_vars.values():
+            input_vars.extend(affix_vars.values())
+        for var in input_vars:
+            var.trace_add('write', self.on_inputs_changed)
+
     def toggle_mode(self):
         """切换配置模式"""
         if self.mode_var.get() == "existing":
@@ -244,10 +295,12 @@ class DamageCalculatorUI:
             self.crit_rate_var.set(str(char_data.get('base_crit_rate', 0.05)))
             self.crit_dmg_var.set(str(char_data.get('base_crit_dmg', 1.50)))
             self.dmg_bonus_var.set(str(char_data.get('base_dmg_bonus', 0.0)))
-            self.skill_mult_var.set(str(char_data.get('skill_multiplier', 2.5)))
+            rotation = character_rotation(char_data)
+            default_skill_mult = rotation_multiplier(rotation) if rotation else 2.5
+            self.skill_mult_var.set(str(char_data.get('skill_multiplier', default_skill_mult)))
 
-    def get_affix_stats(self):
-        """从词条统计获取额外属性"""
+    def get_affix_stats(self, quiet=False):
+        """从词条统计获取额外属性（quiet=True 时格式错误不弹窗，用于实时更新时输入尚未完成的情况）"""
         try:
             affix_stats = {}
             for var_name, vars_dict in self.affix_vars.items():
@@ -260,11 +313,13 @@ class DamageCalculatorUI:
                 }
             return affix_stats
         except ValueError as e:
-            messagebox.showerror("输入错误", f"词条统计数据格式错误:\n{e}")
+            if not quiet:
+                messagebox.showerror("输入错误", f"词条统计数据格式错误:\n{e}")
             return None
 
-    def get_character(self):
+    def get_character(self, quiet=False):
         """从表单获取角色对象"""
+        char_data = self.characters.get(self.name_var.get(), {})
         try:
             character = Character(
                 name=self.name_var.get(),
@@ -274,37 +329,27 @@ class DamageCalculatorUI:
                 base_crit_rate=float(self.crit_rate_var.get()),
                 base_crit_dmg=float(self.crit_dmg_var.get()),
                 base_dmg_bonus=float(self.dmg_bonus_var.get()),
-                skill_multiplier=float(self.skill_mult_var.get())
+                skill_multiplier=float(self.skill_mult_var.get()),
+                # 属性约束、技能循环和时间轴暂不在界面中编辑，沿用配置文件中同名角色的设置
+                # （设置了技能循环或时间轴时按循环计算，与命令行一致，技能倍率输入框仅用于展示）
+                constraints=dict(char_data.get('constraints') or {}),
+                rotation=character_rotation(char_data)
             )
 
             # 获取词条统计并添加到角色属性
-            affix_stats = self.get_affix_stats()
+            affix_stats = self.get_affix_stats(quiet)
             if affix_stats is None:
                 return None
 
-            # 将词条属性加到基础属性上
-            character.base_crit_rate += affix_stats["crit_rate"]["total"]
-            character.base_crit_dmg += affix_stats["crit_dmg"]["total"]
-            character.base_dmg_bonus += affix_stats["dmg_bonus"]["total"]
-
-            # 根据角色类型,添加百分比和固定值
-            if character.base_type == 'attack':
-                character.base_multiplier += affix_stats["percent"]["total"]
-                # 固定攻击会在伤害计算时加上
-            else:  # hp
-                character.base_multiplier += affix_stats["percent"]["total"]
-                # 固定生命会在伤害计算时加上
-
-            # 保存词条统计到角色对象,用于后续展示
-            character.affix_stats = affix_stats
-
-            return character
+            # 将词条属性加到基础属性上（固定值会在伤害计算时加上）
+            return apply_affix_stats(character, affix_stats)
         except ValueError as e:
-            messagebox.showerror("输入错误", f"请检查输入的数值格式是否正确\n{e}")
+            if not quiet:
+                messagebox.showerror("输入错误", f"请检查输入的数值格式是否正确\n{e}")
             return None
 
     def calculate(self):
-        """执行计算"""
+        """在后台线程中执行计算"""
         character = self.get_character()
         if not character:
             return
@@ -314,20 +359,120 @@ class DamageCalculatorUI:
 
         # 显示计算中
         self.result_text.insert(tk.END, f"正在计算 {character.name} 的最优装备方案...\n\n")
-        self.root.update()
-
-        try:
-            # 计算
-            best_result, all_results = find_best_combination(character, verbose=True)
+        self.progress_bar['value'] = 0
+        self.status_var.set("计算中...")
+        self.cancel_button['state'] = 'normal'
+
+        self.live_task = False
+        self.worker.submit(self.compute, character, self.use_cache_var.get())
+        if not self.polling:
+            self.polling = True
+            self.root.after(POLL_INTERVAL_MS, self.poll_worker)
+
+    @staticmethod
+    def compute(character, use_cache, progress=None):
+        """
+        后台线程中执行的计算（不访问任何界面组件）
 
-            # 显示所有方案对比
-            self.display_all_combinations(character, all_results)
+        Returns:
+            (角色, 最优方案, 所有方案, 下一个词条收益)
+        """
+        best_result, all_results = cached_find_best_combination(character, use_cache=use_cache, verbose=True,
+                                                                progress=progress)
+        return DamageCalculatorUI.affix_gains(character, best_result, all_results)
+
+    @staticmethod
+    def affix_gains(character, best_result, all_results):
+        """在最优方案上计算下一个词条的收益，返回 (角色, 最优方案, 所有方案, 下一个词条收益)"""
+        gains = None
+        if best_result is not None and hasattr(character, 'affix_stats'):
+            affix_avg_values = {key: val['avg'] for key, val in character.affix_stats.items()}
+            gains = calculate_next_affix_gain(character, best_result['stats'], affix_avg_values)
+        return character, best_result, all_results, gains
+
+    def poll_worker(self):
+        """取回后台计算的进度和结果（在界面线程中执行）"""
+        for event in self.worker.poll():
+            if event[0] == worker.PROGRESS:
+                _, done, total = event
+                self.progress_bar['value'] = 100 * done / total if total else 100
+                self.status_var.set(f"计算中... {done}/{total} 个布局")
+            elif event[0] == worker.DONE:
+                self.progress_bar['value'] = 100
+                self.finish_calculation("已实时更新" if self.live_task else "计算完成")
+                character, best_result, all_results, gains = event[1]
+                self.result_text.delete(1.0, tk.END)
+                if best_result is None:
+                    self.result_text.insert(tk.END, "没有满足约束的装备方案\n")
+                else:
+                    # 显示所有方案对比
+                    self.display_all_combinations(character, all_results)
+                    # 显示最优方案详情
+                    self.display_result(character, best_result, gains)
+            elif event[0] == worker.ERROR:
+                if self.live_task:
+                    # 实时更新时输入可能还没改完，只在状态栏提示
+                    self.finish_calculation(f"实时更新失败: {event[1]}")
+                else:
+                    self.finish_calculation("计算出错")
+                    messagebox.showerror("计算错误", f"计算过程中发生错误:\n{event[1]}")
+        if self.worker.active:
+            self.root.after(POLL_INTERVAL_MS, self.poll_worker)
+        else:
+            self.polling = False
+
+    def finish_calculation(self, status):
+        """计算结束（完成、出错或取消）后恢复按钮和状态"""
+        self.cancel_button['state'] = 'disabled'
+        self.status_var.set(status)
+
+    def cancel_calculation(self, status="已取消"):
+        """取消正在进行的计算（被取消的是实时更新时保留上一次的结果，直到新结果出来，避免输入时结果闪烁）"""
+        if self.worker.active:
+            self.worker.cancel()
+            self.progress_bar['value'] = 0
+            if not self.live_task:
+                self.result_text.delete(1.0, tk.END)
+            self.finish_calculation(status)
+
+    def on_inputs_changed(self, *args):
+        """输入变化时丢弃正在进行的计算；开启实时更新时，输入停止变化一段时间后自动重新计算"""
+        self.cancel_calculation("输入已修改，计算已取消")
+        if self.live_job is not None:
+            self.root.after_cancel(self.live_job)
+            self.live_job = None
+        if self.live_var.get():
+            self.live_job = self.root.after(LIVE_UPDATE_DELAY_MS, self.live_update)
+
+    def live_update(self):
+        """实时更新：在后台线程中用编译好的搭配重新计算（输入不完整时跳过）"""
+        self.live_job = None
+        character = self.get_character(quiet=True)
+        if not character:
+            return
+        self.status_var.set("实时更新中...")
+        self.live_task = True
+        self.worker.submit(self.compute_live, character)
+        if not self.polling:
+            self.polling = True
+            self.root.after(POLL_INTERVAL_MS, self.poll_worker)
+
+    def compute_live(self, character, progress=None):
+        """
+        后台线程中执行的实时更新（不访问任何界面组件）
 
-            # 显示最优方案详情
-            self.display_result(character, best_result)
+        只有角色类型或约束变化时才重新枚举搭配；其余数值变化时只重算受影响的乘区。
 
-        except Exception as e:
-            messagebox.showerror("计算错误", f"计算过程中发生错误:\n{e}")
+        Returns:
+            同 compute
+        """
+        key = (character.base_type, json.dumps(character.constraints, sort_keys=True))
+        with self.scorer_lock:
+            if key != self.scorer_key:
+                self.scorer = compile_loadouts(character)
+                self.scorer_key = key
+            best_result, all_results = rescore_combinations(character, self.scorer, verbose=True)
+        return self.affix_gains(character, best_result, all_results)
 
     def display_all_combinations(self, character, all_results):
         """显示所有方案对比"""
@@ -372,8 +517,8 @@ class DamageCalculatorUI:
 
         self.result_text.insert(tk.END, "="*70 + "\n\n")
 
-    def display_result(self, character, result):
-        """显示最优方案详情"""
+    def display_result(self, character, result, gains=None):
+        """显示最优方案详情（gains 为后台线程中算好的下一个词条收益，为空时在此计算）"""
         self.result_text.insert(tk.END, "="*70 + "\n")
         self.result_text.insert(tk.END, f"角色：{character.name}\n")
         self.result_text.insert(tk.END, f"类型：{'攻击型' if character.base_type == 'attack' else '生命型'}\n")
@@ -469,11 +614,12 @@ class DamageCalculatorUI:
             self.result_text.insert(tk.END, "下一个词条收益率分析：\n")
             self.result_text.insert(tk.END, "-" * 70 + "\n")
 
-            # 准备词条平均值字典
-            affix_avg_values = {key: val['avg'] for key, val in character.affix_stats.items()}
+            if gains is None:
+                # 准备词条平均值字典
+                affix_avg_values = {key: val['avg'] for key, val in character.affix_stats.items()}
 
-            # 计算收益率
-            gains = calculate_next_affix_gain(character, stats, affix_avg_values)
+                # 计算收益率
+                gains = calculate_next_affix_gain(character, stats, affix_avg_values)
 
             # 按收益率排序
             sorted_gains = sorted(gains.items(), key=lambda x: x[1]['gain_rate'], reverse=True)
@@ -535,6 +681,7 @@ class DamageCalculatorUI:
 
         # 保存到配置文件
         try:
+            timeline_data = self.characters.get(character.name, {}).get('timeline')
             self.characters[character.name] = {
                 'base_type': character.base_type,
                 'base_value': character.base_value,
@@ -544,9 +691,17 @@ class DamageCalculatorUI:
                 'base_dmg_bonus': character.base_dmg_bonus,
                 'skill_multiplier': character.skill_multiplier
             }
+            if character.constraints:
+                self.characters[character.name]['constraints'] = character.constraints
+            if timeline_data:
+                # 技能循环由时间轴模拟得到，保存时间轴本身（timeline 和 rotation 只能设置其中一个）
+                self.characters[character.name]['timeline'] = timeline_data
+            elif character.rotation:
+                self.characters[character.name]['rotation'] = [asdict(hit) for hit in character.rotation]
 
             with open('characters.yml', 'w', encoding='utf-8') as f:
                 yaml.dump({'characters': self.characters}, f, allow_unicode=True, sort_keys=False)
+            config.invalidate('characters.yml')
 
             # 更新下拉框
             self.character_combo['values'] = list(self.characters.keys())
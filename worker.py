@@ -0,0 +1,100 @@
+"""
+后台计算
+
+在工作线程中执行耗时的计算，进度和结果通过队列交回主线程，图形界面在 root.after 的定时回调中调用 poll 取回，
+界面线程不会被阻塞。与 tkinter 无关，也可以在其他需要后台计算的地方使用。
+
+每次 submit 都会取消上一个任务并分配新的任务编号；旧任务之后产生的进度和结果在 poll 时直接丢弃，
+输入变化后不会再显示过时的结果。
+"""
+
+import queue
+import threading
+from typing import Callable, List, Tuple
+
+from main import SearchCancelled
+
+
+# poll 返回的事件类型
+PROGRESS = 'progress'  # (PROGRESS, 已完成数, 总数)
+DONE = 'done'  # (DONE, 返回值)
+ERROR = 'error'  # (ERROR, 异常)
+CANCELLED = 'cancelled'  # (CANCELLED,)
+
+
+class Worker:
+    """单任务后台执行器：同一时间只有最新提交的任务有效"""
+
+    def __init__(self):
+        self._events = queue.Queue()
+        self._task_id = 0
+        self._cancel = None
+        self._thread = None
+        self._active = False
+
+    @property
+    def active(self) -> bool:
+        """最新提交的任务既没有被取消，结束事件（DONE/ERROR）也还没有被 poll 取走"""
+        return self._active
+
+    def submit(self, func: Callable, *args, **kwargs) -> int:
+        """
+        在后台线程中执行 func(*args, progress=回调, **kwargs)
+
+        回调签名与 find_best_combination 的 progress 参数一致：progress(已完成数, 总数)；
+        任务被取消后回调抛出 SearchCancelled，计算随之中止。
+
+        Returns:
+            任务编号
+        """
+        self.cancel()
+        self._task_id += 1
+        task_id = self._task_id
+        cancel = self._cancel = threading.Event()
+        self._active = True
+
+        def progress(done: int, total: int):
+            if cancel.is_set():
+                raise SearchCancelled()
+            self._events.put((task_id, PROGRESS, done, total))
+
+        def run():
+            try:
+                result = func(*args, progress=progress, **kwargs)
+            except SearchCancelled:
+                self._events.put((task_id, CANCELLED))
+            except Exception as e:
+                self._events.put((task_id, ERROR, e))
+            else:
+                self._events.put((task_id, CANCELLED) if cancel.is_set() else (task_id, DONE, result))
+
+        self._thread = threading.Thread(target=run, name=f'worker-{task_id}', daemon=True)
+        self._thread.start()
+        return task_id
+
+    def cancel(self):
+        """取消当前任务（计算在下一次进度回调时中止，之后的事件全部丢弃）"""
+        if self._cancel is not None:
+            self._cancel.set()
+        self._active = False
+
+    def poll(self) -> List[Tuple]:
+        """取出最新任务的全部事件（不阻塞），旧任务和已取消任务的事件被丢弃"""
+        events = []
+        while True:
+            try:
+                task_id, *event = self._events.get_nowait()
+            except queue.Empty:
+                return events
+            if task_id != self._task_id:
+                continue
+            if self._cancel.is_set() and event[0] != CANCELLED:
+                continue
+            if event[0] in (DONE, ERROR):
+                self._active = False
+            events.append(tuple(event))
+
+    def wait(self, timeout: float = None):
+        """等待当前任务结束（测试和命令行使用）"""
+        if self._thread is not None:
+            self._thread.join(timeout)